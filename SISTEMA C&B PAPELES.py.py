@@ -1,14 +1,44 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from supabase import create_client
 from datetime import datetime, timedelta
 import time
 import io
+import tempfile
+import bisect
+import heapq
+import hashlib
+import json
+import re
+import threading
 import os
 import base64
-from fpdf import FPDF
+import html
+import xlsxwriter
 import pytz
 import bcrypt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import monitor_kiosko
+import lote_pdf
+from fechas_colombia import hora_colombia, fmt_fecha_hora
+from pdf_ordenes import generar_pdf_op, generar_pdf_orden_por_tipo
+
+# Contexto de la sesion de Streamlit para los hilos de lectura en paralelo (st.session_state, st.cache_data).
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:
+    add_script_run_ctx = get_script_run_ctx = None
+
+# Conexion directa a Postgres para escuchar los avisos en vivo (LISTEN/NOTIFY); sin psycopg2 se usa el auto-refresco.
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import select
+    PSYCOPG2_DISPONIBLE = True
+except ImportError:
+    PSYCOPG2_DISPONIBLE = False
 
 # Gráficos de anillos/barras para Rendimiento Maquinistas; si no hay plotly instalado, usa tablas y barras nativas.
 try:
@@ -29,19 +59,75 @@ def _logo_base64(nombre_archivo):
     except Exception:
         return ""
 
-LOGO_ICH        = _logo_base64("logo_ich.png")
-LOGO_PAPELROLLO = _logo_base64("logo_papelrollos.png")
-LOGO_CYB        = _logo_base64("logo_cyb.png")
+# RECURSOS COMPARTIDOS POR PROCESO: cada rerun de Streamlit vuelve a ejecutar este archivo completo, asi que el cliente
+# de Supabase y los logos se construyen UNA sola vez por servidor (st.cache_resource) y los reutilizan todas las tablets.
+@st.cache_resource(show_spinner=False)
+def _logos_marca():
+    """Lee y codifica los 3 logos de la portada una sola vez por proceso."""
+    return {
+        "ich":        _logo_base64("logo_ich.png"),
+        "papelrollo": _logo_base64("logo_papelrollos.png"),
+        "cyb":        _logo_base64("logo_cyb.png"),
+    }
+
+@st.cache_resource(show_spinner=False)
+def _cliente_supabase(url, key):
+    """
+    Cliente de Supabase unico para todo el servidor. Al ser el mismo objeto en
+    todas las sesiones, su sesion HTTP (keep-alive) se reutiliza entre reruns y
+    entre usuarios, en vez de abrir un pool y un handshake TLS nuevos por clic.
+    Si la creacion falla no queda cacheado, y el siguiente rerun lo reintenta.
+    """
+    return create_client(url, key)
+
+_LOGOS = _logos_marca()
+LOGO_ICH        = _LOGOS["ich"]
+LOGO_PAPELROLLO = _LOGOS["papelrollo"]
+LOGO_CYB        = _LOGOS["cyb"]
 
 #  CONEXION A SUPABASE 
 try:
     URL = st.secrets["SUPABASE_URL"]
     KEY = st.secrets["SUPABASE_KEY"]
-    supabase = create_client(URL, KEY)
+    supabase = _cliente_supabase(URL, KEY)
 except Exception as e:
     st.error("Error de conexion a Base de Datos. Revisar los Secrets.")
     st.stop()
     
+# LECTURAS EN PARALELO: un pool de hilos acotado y compartido por todo el servidor. Una pagina declara sus consultas
+# independientes y las recibe juntas, asi tarda lo que la mas lenta y no la suma de todas. Las llamadas sin sesion de
+# Streamlit (kiosko, hilos de fondo) usan un pool aparte: a sus hilos nunca se les pega el contexto de una sesion, asi
+# que no pueden correr con el de otra que ya paso por ese hilo.
+@st.cache_resource(show_spinner=False)
+def _pool_lecturas(con_sesion=True):
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="lecturas" if con_sesion else "lecturas_sin_sesion")
+
+def leer_en_paralelo(lecturas):
+    """
+    Ejecuta a la vez {nombre: (funcion, valor_si_falla)} y devuelve
+    {nombre: resultado}. Si una lectura falla se deja constancia en consola
+    y se usa su valor por defecto. Las funciones no deben volver a llamar a
+    leer_en_paralelo (el pool es acotado).
+    """
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+# Cada llamada con sesion pone SU contexto en el hilo antes de correr, asi nunca hereda el de la llamada anterior.
+    def _correr(funcion):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return funcion()
+
+    pool = _pool_lecturas(ctx is not None)
+    futuros = {nombre: pool.submit(_correr, funcion) for nombre, (funcion, _) in lecturas.items()}
+    resultados = {}
+    for nombre, futuro in futuros.items():
+        try:
+            resultados[nombre] = futuro.result()
+        except Exception as e:
+            print(f"Error en la lectura '{nombre}': {e}")
+            resultados[nombre] = lecturas[nombre][1]
+    return resultados
+
 #  ESTILOS CSS (DISEÑO INDUSTRIAL Y TACTIL)
 st.markdown("""
     <style>
@@ -181,105 +267,6 @@ def validar_usuario_supabase(usuario_ingresado, clave_ingresada):
         return None
 
 #  FUNCIONES AUXILIARES 
-MESES_ES = {
-    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
-    7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
-}
-
-def _fecha_creacion_legible(row):
-    """Devuelve la fecha de creacion de la OP en formato 'Mes DD del AAAA', en español (hora Colombia)."""
-    raw = row.get('created_at') or row.get('fecha_creacion') or ''
-    if not raw:
-        return "-"
-    fecha_dd_mm_aaaa = fmt_fecha_hora(raw, con_hora=False)  # 'DD/MM/AAAA' ya en hora Colombia
-    try:
-        dia, mes, anio = fecha_dd_mm_aaaa.split('/')
-        return f"{MESES_ES.get(int(mes), mes)} {dia} del {anio}"
-    except Exception:
-        return fecha_dd_mm_aaaa or "-"
-
-def dibujar_caja_fecha_creacion(pdf, row, x=145, y=4, w=63, h=16):
-    """Escribe la fecha de creacion de la OP en la esquina opuesta al logo,
-    solo como texto (sin caja ni fondo), a juego con el resto del encabezado.
-    No mueve el cursor del PDF, lo deja igual que antes de llamarla."""
-    x0, y0 = pdf.get_x(), pdf.get_y()
-
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_xy(x, y)
-    pdf.set_font("Arial", "B", 8)
-    pdf.cell(w, 5, "FECHA DE CREACIÓN", 0, 2, "R")
-    pdf.set_x(x)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(w, 7, _fecha_creacion_legible(row), 0, 2, "R")
-
-    pdf.set_xy(x0, y0)
-
-# Escribe texto dentro de una celda del PDF reduciendo el tamano de letra si el texto no cabe, para que nunca se corte
-def cell_fit(pdf, w, h, text, border=1):
-
-    text = str(text)
-
-    while pdf.get_string_width(text) > (w - 2):
-        text = text[:-1]
-
-    pdf.cell(w, h, text, border)
-
-def _lineas_ajustadas(pdf, texto, ancho_mm):
-    """Parte un texto en lineas que caben dentro de ancho_mm con la fuente actual de pdf."""
-    texto = str(texto) if texto is not None else ""
-    if texto == "":
-        return [""]
-    palabras = texto.split(" ")
-    lineas = []
-    actual = ""
-    for palabra in palabras:
-        prueba = (actual + " " + palabra).strip() if actual else palabra
-        if actual == "" or pdf.get_string_width(prueba) <= (ancho_mm - 2):
-            actual = prueba
-        else:
-            lineas.append(actual)
-            actual = palabra
-    if actual:
-        lineas.append(actual)
-    return lineas if lineas else [""]
-
-def fila_grid(pdf, celdas, h_linea=7):
-    """
-    Dibuja una fila de celdas lado a lado tipo grilla (como pdf.cell en serie),
-    pero si el texto de una celda no cabe en una linea, en vez de salirse del
-    recuadro pasa a la siguiente linea DENTRO de la misma celda. Toda la fila
-    crece de alto segun la celda que mas lineas necesite.
-    celdas: lista de dicts con: ancho, texto, negrita (bool), fill (bool), tam (pt, opcional)
-    """
-    x0, y0 = pdf.get_x(), pdf.get_y()
-
-    listas_lineas = []
-    for c in celdas:
-        pdf.set_font("Arial", "B" if c.get("negrita") else "", c.get("tam", 10))
-        listas_lineas.append(_lineas_ajustadas(pdf, c.get("texto", ""), c["ancho"]))
-
-    n_lineas = max(len(l) for l in listas_lineas)
-    alto_fila = n_lineas * h_linea
-
-    x = x0
-    for c, lineas in zip(celdas, listas_lineas):
-        if c.get("fill"):
-            pdf.set_fill_color(230, 230, 230)
-            pdf.rect(x, y0, c["ancho"], alto_fila, "F")
-        pdf.rect(x, y0, c["ancho"], alto_fila)
-        pdf.set_font("Arial", "B" if c.get("negrita") else "", c.get("tam", 10))
-        for i, linea in enumerate(lineas):
-            pdf.set_xy(x + 1, y0 + (i * h_linea))
-            pdf.cell(c["ancho"] - 2, h_linea, linea, border=0)
-        x += c["ancho"]
-
-    pdf.set_xy(x0, y0 + alto_fila)
-
-# FUNCION DE HORARIOS
-def hora_colombia():
-    tz = pytz.timezone("America/Bogota")
-    return datetime.now(tz)
-
 # Nombres de maquinistas (perfiles reales) para los selectores de operario al cerrar trabajos; cache 5 min.
 @st.cache_data(ttl=300)
 def _lista_nombres_maquinistas():
@@ -315,41 +302,6 @@ def subir_evidencia_foto(archivo_bytes, nombre_base):
                    f"El movimiento continuará sin la foto adjunta.")
         return None
 
-def fmt_fecha_hora(valor, con_hora=True):
-    """
-    Convierte CUALQUIER fecha/hora (string ISO con o sin zona horaria, en UTC,
-    en Colombia, con microsegundos, etc.) al formato unico que debe usarse en
-    TODO el programa: 'DD/MM/AAAA HH:MM' en hora Colombia, sin segundos.
-    Si con_hora=False, devuelve solo 'DD/MM/AAAA'.
-    Si el valor es vacio, None, o no se puede interpretar, lo devuelve tal cual
-    (o '-' si esta vacio) para no romper nada que ya estuviera funcionando.
-    """
-    if valor is None or valor == "":
-        return "-"
-    if not isinstance(valor, (list, dict)):
-        try:
-            if pd.isna(valor):
-                return "-"
-        except (TypeError, ValueError):
-            pass
-    if isinstance(valor, (datetime,)):
-        dt = valor
-    else:
-        try:
-            texto = str(valor).strip().replace("Z", "+00:00")
-            dt = datetime.fromisoformat(texto)
-        except Exception:
-            return valor
-    try:
-        tz_col = pytz.timezone("America/Bogota")
-        if dt.tzinfo is None:
-            dt = tz_col.localize(dt)
-        else:
-            dt = dt.astimezone(tz_col)
-        return dt.strftime("%d/%m/%Y %H:%M") if con_hora else dt.strftime("%d/%m/%Y")
-    except Exception:
-        return valor
-
 def formatear_fechas_df(df, columnas=None):
     """
     Aplica fmt_fecha_hora a las columnas de fecha de un DataFrame. Si no se
@@ -364,25 +316,115 @@ def formatear_fechas_df(df, columnas=None):
         columnas = [c for c in df.columns if any(p in c.lower() for p in claves)]
     for c in columnas:
         if c in df.columns:
-            df[c] = df[c].apply(fmt_fecha_hora)
+            df[c] = _fmt_fechas_columna(df[c])
     return df
 
-def get_planta_activa() -> bool:
-    """Consulta si la planta está activa en Supabase. Cache 10 segundos."""
-    cache_key = '_planta_activa_cache'
-    cache_ts   = '_planta_activa_ts'
-    ahora      = hora_colombia().timestamp()
-    if cache_key in st.session_state and ahora - st.session_state.get(cache_ts, 0) < 10:
-        return st.session_state[cache_key]
+# FECHAS DE UNA COLUMNA EN BLOQUE: los textos ISO (con zona, con Z o sin zona) se convierten todos juntos con pandas; lo
+# demas (vacios, datetimes, textos que no son fecha, fechas invalidas) pasa uno a uno por fmt_fecha_hora, como antes.
+# Igual que fmt_fecha_hora, una fecha sin zona se toma como hora Colombia y una con zona se pasa a hora Colombia.
+_RE_FECHA_ISO = re.compile(r"\d{4}-\d{2}-\d{2}")
+_RE_CON_ZONA = re.compile(r"(?:Z|[+-]\d{2}:?\d{2})$")
+
+def _fmt_fechas_columna(serie):
+    """Mismo resultado que serie.apply(fmt_fecha_hora), sin pasar fila por fila las fechas ISO."""
+    valores = serie.tolist()
+    resultado = list(valores)
+    pendientes = set(range(len(valores)))
     try:
-        res = supabase.table("configuracion_sistema").select("valor")\
-              .eq("clave", "planta_activa").single().execute()
-        activa = str(res.data.get("valor", "true")).lower() == "true"
-    except:
-        activa = True  
-    st.session_state[cache_key] = activa
-    st.session_state[cache_ts]  = ahora
-    return activa
+        textos = [v.strip() if isinstance(v, str) else "" for v in valores]
+        con_zona, sin_zona = [], []
+        for i, texto in enumerate(textos):
+            if _RE_FECHA_ISO.match(texto):
+                (con_zona if _RE_CON_ZONA.search(texto) else sin_zona).append(i)
+        for posiciones, en_utc in ((con_zona, True), (sin_zona, False)):
+            if not posiciones:
+                continue
+            fechas = pd.to_datetime(pd.Series([textos[i] for i in posiciones], index=posiciones),
+                                    utc=en_utc, format="ISO8601", errors="coerce")
+            if en_utc:
+                fechas = fechas.dt.tz_convert("America/Bogota")
+            else:
+                fechas = fechas.dt.tz_localize("America/Bogota", nonexistent="NaT", ambiguous="NaT")
+            fechas = fechas[fechas.notna() & (fechas.dt.year >= 1000)]
+# dt.strftime va fecha por fecha; datetime_as_string arma 'AAAA-MM-DDTHH:MM' en bloque y solo se reordena el texto
+            locales = np.datetime_as_string(fechas.dt.tz_localize(None).to_numpy(), unit="m")
+            for i, t in zip(fechas.index, locales):
+                resultado[i] = f"{t[8:10]}/{t[5:7]}/{t[:4]} {t[11:16]}"
+                pendientes.discard(i)
+    except Exception as e:
+        print(f"Error al convertir fechas en bloque, se convierten una a una: {e}")
+        pendientes = range(len(valores))
+    for i in pendientes:
+        resultado[i] = fmt_fecha_hora(valores[i])
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+# CONTADOR GLOBAL DE CAMBIOS (ver sql/version_cambios.sql): sube con cada escritura en trabajos_activos, estado_maquinas,
+# configuracion_sistema y ordenes_planeadas. Se lee antes de las consultas pesadas; si no cambio, se reutiliza lo que hay.
+VERSION_CAMBIOS_SEGUNDOS = 3
+
+@st.cache_resource(show_spinner=False)
+def _almacen_version_cambios():
+    return {"lock": threading.Lock(), "leido_en": 0.0, "version": None}
+
+def version_cambios():
+    """Numero de version actual (una consulta por proceso cada VERSION_CAMBIOS_SEGUNDOS); None si la tabla no existe."""
+    almacen = _almacen_version_cambios()
+    with almacen["lock"]:
+        if time.time() - almacen["leido_en"] >= VERSION_CAMBIOS_SEGUNDOS:
+            try:
+                fila = supabase.table("version_cambios").select("version").eq("id", 1).execute().data
+                almacen["version"] = fila[0]["version"] if fila else None
+            except Exception:
+                almacen["version"] = None
+            almacen["leido_en"] = time.time()
+        return almacen["version"]
+
+# CONFIGURACION DEL SISTEMA COMPARTIDA POR PROCESO: todas las filas de configuracion_sistema en UNA consulta, guardadas
+# en memoria del servidor para todas las tablets. Se recarga cada CONFIG_TTL_SEGUNDOS o apenas cambia la version
+# (set_planta_activa / set_area_activa la suben), en vez de una consulta por interruptor y por sesion.
+CONFIG_TTL_SEGUNDOS = 10
+
+@st.cache_resource(show_spinner=False)
+def _almacen_configuracion():
+    return {"lock": threading.Lock(), "version": 0, "version_cargada": -1, "cargado_en": 0.0, "filas": {}, "version_db": None}
+
+def invalidar_configuracion():
+    almacen = _almacen_configuracion()
+    with almacen["lock"]:
+        almacen["version"] += 1
+
+def configuracion_sistema():
+    """
+    {clave: fila} de configuracion_sistema. Solo la primera sesion que la pide
+    despues de vencer el intervalo hace la consulta; las demas esperan y usan
+    el mismo resultado. Si el contador global de cambios no se ha movido, no
+    se vuelve a consultar. Si la consulta falla se siguen usando los ultimos valores.
+    """
+    almacen = _almacen_configuracion()
+    with almacen["lock"]:
+        if almacen["version_cargada"] == almacen["version"] and time.time() - almacen["cargado_en"] < CONFIG_TTL_SEGUNDOS:
+            return almacen["filas"]
+        version = almacen["version"]
+        version_db = version_cambios()
+        if version_db is None or version_db != almacen["version_db"] or almacen["version_cargada"] != version:
+            try:
+                filas = supabase.table("configuracion_sistema").select("*").execute().data or []
+                almacen["filas"] = {f.get("clave"): f for f in filas}
+                almacen["version_db"] = version_db
+            except Exception as e:
+                print(f"Error al cargar configuracion_sistema: {e}")
+        almacen["version_cargada"] = version
+        almacen["cargado_en"] = time.time()
+        return almacen["filas"]
+
+def _flag_configuracion(clave) -> bool:
+# Si nunca se ha guardado un registro para esta clave, se asume activa por defecto
+    fila = configuracion_sistema().get(clave)
+    return str(fila.get("valor", "true")).lower() == "true" if fila else True
+
+def get_planta_activa() -> bool:
+    """Consulta si la planta está activa (configuracion compartida, ver configuracion_sistema)."""
+    return _flag_configuracion("planta_activa")
 
 def set_planta_activa(estado: bool, usuario: str = "admin"):
     """Activa o desactiva la planta globalmente. Usa upsert por si la fila no existe."""
@@ -406,27 +448,12 @@ def set_planta_activa(estado: bool, usuario: str = "admin"):
     except Exception as e:
         print(f"Error al guardar historial de planta_activa: {e}")
 
-    st.session_state.pop('_planta_activa_cache', None)
-    st.session_state.pop('_planta_activa_ts', None)
+    invalidar_configuracion()
+    invalidar_snapshot_planta()
 
 def get_area_activa(area: str) -> bool:
-    """Consulta si un AREA especifica esta activa (independiente del interruptor general). Cache 10 segundos."""
-    cache_key = f'_area_activa_cache_{area}'
-    cache_ts  = f'_area_activa_ts_{area}'
-    ahora = hora_colombia().timestamp()
-    if cache_key in st.session_state and ahora - st.session_state.get(cache_ts, 0) < 10:
-        return st.session_state[cache_key]
-    try:
-        res = supabase.table("configuracion_sistema").select("valor")\
-              .eq("clave", f"area_activa_{area}").single().execute()
-        activa = str(res.data.get("valor", "true")).lower() == "true"
-    except Exception:
-
-# Si nunca se ha guardado un registro para esta area, se asume activa por defecto
-        activa = True
-    st.session_state[cache_key] = activa
-    st.session_state[cache_ts]  = ahora
-    return activa
+    """Consulta si un AREA especifica esta activa (independiente del interruptor general)."""
+    return _flag_configuracion(f"area_activa_{area}")
 
 def set_area_activa(area: str, estado: bool, usuario: str = "admin"):
     """Activa o desactiva UN AREA especifica.
@@ -467,765 +494,556 @@ def set_area_activa(area: str, estado: bool, usuario: str = "admin"):
     except Exception as e:
         print(f"Error al guardar historial de {clave}: {e}")
 
-    st.session_state.pop(f'_area_activa_cache_{area}', None)
-    st.session_state.pop(f'_area_activa_ts_{area}', None)
+    invalidar_configuracion()
+    invalidar_snapshot_planta()
 
-# Calcula cuántos segundos estuvo detenida una clave (planta/área) dentro de un intervalo [inicio, fin].
-def segundos_inactivo_en_periodo(clave: str, inicio: datetime, fin: datetime, estado_por_defecto: bool = True) -> float:
-    """
-    'estado_por_defecto' se usa SOLO si todavia no existe ningun evento en el
-    historial de esta clave anterior a 'inicio' (por ejemplo, una maquina que
-    ya estaba apagada desde antes de que existiera este historial). En ese
-    caso, en vez de asumir ciegamente que estaba activa, se usa el estado
-    real actual como mejor aproximacion de lo que paso antes de tener
-    registros. Una vez el sistema lleve un tiempo funcionando, todas las
-    claves ya van a tener sus propios eventos y este valor por defecto deja
-    de ser relevante.
-    """
-    if fin <= inicio:
-        return 0.0
-    tz = pytz.timezone("America/Bogota")
+# MOTOR DE TIEMPOS DETENIDOS: trae el historial de encendido/apagado de MUCHAS claves (planta, areas, maquinas) en una
+# sola consulta, lo convierte en tramos inactivos por clave y con eso responde cualquier cantidad de intervalos [inicio, fin].
+_FECHA_MIN = datetime.min.replace(tzinfo=pytz.utc)
+_FECHA_MAX = datetime.max.replace(tzinfo=pytz.utc)
 
-    try:
-# Trae los cambios de estado de la clave ocurridos dentro (y justo antes) del intervalo.
-        eventos = supabase.table("estado_historial").select("estado,fecha")\
-            .eq("clave", clave).lte("fecha", fin.isoformat())\
-            .order("fecha", desc=False).execute().data or []
-    except Exception:
-        return 0.0
-
-    def _parsear_fecha(raw):
+def _parsear_fecha_colombia(raw):
+    """Convierte un texto ISO (con o sin zona, con o sin 'Z') a datetime en hora Colombia. None si no se puede."""
+    if isinstance(raw, datetime):
+        dt = raw
+    else:
         try:
             dt = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
-            return dt.astimezone(tz) if dt.tzinfo else tz.localize(dt)
         except Exception:
             return None
+    tz = pytz.timezone("America/Bogota")
+    return dt.astimezone(tz) if dt.tzinfo else tz.localize(dt)
 
-# Estado al inicio del intervalo: el último evento antes de 'inicio', o el valor por defecto.
-    estado_actual = estado_por_defecto
-    puntos = []  # lista de (fecha, nuevo_estado) que caen DENTRO del intervalo
-    for ev in eventos:
-        f_ev = _parsear_fecha(ev.get("fecha"))
-        if f_ev is None:
-            continue
-        if f_ev <= inicio:
-            estado_actual = bool(ev.get("estado", True))
-        elif f_ev < fin:
-            puntos.append((f_ev, bool(ev.get("estado", True))))
-
-# Suma los tramos del intervalo donde la clave estuvo inactiva.
-    segundos_inactivo = 0.0
-    cursor = inicio
-    for f_ev, nuevo_estado in puntos:
-        if not estado_actual:
-            segundos_inactivo += (f_ev - cursor).total_seconds()
-        cursor = f_ev
-        estado_actual = nuevo_estado
-
-# TRAMO FINAL: desde el ultimo cambio (o el inicio, si no hubo ninguno) hasta 'fin'
-    if not estado_actual:
-        segundos_inactivo += (fin - cursor).total_seconds()
-
-    return max(0.0, segundos_inactivo)
-
-def calcular_duracion_laboral(inicio, fin, nombre_maquina=None, tiempo_pausa_segundos=0):
+def _traer_todas_las_filas(construir_consulta, tam_pagina=1000):
     """
-    Calcula tiempo trabajado descontando pausas individuales y el tiempo real
-    que la planta, el area de la maquina, Y LA MAQUINA INDIVIDUAL estuvieron
-    detenidas DENTRO del intervalo [inicio, fin] — sin importar si para
-    cuando se cierra el trabajo ya estan todas reactivadas de nuevo. Antes
-    esta funcion solo miraba el estado ACTUAL (en el momento de cerrar) y
-    ponia todo en "0:00:00" si en ese instante estaba detenida, lo cual no
-    era correcto si se detuvo y reactivo DURANTE el trabajo.
+    Ejecuta una consulta de Supabase por paginas (.range) hasta traer todas las
+    filas, porque el API corta cada respuesta en 1000 filas. 'construir_consulta'
+    es una funcion sin argumentos que arma la consulta desde cero en cada pagina.
     """
-    total_segundos = (fin - inicio).total_seconds()
-    if total_segundos < 0:
-        return "0:00:00"
-
-# TIEMPO DETENIDO DE PLANTA (interruptor general) DENTRO DEL INTERVALO REAL
-    segundos_detenido = segundos_inactivo_en_periodo("planta_activa", inicio, fin)
-
-# Tiempo detenido del área específica y de la máquina puntual, ambos dentro del intervalo.
-    if nombre_maquina:
-        area_de_maquina = MAQUINA_A_AREA.get(nombre_maquina)
-        if area_de_maquina:
-            segundos_detenido += segundos_inactivo_en_periodo(f"area_activa_{area_de_maquina}", inicio, fin)
-        segundos_detenido += segundos_inactivo_en_periodo(
-            f"maquina_activa_{nombre_maquina}", inicio, fin,
-            estado_por_defecto=obtener_estado_maquina(nombre_maquina)
-        )
-
-# Descontar pausas individuales + tiempo detenido de planta/area/maquina
-    total_segundos = max(0, total_segundos - tiempo_pausa_segundos - segundos_detenido)
-    return str(timedelta(seconds=int(total_segundos)))
-    
-# GENERA EL PDF DE ORDEN DE PRODUCCION — version base/generica (encabezado y estructura comun del documento)
-def generar_pdf_op(row):
-    pdf = FPDF()
-    pdf.add_page()
-    
-# ENCABEZADO INDUSTRIAL PDF CERTIFICADO 
-    pdf.set_fill_color(13, 71, 161)
-    pdf.rect(0, 0, 210, 40, 'F')
-
-# LOGO CYB PAPELES
-    pdf.image("logo_cb.png", 2, 2, 60)
-    dibujar_caja_fecha_creacion(pdf, row)
-    
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", 'B', 18)
-    pdf.cell(0, 20, f" CERTIFICADO DE PRODUCCION - OP: {row['op']}", ln=True, align='C')
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, f"TRABAJO: {row['nombre_trabajo']}", ln=True, align='C')
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(0.5)
-    
-#  SECCION DATOS DE VENTA PDF
-    pdf.set_font("Arial", 'B', 11)
-    pdf.set_fill_color(230, 230, 230)
-    pdf.cell(0, 8, " 1. INFORMACION GENERAL Y ORIGEN", ln=True, fill=True)
-    pdf.set_font("Arial", '', 10)
-    
-    c1 = 100
-    pdf.cell(c1, 7, f"Cliente: {row.get('cliente')}", border='B')
-    pdf.cell(0, 7, f"Vendedor: {row.get('vendedor')}", border='B', ln=True)
-    pdf.cell(c1, 7, f"Tipo de Orden: {row.get('tipo_orden')}", border='B')
-    pdf.cell(0, 7, f"Fecha Creacion: {fmt_fecha_hora(row.get('created_at'), con_hora=False)}", border='B', ln=True)
-    pdf.ln(5)
-
-#  SECCION ESPECIFICACIONES PDF
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, " 2. ESPECIFICACIONES TECNICAS", ln=True, fill=True)
-    pdf.set_font("Arial", '', 10)
-
-    if "FORMAS" in row.get('tipo_orden', ''):
-        pdf.cell(c1, 7, f"Cantidad: {row.get('cantidad_formas')}", border='B')
-        pdf.cell(0, 7, f"Partes: {row.get('num_partes')}", border='B', ln=True)
-        pdf.cell(c1, 7, f"Presentacion: {row.get('presentacion')}", border='B')
-        pdf.cell(0, 7, f"Destino: {row.get('destino_formas', 'N/A')}", border='B', ln=True)
+    filas = []
+    for pagina in _paginas_consulta(construir_consulta, tam_pagina):
+        filas.extend(pagina)
+    return filas
+
+def _paginas_consulta(construir_consulta, tam_pagina=1000):
+    """Igual que _traer_todas_las_filas, pero entrega pagina por pagina (en memoria queda solo una)."""
+    desde = 0
+    while True:
+        pagina = construir_consulta().range(desde, desde + tam_pagina - 1).execute().data or []
+        if pagina:
+            yield pagina
+        if len(pagina) < tam_pagina:
+            return
+        desde += tam_pagina
+
+# EXPORTAR REPORTES A EXCEL: la tabla se lee de Supabase por paginas y cada pagina se escribe directo a un libro de
+# xlsxwriter en modo constant_memory (cada fila sale al disco apenas se completa), asi un año entero de historial nunca
+# pasa por un DataFrame. Las fechas quedan como fechas de Excel en hora Colombia y las duraciones como [h]:mm:ss.
+COLUMNAS_FECHA_EXCEL = ['fecha', 'created_at', 'actualizacion', 'modificacion', 'inicio', 'fin', 'hora']
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _fecha_para_excel(valor, tz_col):
+    """datetime sin zona en hora Colombia, o None si el valor no es una fecha."""
+    if isinstance(valor, datetime):
+        dt = valor
     else:
-        pdf.cell(c1, 7, f"Material: {row.get('material')}", border='B')
-        pdf.cell(0, 7, f"Gramaje: {row.get('gramaje_rollos')}g", border='B', ln=True)
-        pdf.cell(c1, 7, f"Cantidad: {row.get('cantidad_rollos')}", border='B')
-        pdf.cell(0, 7, f"Core: {row.get('core')}", border='B', ln=True)
-
-    pdf.ln(5)
+        texto = str(valor).strip()
+        try:
+            dt = datetime.fromisoformat(texto.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                dt = datetime.strptime(texto, "%d/%m/%Y %H:%M")
+            except ValueError:
+                return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(tz_col).replace(tzinfo=None)
+    return dt
 
-#  SECCION BITACORA TECNICA  
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, " 3. TRAZABILIDAD Y REGISTROS DE PLANTA", ln=True, fill=True)
-    
-    historial = row.get('historial_procesos', [])
-    if not historial:
-        pdf.set_font("Arial", 'I', 10)
-        pdf.cell(0, 10, "Pendiente de procesamiento.", ln=True)
-    else:
-        for h in historial:
-            pdf.ln(2)
+def exportar_excel(construir_consulta, titulos=None, hoja="Datos", tam_pagina=1000):
+    """
+    Bytes de un .xlsx con todas las filas de la consulta (ver _paginas_consulta),
+    con las columnas en el orden en que llegan y titulos: {columna: titulo} para
+    renombrarlas. Las de fecha se detectan por nombre (como en
+    formatear_fechas_df) y las '*_segundos' se escriben como duraciones.
+    """
+    tz_col = pytz.timezone("America/Bogota")
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "reporte.xlsx")
+        libro = xlsxwriter.Workbook(ruta, {"constant_memory": True, "tmpdir": carpeta, "nan_inf_to_errors": True})
+        hoja_excel = libro.add_worksheet(hoja[:31])
+        f_titulo = libro.add_format({"bold": True, "bg_color": "#0D47A1", "font_color": "#FFFFFF"})
+        f_fecha = libro.add_format({"num_format": "dd/mm/yyyy hh:mm"})
+        f_duracion = libro.add_format({"num_format": "[h]:mm:ss"})
+        fila = 0
+        for pagina in _paginas_consulta(construir_consulta, tam_pagina):
+
+# ENCABEZADO con la primera pagina (en constant_memory las filas se escriben en orden y no se puede volver atras)
+            if fila == 0:
+                claves = list(pagina[0].keys())
+                tipos = [
+                    "duracion" if c.endswith("_segundos")
+                    else "fecha" if any(p in c.lower() for p in COLUMNAS_FECHA_EXCEL) else None
+                    for c in claves
+                ]
+                for j, c in enumerate(claves):
+                    hoja_excel.set_column(j, j, 18 if tipos[j] else 24)
+                    hoja_excel.write_string(0, j, str((titulos or {}).get(c, c)), f_titulo)
+                hoja_excel.freeze_panes(1, 0)
+                fila = 1
+
+            for registro in pagina:
+                for j, c in enumerate(claves):
+                    valor = registro.get(c)
+                    if valor is None or valor == "":
+                        continue
+                    if tipos[j] == "fecha":
+                        dt = _fecha_para_excel(valor, tz_col)
+                        if dt is not None:
+                            hoja_excel.write_datetime(fila, j, dt, f_fecha)
+                            continue
+                    elif tipos[j] == "duracion":
+                        try:
+                            hoja_excel.write_number(fila, j, float(valor) / 86400, f_duracion)
+                            continue
+                        except (TypeError, ValueError):
+                            pass
+                    if isinstance(valor, bool):
+                        hoja_excel.write_boolean(fila, j, valor)
+                    elif isinstance(valor, (int, float)):
+                        hoja_excel.write_number(fila, j, valor)
+                    elif isinstance(valor, (list, dict)):
+                        hoja_excel.write_string(fila, j, json.dumps(valor, ensure_ascii=False))
+                    else:
+                        hoja_excel.write_string(fila, j, str(valor))
+                fila += 1
 
-# FILA DE TITULO DE AREA
-            pdf.set_font("Arial", 'B', 10)
-            pdf.set_fill_color(240, 245, 255)
-            area_txt  = str(h.get('area','?')).encode('latin-1','replace').decode('latin-1')
-            maq_txt   = str(h.get('maquina','?')).encode('latin-1','replace').decode('latin-1')
-            op_txt    = str(h.get('operario') or h.get('usuario','N/A')).encode('latin-1','replace').decode('latin-1')
-            aux_txt   = str(h.get('auxiliar','N/A')).encode('latin-1','replace').decode('latin-1')
-            fecha_txt = str(h.get('fecha') or h.get('fin') or h.get('inicio',''))[:19].encode('latin-1','replace').decode('latin-1')
-            dur_txt   = str(h.get('duracion','0:00:00')).encode('latin-1','replace').decode('latin-1')
+        if fila == 0:
+            hoja_excel.write_string(0, 0, "Sin registros en el rango elegido")
+        libro.close()
+        with open(ruta, "rb") as f:
+            return f.read()
 
-            pdf.cell(0, 7, f" AREA: {area_txt} | MAQUINA: {maq_txt}", ln=True, fill=True, border=1)
+def boton_exportar_excel(clave, nombre_archivo, tabla, titulos=None, seleccion="*", columna_fecha="fecha"):
+    """Rango de fechas y botones para preparar y bajar en Excel TODA la tabla del rango (no solo lo que se ve)."""
+    tz = pytz.timezone("America/Bogota")
+    c_desde, c_hasta, c_boton = st.columns([1, 1, 2])
+    desde = c_desde.date_input("Excel desde", value=hora_colombia().date() - timedelta(days=365), key=f"xls_desde_{clave}")
+    hasta = c_hasta.date_input("Hasta", value=hora_colombia().date(), key=f"xls_hasta_{clave}")
 
-# FILA DE RESPONSABLES POR OP
-            pdf.set_font("Arial", 'B', 9)
-            pdf.cell(65, 6, f"Operador: {op_txt}", border='LR')
-            pdf.cell(65, 6, f"Auxiliar: {aux_txt}", border='R')
-            pdf.cell(0, 6, f"Fecha: {fecha_txt}", border='R', ln=True)
+    def consulta():
+        return supabase.table(tabla).select(seleccion)\
+            .gte(columna_fecha, tz.localize(datetime.combine(desde, datetime.min.time())).isoformat())\
+            .lt(columna_fecha, tz.localize(datetime.combine(hasta + timedelta(days=1), datetime.min.time())).isoformat())\
+            .order(columna_fecha, desc=True).order("id", desc=True)
 
-# FILA DE TIEMPOS TOMADOS POR OP
-            pdf.cell(0, 6, f"Duracion del Proceso: {dur_txt}", border='LRB', ln=True)
+    if c_boton.button("📊 Preparar Excel", key=f"xls_prep_{clave}", use_container_width=True):
+        try:
+            with st.spinner("Generando el Excel..."):
+                st.session_state[f"xls_{clave}"] = (exportar_excel(consulta, titulos, hoja=nombre_archivo), desde, hasta)
+        except Exception as e:
+            st.error(f"No se pudo generar el Excel: {e}")
+    if st.session_state.get(f"xls_{clave}"):
+        datos_xls, desde_xls, hasta_xls = st.session_state[f"xls_{clave}"]
+        c_boton.download_button(
+            label="📥 Descargar Excel",
+            data=datos_xls,
+            file_name=f"{nombre_archivo}_{desde_xls:%Y%m%d}_{hasta_xls:%Y%m%d}.xlsx",
+            mime=MIME_EXCEL,
+            key=f"xls_dl_{clave}",
+            use_container_width=True
+        )
 
-# DATOS TECNICOS SALIDA JHSON
-            pdf.set_font("Arial", '', 8)
+def claves_estado_maquina(nombre_maquina):
+    """Claves de estado_historial que detienen a una maquina: la planta, su area y la maquina misma."""
+    claves = ["planta_activa"]
+    area_de_maquina = MAQUINA_A_AREA.get(nombre_maquina)
+    if area_de_maquina:
+        claves.append(f"area_activa_{area_de_maquina}")
+    if nombre_maquina:
+        claves.append(f"maquina_activa_{nombre_maquina}")
+    return claves
+
+def _tramos_inactivos(eventos, estado_inicial):
+    """Convierte una lista ordenada de (fecha, estado) en tramos (desde, hasta) donde la clave estuvo apagada."""
+    tramos = []
+    apagado_desde = None if estado_inicial else _FECHA_MIN
+    for fecha_ev, estado_ev in eventos:
+        if not estado_ev and apagado_desde is None:
+            apagado_desde = fecha_ev
+        elif estado_ev and apagado_desde is not None:
+            tramos.append((apagado_desde, fecha_ev))
+            apagado_desde = None
+    if apagado_desde is not None:
+        tramos.append((apagado_desde, _FECHA_MAX))
+    return tramos
+
+def _eventos_compactados(claves, desde, hasta):
+    """
+    Eventos equivalentes (clave, estado, fecha) sacados de las tablas compactadas:
+    el 'estado a la fecha' de estado_snapshot y los tramos de estado_intervalos que
+    tocan [desde, hasta]. Devuelve (eventos, snapshots_por_clave). Si las tablas
+    todavia no existen (nunca se ha compactado) devuelve ([], {}).
+    """
+    try:
+        snapshots = supabase.table("estado_snapshot").select("clave,estado,fecha").in_("clave", claves).execute().data or []
+    except Exception:
+        return [], {}
+    snapshots_por_clave = {}
+    for snap in snapshots:
+        f_snap = _parsear_fecha_colombia(snap.get("fecha"))
+        if f_snap is not None:
+            snapshots_por_clave[snap["clave"]] = f_snap
+
+    eventos = [snap for snap in snapshots if snapshots_por_clave.get(snap["clave"], _FECHA_MAX) <= hasta]
+
+# Solo se baja a estado_intervalos si la ventana empieza ANTES de la ultima compactacion de esa clave.
+    claves_viejas = [c for c, f_snap in snapshots_por_clave.items() if f_snap > desde]
+    if claves_viejas:
+        try:
+            intervalos = _traer_todas_las_filas(
+                lambda: supabase.table("estado_intervalos").select("clave,estado,desde")
+                .in_("clave", claves_viejas).gt("hasta", desde.isoformat()).lte("desde", hasta.isoformat())
+                .order("desde", desc=False)
+            )
+        except Exception:
+            intervalos = []
+        eventos.extend({"clave": i["clave"], "estado": i["estado"], "fecha": i["desde"]} for i in intervalos)
+    return eventos, snapshots_por_clave
 
-            datos_c = h.get('datos_cierre', {})
+def _ultimo_estado_antes(claves, fecha):
+    """Ultimo evento de estado_historial de cada clave en o antes de 'fecha' (funcion ultimo_estado_antes)."""
+    try:
+        return supabase.rpc("ultimo_estado_antes", {"p_claves": claves, "p_fecha": fecha.isoformat()}).execute().data or []
+    except Exception as e:
+# Mientras no se ejecute sql/estado_historial_compactado.sql: una consulta puntual por clave (como antes).
+        print(f"Error en ultimo_estado_antes, se consulta clave por clave: {e}")
+    filas = []
+    for clave in claves:
+        filas.extend(
+            supabase.table("estado_historial").select("clave,estado,fecha")
+            .eq("clave", clave).lte("fecha", fecha.isoformat())
+            .order("fecha", desc=True).limit(1).execute().data or []
+        )
+    return filas
 
-            if datos_c:
+def cargar_tramos_inactivos(claves, desde, hasta, estados_maquinas=None, estado_inicial_por_clave=None):
+    """
+    Devuelve {clave: [(desde, hasta), ...]} con los tramos ordenados en que cada
+    una de las 'claves' estuvo inactiva. Los tramos SOLO son validos dentro de
+    la ventana [desde, hasta]: se lee el ultimo evento anterior a 'desde' (o el
+    snapshot compactado) mas los eventos dentro de la ventana, asi el costo no
+    crece con los años de historial acumulado (ver compactar_estado_historial).
+
+    Antes del primer evento de una clave se asume su estado por defecto: activa
+    para planta y areas; para maquinas, su estado ACTUAL en estado_maquinas
+    (se puede pasar ya cargado en 'estados_maquinas' para no repetir consulta).
+    'estado_inicial_por_clave' permite forzar ese estado por defecto por clave.
+    Si la consulta falla devuelve {}, y las claves sin datos cuentan 0 segundos
+    detenidos (igual que antes cuando fallaba la consulta individual).
+    """
+    claves = list(dict.fromkeys(c for c in claves if c))
+    if not claves:
+        return {}
+    eventos_compactados, snapshots_por_clave = _eventos_compactados(claves, desde, hasta)
 
-                pdf.set_font("Arial", 'B', 7)
-                pdf.set_fill_color(230,230,230)
+# Con snapshot, estado_historial solo guarda lo posterior a la compactacion: se lee desde ahi (o desde 'desde').
+    piso = min([desde] + list(snapshots_por_clave.values()))
+    try:
+        filas = _traer_todas_las_filas(
+            lambda: supabase.table("estado_historial").select("clave,estado,fecha")
+            .in_("clave", claves).gt("fecha", piso.isoformat()).lte("fecha", hasta.isoformat())
+            .order("fecha", desc=False)
+        )
+# Claves nunca compactadas: solo su ultimo evento antes de 'piso', todas en una sola consulta.
+        sin_snapshot = [c for c in claves if c not in snapshots_por_clave]
+        if sin_snapshot:
+            filas.extend(_ultimo_estado_antes(sin_snapshot, piso))
+    except Exception:
+        return {}
+    filas.extend(eventos_compactados)
 
-# ENCABEZADOS TABLA
-                pdf.cell(47,6,"OBJETO",1,0,'C',True)
-                pdf.cell(48,6,"DATO",1,0,'C',True)
-                pdf.cell(47,6,"OBJETO",1,0,'C',True)
-                pdf.cell(48,6,"DATO",1,1,'C',True)
+    eventos_por_clave = {c: [] for c in claves}
+    for ev in filas:
+        f_ev = _parsear_fecha_colombia(ev.get("fecha"))
+        if f_ev is None or ev.get("clave") not in eventos_por_clave:
+            continue
+        eventos_por_clave[ev["clave"]].append((f_ev, bool(ev.get("estado", True))))
+
+    estado_inicial_por_clave = estado_inicial_por_clave or {}
+    claves_maquina = [c for c in claves if c.startswith("maquina_activa_") and c not in estado_inicial_por_clave]
+    if claves_maquina and estados_maquinas is None:
+        estados_maquinas = obtener_estados_maquinas()
+
+    tramos_por_clave = {}
+    for clave, eventos in eventos_por_clave.items():
+        eventos.sort(key=lambda e: e[0])
+        estado_inicial = True
+        if clave in estado_inicial_por_clave:
+            estado_inicial = bool(estado_inicial_por_clave[clave])
+        elif clave.startswith("maquina_activa_"):
+            estado_inicial = bool((estados_maquinas or {}).get(clave[len("maquina_activa_"):], True))
+        tramos_por_clave[clave] = _tramos_inactivos(eventos, estado_inicial)
+    return tramos_por_clave
+
+def segundos_en_tramos(tramos, inicio, fin):
+    """Suma cuantos segundos de [inicio, fin] caen dentro de una lista ordenada de tramos (desde, hasta)."""
+    if fin <= inicio or not tramos:
+        return 0.0
+    total = 0.0
+    i = bisect.bisect_right(tramos, inicio, key=lambda t: t[1])
+    for desde, hasta in tramos[i:]:
+        if desde >= fin:
+            break
+        total += (min(hasta, fin) - max(desde, inicio)).total_seconds()
+    return max(0.0, total)
+
+def compactar_estado_historial(dias_a_conservar=30):
+    """
+    Dobla los eventos de estado_historial con mas de 'dias_a_conservar' dias en
+    tramos (clave, estado, desde, hasta) de estado_intervalos, deja en
+    estado_snapshot el estado de cada clave a la fecha de corte y borra esos
+    eventos viejos de estado_historial. Asi las consultas de tiempos detenidos
+    leen siempre una cantidad acotada de filas. Todo corre en la base de datos
+    en una sola transaccion (sql/estado_historial_compactado.sql), asi que un
+    fallo no deja tramos duplicados. Devuelve cuantos eventos compacto.
+    """
+    return supabase.rpc("compactar_estado_historial", {"p_dias": dias_a_conservar}).execute().data or 0
 
-                pdf.set_font("Arial",'',8)
+def _compactar_en_segundo_plano():
+    try:
+        compactar_estado_historial()
+    except Exception as e:
+        print(f"Error al compactar estado_historial: {e}")
 
-                items = list(datos_c.items())
+# Compactacion automatica como maximo una vez al dia por servidor (la dispara el Monitor del administrador). Corre en
+# un hilo aparte: la primera compactacion puede tardar y no debe frenar el dibujo del Monitor.
+@st.cache_data(ttl=86400, show_spinner=False)
+def _compactar_estado_historial_diario():
+    threading.Thread(target=_compactar_en_segundo_plano, daemon=True, name="compactar_estado_historial").start()
+    return True
 
-                for i in range(0,len(items),2):
+def unir_tramos(*listas_tramos):
+    """
+    Une varias listas ORDENADAS de tramos (desde, hasta) en una sola lista sin
+    solapes. Se recorren todas juntas en orden de 'desde' (heapq.merge) y se
+    van fusionando los tramos que se tocan, asi que el costo crece linealmente
+    con la cantidad de eventos. Sirve para no descontar dos veces el mismo
+    minuto cuando la planta y un area (o una parada) estuvieron detenidas a la vez.
+    """
+    unidos = []
+    for desde, hasta in heapq.merge(*listas_tramos, key=lambda t: t[0]):
+        if hasta <= desde:
+            continue
+        if unidos and desde <= unidos[-1][1]:
+            if hasta > unidos[-1][1]:
+                unidos[-1] = (unidos[-1][0], hasta)
+        else:
+            unidos.append((desde, hasta))
+    return unidos
 
-                    k1,v1 = items[i]
-                    key1 = k1.replace("_"," ").upper()
+def cargar_pausas_trabajos(trabajos, hasta):
+    """
+    Trae en UNA consulta las paradas registradas en paradas_maquina para las
+    maquinas de 'trabajos' (filas de trabajos_activos) y devuelve
+    {maquina: [(desde, hasta), ...]} ordenadas, solo con las paradas que
+    empezaron despues de la hora_inicio de ese trabajo. Si falla devuelve {}.
+    """
+    inicios = {}
+    for t in trabajos:
+        inicio_t = _parsear_fecha_colombia(t.get("hora_inicio"))
+        if t.get('maquina') and inicio_t is not None:
+            inicios[t['maquina']] = inicio_t
+    if not inicios:
+        return {}
+    try:
+        filas = _traer_todas_las_filas(
+            lambda: supabase.table("paradas_maquina").select("maquina,inicio,fin")
+            .in_("maquina", list(inicios.keys()))
+            .gte("inicio", min(inicios.values()).isoformat()).lte("inicio", hasta.isoformat())
+            .order("inicio", desc=False)
+        )
+    except Exception:
+        return {}
 
-                    if i+1 < len(items):
-                        k2,v2 = items[i+1]
-                        key2 = k2.replace("_"," ").upper()
-                    else:
-                        key2=""
-                        v2=""
+    pausas = {m: [] for m in inicios}
+    for p in filas:
+        desde_p = _parsear_fecha_colombia(p.get("inicio"))
+        hasta_p = _parsear_fecha_colombia(p.get("fin"))
+        if desde_p is None or hasta_p is None or p.get("maquina") not in inicios:
+            continue
+        if desde_p >= inicios[p["maquina"]]:
+            pausas[p["maquina"]].append((desde_p, hasta_p))
+    for m in pausas:
+        pausas[m].sort()
+    return pausas
 
-                    pdf.cell(47,6,key1,1)
-                    pdf.cell(48,6,str(v1),1)
-                    pdf.cell(47,6,key2,1)
-                    pdf.cell(48,6,str(v2),1,1)
-            
-# BLOQUE OBSERVACIONES
-            if h.get('observaciones'):
-                pdf.set_font("Arial", 'I', 8)
-                pdf.multi_cell(0, 5, f"OBSERVACIONES: {h['observaciones']}", border=1)
-            else:
-                pdf.cell(0, 1, "", ln=True, border='T')
-            pdf.ln(2)
+# Calcula cuántos segundos estuvo detenida una clave (planta/área) dentro de un intervalo [inicio, fin].
+def segundos_inactivo_en_periodo(clave: str, inicio: datetime, fin: datetime, estado_por_defecto: bool = True, tramos_por_clave=None) -> float:
+    """
+    'estado_por_defecto' se usa SOLO si todavia no existe ningun evento en el
+    historial de esta clave anterior a 'inicio' (por ejemplo, una maquina que
+    ya estaba apagada desde antes de que existiera este historial). En ese
+    caso, en vez de asumir ciegamente que estaba activa, se usa el estado
+    real actual como mejor aproximacion de lo que paso antes de tener
+    registros. Una vez el sistema lleve un tiempo funcionando, todas las
+    claves ya van a tener sus propios eventos y este valor por defecto deja
+    de ser relevante.
+    Si se pasa 'tramos_por_clave' (de cargar_tramos_inactivos) no consulta nada.
+    """
+    if fin <= inicio:
+        return 0.0
+    if tramos_por_clave is None:
+        tramos_por_clave = cargar_tramos_inactivos([clave], inicio, fin, estado_inicial_por_clave={clave: estado_por_defecto})
+    return segundos_en_tramos(tramos_por_clave.get(clave, []), inicio, fin)
 
-    pdf.ln(10)
-    pdf.set_font("Arial", 'I', 7)
-    pdf.cell(0, 10, f"DOCUMENTO OFICIAL C&B PAPELES - GENERADO AUTOMATICAMENTE - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", align='C')
-    
-    return bytes(pdf.output())
+def calcular_duracion_laboral(inicio, fin, nombre_maquina=None, tiempo_pausa_segundos=0, tramos_por_clave=None, pausas=None):
+    """
+    Calcula tiempo trabajado descontando pausas individuales y el tiempo real
+    que la planta, el area de la maquina, Y LA MAQUINA INDIVIDUAL estuvieron
+    detenidas DENTRO del intervalo [inicio, fin] — sin importar si para
+    cuando se cierra el trabajo ya estan todas reactivadas de nuevo. Antes
+    esta funcion solo miraba el estado ACTUAL (en el momento de cerrar) y
+    ponia todo en "0:00:00" si en ese instante estaba detenida, lo cual no
+    era correcto si se detuvo y reactivo DURANTE el trabajo.
+    Si no se pasa 'tramos_por_clave', trae las 3 claves en una sola consulta.
+
+    Los tramos detenidos de planta, area, maquina y las paradas del trabajo
+    ('pausas', de cargar_pausas_trabajos) se UNEN antes de restarlos: si la
+    planta y el area estuvieron apagadas al mismo tiempo ese lapso se descuenta
+    una sola vez. Si no se pasan 'pausas', se resta 'tiempo_pausa_segundos'
+    completo como antes; si se pasan pero falta alguna parada por registrar
+    en paradas_maquina, se resta solo el faltante.
+    """
+    total_segundos = (fin - inicio).total_seconds()
+    if total_segundos < 0:
+        return "0:00:00"
 
-# GENERA EL PDF DE ORDEN DE PRODUCCION — version para ROLLOS (impresos o blancos)
-def generar_op_rollos(row):
-    pdf = FPDF()
-    pdf.add_page()
+    claves = claves_estado_maquina(nombre_maquina) if nombre_maquina else ["planta_activa"]
+    if tramos_por_clave is None:
+        tramos_por_clave = cargar_tramos_inactivos(claves, inicio, fin)
 
-# LOGICA DE COLOR SEGUN ORDEN 
-    tipo_op = row.get('tipo_origen', '').upper()
+# Union de lo detenido por planta (interruptor general), área, máquina puntual y paradas del trabajo, dentro del intervalo real.
+    fuentes = [tramos_por_clave.get(c, []) for c in claves]
+    if pausas is not None:
+        fuentes.append(pausas)
+    segundos_detenido = segundos_en_tramos(unir_tramos(*fuentes), inicio, fin)
 
-    if "NUEVA" in tipo_op:
-        r, g, b = (40, 167, 69)      # VERDE
-    elif "CAMBIOS" in tipo_op:
-        r, g, b = (255, 0, 0)     # ROJO
+# Pausas que no tienen ventana registrada: se descuentan por su total acumulado.
+    if pausas is None:
+        segundos_detenido += tiempo_pausa_segundos or 0
     else:
-        r, g, b = (13, 71, 161)     # AZUL
+        pausa_con_ventana = segundos_en_tramos(unir_tramos(pausas), inicio, fin)
+        segundos_detenido += max(0, (tiempo_pausa_segundos or 0) - pausa_con_ventana)
 
-#  ENCABEZADO CON COLOR DINAMICO
-    pdf.set_fill_color(r, g, b)
-    pdf.rect(0, 0, 210, 35, 'F')
-    pdf.image("logo_cb.png", 2, 2, 60)
-    dibujar_caja_fecha_creacion(pdf, row)
-    
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 18, "ORDEN DE PRODUCCION - ROLLOS", 0, 1, "C")
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0,5,f"OP: {row['op']}   |   {row['tipo_origen']}",0,1,"C")
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(4)
-
-# INFORMACION GENERAL
-    pdf.set_fill_color(230, 230, 230)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "1. INFORMACION DE LA ORDEN", 0, 1, fill=True)
-
-    fila_grid(pdf, [
-        {"ancho": 20, "texto": " Cliente: ", "negrita": True, "fill": True},
-        {"ancho": 95, "texto": row.get('cliente',''), "negrita": False, "fill": False},
-        {"ancho": 20, "texto": " Vendedor: ", "negrita": True, "fill": True},
-        {"ancho": 55, "texto": row.get('vendedor',''), "negrita": False, "fill": False},
-    ])
-    fila_grid(pdf, [
-        {"ancho": 20, "texto": " Trabajo: ", "negrita": True, "fill": True},
-        {"ancho": 100, "texto": row.get('nombre_trabajo',''), "negrita": False, "fill": False},
-        {"ancho": 25, "texto": " Tipo Orden: ", "negrita": True, "fill": True},
-        {"ancho": 45, "texto": row.get('tipo_orden',''), "negrita": False, "fill": False},
-    ])
-
-#  ESPECIFICACIONES TECNICAS
-    pdf.ln(4)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "2. ESPECIFICACIONES TECNICAS", 0, 1, fill=True)
-
-    pdf.set_font("Arial", "B", 10); pdf.cell(20, 7, " Material: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(43, 7, f"{row.get('material','')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(20, 7, " Gramaje: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(43, 7, f"{row.get('gramaje_rollos','')} GRS", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(20, 7, " Core: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(44, 7, f"{row.get('core','')}", 1, 1) 
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Cant. Rollos: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(33, 7, f"{row.get('cantidad_rollos','')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Unid. Bolsa: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(33, 7, f"{row.get('unidades_bolsa','')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Unid. Caja: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(34, 7, f"{row.get('unidades_caja','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Ref. Comercial: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(100, 7, f"{row.get('ref_comercial','')}", 1, 0)
-    trans = "SI" if row.get('transportadora_rollos') else "NO"
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Transportadora: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(25, 7, f"{trans}", 1, 1) 
-    pdf.set_font("Arial", "B", 10); pdf.cell(20, 8, "Impresión", 1, 0, 'C', fill=True)
-    pdf.set_font("Arial", "B", 10); pdf.cell(27, 8, " Frente: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(65, 8, f"{row.get('tintas_frente_rollos', 'N/A')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(23, 8, " Respaldo: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(55, 8, f"{row.get('tintas_respaldo_rollos', 'N/A')}", 1, 1) 
-    pdf.set_font("Arial", "B", 10); pdf.cell(25, 7, " Destino: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(165, 7, f"{row.get('destino_rollos','PLANTA')}", 1, 1)
-
-# OBSERFVACIONES Y PERFORACIONES 
-    pdf.ln(4); pdf.set_font("Arial", "B", 11); 
-    pdf.cell(0, 8, "3. ADICIONALES Y OBSERVACIONES", 0, 1, fill=True)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(0, 7, f"Perforaciones: {row.get('perforaciones_detalle', 'NO')}", 1, 1)
-    pdf.set_text_color(255, 0, 0)
-    pdf.multi_cell(0, 7, f"Observaciones: {row.get('observaciones_rollos','')}", 1)
-
-# FIRMAS O SELLOS
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(4); pdf.set_font("Arial", "B", 11); 
-    pdf.cell(0, 8, "4. FIRMAS", 0, 1, fill=True)
-    pdf.ln(1); pdf.set_font("Arial", "B", 6)
-    pdf.set_fill_color(230, 230, 230)
-    pdf.cell(63, 6, "COORDINADORA COMERCIAL", 1, 0, "C", fill=True) 
-    pdf.cell(63, 6, "ASESOR", 1, 0, "C", fill=True) 
-    pdf.cell(64, 6, "SUPERVISOR DE PRODUCCION", 1, 1, "C", fill=True)
-    pdf.cell(63, 20, "", 1, 0); pdf.cell(63, 20, "", 1, 0); pdf.cell(64, 20, "", 1, 1)
-
-# DATOS DE ESTIBAS 
-    pdf.set_font("Arial", "", 11)
-    y_est = pdf.get_y() + 2
-    pdf.set_xy(10, y_est)
-    pdf.set_fill_color(210, 210, 210); pdf.set_font("Arial", 'B', 11)
-    pdf.cell(190, 5, "5 .REPORTE DE CAJAS POR ESTIBAS (PRODUCCIÓN)", 1, 1, 'C', True)
-    
-    w_e = 190 / 3
-    pdf.set_font("Arial", '', 8)
-    for i in range(4): 
-        pdf.cell(w_e, 7, f" ESTIBA {i*3+1} | Cant:_________H:___________", 1, 0)
-        pdf.cell(w_e, 7, f" ESTIBA {i*3+2} | Cant:_________H:___________", 1, 0)
-        pdf.cell(w_e, 7, f" ESTIBA {i*3+3} | Cant:_________H:___________", 1, 1)
-
-# OBSERVACIONES FINALIZADO
-    pdf.set_font("Arial", "B", 8)
-    pdf.cell(130, 8, "OBSERVACIONES FINALIZADO", 1, 0, "C"); pdf.cell(60, 8, "RECIBE", 1, 1, "C")
-    pdf.set_font("Arial", "", 7)
-    for _ in range(2):
-        pdf.cell(130, 6, "", 1, 0); pdf.cell(60, 6, "", 1, 1)
-
-# PIE
-    pdf.set_font("Arial", "I", 6)
-    pdf.cell(0, 5, f"SISTEMA C&B PAPELES - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", 0, 1, "C")
-
-    return bytes(pdf.output())
-
-
-# GENERAR PDF FORMAS       
-def generar_op_formas(row):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    tipo_op = row.get('tipo_origen', '').upper()
+    total_segundos = max(0, total_segundos - segundos_detenido)
+    return str(timedelta(seconds=int(total_segundos)))
 
-# ENCABEZADO DINAMICO
-    if "NUEVA" in tipo_op:
-        r, g, b = (40, 167, 69)      # VERDE
-    elif "CAMBIOS" in tipo_op:
-        r, g, b = (255, 0, 0)     # ROJO
-    else:
-        r, g, b = (13, 71, 161)     # AZUL
-
-# ENCABEZADO CON COLOR DINAMICO
-    pdf.set_fill_color(r, g, b)
-    pdf.rect(0, 0, 210, 35, 'F')
-    pdf.image("logo_cb.png", 2, 2, 60)
-    dibujar_caja_fecha_creacion(pdf, row)
-
-    pdf.set_text_color(255,255,255)
-    pdf.set_font("Arial","B",16)
-    pdf.cell(0,18,"ORDEN DE PRODUCCION - FORMAS",0,1,"C")
-    pdf.set_font("Arial","B",12)
-    pdf.cell(0,5,f"OP: {row['op']}   |   {row['tipo_origen']}",0,1,"C")
-    pdf.set_text_color(0,0,0)
-    pdf.ln(4)
-
-#  INFORMACION DE LA ORDEN 
-    pdf.set_fill_color(230, 230, 230)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "1. INFORMACION DE LA ORDEN", 0, 1, fill=True)
-    fila_grid(pdf, [
-        {"ancho": 25, "texto": " Cliente: ", "negrita": True, "fill": True},
-        {"ancho": 70, "texto": row.get('cliente',''), "negrita": False, "fill": False},
-        {"ancho": 25, "texto": " Vendedor: ", "negrita": True, "fill": True},
-        {"ancho": 70, "texto": row.get('vendedor',''), "negrita": False, "fill": False},
-    ])
-    fila_grid(pdf, [
-        {"ancho": 25, "texto": " Trabajo: ", "negrita": True, "fill": True},
-        {"ancho": 70, "texto": row.get('nombre_trabajo',''), "negrita": False, "fill": False},
-        {"ancho": 25, "texto": " Tipo Orden: ", "negrita": True, "fill": True},
-        {"ancho": 70, "texto": row.get('tipo_orden',''), "negrita": False, "fill": False},
-    ])
-    fila_grid(pdf, [
-        {"ancho": 25, "texto": " OP Anterior: ", "negrita": True, "fill": True},
-        {"ancho": 70, "texto": row.get('op_anterior',''), "negrita": False, "fill": False},
-        {"ancho": 25, "texto": " Ticket ", "negrita": True, "fill": True},
-        {"ancho": 70, "texto": fmt_fecha_hora(row.get('num_ticket'), con_hora=False), "negrita": False, "fill": False},
-    ])
-
-# ESPECIFICACIONES GENERALES Y ACABADOS 
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "2. ESPECIFICACIONES GENERALES Y ACABADOS", 0, 1, fill=True)
-    pdf.set_font("Arial", "B", 10); pdf.cell(23, 7, " Cantidad: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(40, 7, f"{row.get('cantidad_formas','')}FORMAS", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(18, 7, " Partes: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(45, 7, f"{row.get('num_partes','')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(26, 7, " Presentación: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(38, 7, f"{row.get('presentacion','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Numeración Del: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('num_id','NO')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Numeración Al: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('num_fd','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Código Barras: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(90, 7, f"{row.get('codigo_barras_detalle','')}", 1, 0)
-    trans = "SI" if row.get('transportadora_formas') else "NO"
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Transportadora: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(35, 7, f"{trans}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(25, 7, " Tipo Pegue: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(70, 7, f"{row.get('presentacion2', 'N/A')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(25, 7, " Destino: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(70, 7, f"{row.get('destino_formas','NO APLICA')}", 1, 1)
-
-# PERFORACIONES
-    pdf.ln(4)
-    pdf.set_font("Arial","B",11)
-    pdf.cell(0,8,"3. PERFORACIONES",0,1,fill=True)
-    pdf.set_font("Arial","",10)
-    pdf.multi_cell(0,7,row.get("perforaciones_detalle","SIN PERFORACIONES"), 1)
-
-# DETALLE TECNICO POR PARTE
-    pdf.ln(4)
-    pdf.set_font("Arial","B",11)
-    pdf.cell(0,8,"4. DETALLE TECNICO POR PARTE",0,1,fill=True)
-    pdf.set_font("Arial","B",8)
-    pdf.set_fill_color(200,200,200)
-    pdf.cell(4,7,"P",1,0,"C",True)
-    pdf.cell(15,7,"ANCHO",1,0,"C",True)
-    pdf.cell(15,7,"LARGO",1,0,"C",True)
-    pdf.cell(28,7,"PAPEL",1,0,"C",True)
-    pdf.cell(20,7,"COLOR",1,0,"C",True)
-    pdf.cell(12,7,"GR",1,0,"C",True)
-    pdf.cell(50,7,"T. FRENTE",1,0,"C",True)
-    pdf.cell(23,7,"T. RESP",1,0,"C",True)
-    pdf.cell(23,7,"OBS",1,1,"C",True)
-
-    pdf.set_font("Arial","",7.5)
-    partes = row.get("detalles_partes_json",[])
-    for p in partes:
-        cell_fit(pdf,4,7,p.get("p",""))
-        cell_fit(pdf,15,7,p.get("anc",""))
-        cell_fit(pdf,15,7,p.get("lar",""))
-        cell_fit(pdf,28,7,p.get("papel",""))
-        cell_fit(pdf,20,7,p.get("color_fondo",""))
-        cell_fit(pdf,12,7,p.get("gramos",""))
-        cell_fit(pdf,50,7,p.get("tf",""))
-        cell_fit(pdf,23,7,p.get("tr",""))
-        cell_fit(pdf,23,7,p.get("obs_parte","")) 
-        pdf.ln()
-
-# OBSERVACIONES GENERALES
-    pdf.ln(5)
-    pdf.set_font("Arial","B",11)
-    pdf.set_text_color(255, 0, 0)
-    pdf.cell(0,8,"5. OBSERVACIONES GENERALES",0,1,fill=True)
-    pdf.set_font("Arial","",10)
-    pdf.multi_cell(0,7,row.get("observaciones_formas",""), 1)
-
-# FIRMAS
-    pdf.ln(1)
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(4); pdf.set_font("Arial", "B", 11); 
-    pdf.cell(0, 8, "4. FIRMAS", 0, 1, fill=True)
-    pdf.ln(1); pdf.set_font("Arial", "B", 6)
-    pdf.set_fill_color(230, 230, 230)
-    pdf.cell(63, 6, "COORDINADORA COMERCIAL", 1, 0, "C", fill=True) 
-    pdf.cell(63, 6, "ASESOR", 1, 0, "C", fill=True) 
-    pdf.cell(64, 6, "SUPERVISOR DE PRODUCCION", 1, 1, "C", fill=True)
-    pdf.cell(63, 20, "", 1, 0); pdf.cell(63, 20, "", 1, 0); pdf.cell(64, 20, "", 1, 1)
-
-    pdf.set_font("Arial","B",8)
-    pdf.cell(130,8,"OBSERVACIONES",1,0,"C")
-    pdf.cell(60,8,"RECIBE",1,1,"C")
-
-    pdf.set_font("Arial", "B", 8)
-    pdf.cell(130, 8, "OBSERVACIONES FINALIZADO", 1, 0, "C"); pdf.cell(60, 8, "RECIBE", 1, 1, "C")
-    pdf.set_font("Arial", "", 7)
-    for _ in range(2):
-        pdf.cell(130, 6, "", 1, 0); pdf.cell(60, 6, "", 1, 1)
-
-# PIE
-    pdf.set_font("Arial", "I", 6)
-    pdf.cell(0, 5, f"SISTEMA C&B PAPELES - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", 0, 1, "C")
-
-    return bytes(pdf.output())
-
-# GENERA EL PDF DE ORDEN DE PRODUCCION — version para REBOBINADO
-def generar_op_rebobinado(row):
-    pdf = FPDF()
-    pdf.add_page()
+def calcular_duraciones_laborales(trabajos, fin, estados_maquinas=None):
+    """
+    Version por lotes de calcular_duracion_laboral para muchos trabajos_activos
+    a la vez (Monitor): una sola consulta a estado_historial y otra a
+    paradas_maquina para todas las maquinas. Devuelve {maquina: 'H:MM:SS'};
+    omite filas con hora_inicio invalida.
+    """
+    claves = [c for t in trabajos for c in claves_estado_maquina(t.get('maquina'))]
+    inicios = [i for i in (_parsear_fecha_colombia(t.get("hora_inicio")) for t in trabajos) if i is not None]
+    if not inicios:
+        return {}
+    tramos_por_clave = cargar_tramos_inactivos(claves, min(inicios), fin, estados_maquinas)
+    pausas_por_maquina = cargar_pausas_trabajos(trabajos, fin)
+    duraciones = {}
+    for t in trabajos:
+        inicio = _parsear_fecha_colombia(t.get("hora_inicio"))
+        if inicio is None:
+            continue
+        duraciones[t['maquina']] = calcular_duracion_laboral(
+            inicio, fin, t['maquina'], t.get('tiempo_pausa', 0) or 0,
+            tramos_por_clave=tramos_por_clave, pausas=pausas_por_maquina.get(t['maquina'])
+        )
+    return duraciones
     
-    tipo_op = row.get('tipo_origen', '').upper()
-
-# ENCABEZADO 
-    if "NUEVA" in tipo_op:
-        r, g, b = (40, 167, 69)      # VERDE
-    elif "CAMBIOS" in tipo_op:
-        r, g, b = (255, 0, 0)     # ROJO
-    else:
-        r, g, b = (13, 71, 161)     # AZUL
-
-#  ENCABEZADO CON COLOR DINAMICO
-    pdf.set_fill_color(r, g, b)
-    pdf.rect(0, 0, 210, 35, 'F')
-    pdf.image("logo_cb.png", 2, 2, 60)
-    dibujar_caja_fecha_creacion(pdf, row)
-
-    pdf.set_text_color(255,255,255)
-    pdf.set_font("Arial","B",16)
-    pdf.cell(0,18,"ORDEN DE PRODUCCION - REBOBINADO",0,1,"C")
-    pdf.set_font("Arial","B",12)
-    pdf.cell(0,5,f"OP: {row['op']}   |   {row['tipo_origen']}",0,1,"C")
-    pdf.set_text_color(0,0,0)
-    pdf.ln(4)
-
-# INFORMACION GENERAL
-    pdf.set_fill_color(230,230,230)
-    pdf.set_font("Arial","B",11)
-    pdf.cell(0,8,"1. INFORMACION GENERAL",0,1,fill=True)
-    pdf.set_font("Arial","",10)
-
-    fila_grid(pdf, [
-        {"ancho": 95, "texto": f"Cliente: {row.get('cliente','')}", "negrita": False, "fill": False},
-        {"ancho": 95, "texto": f"Vendedor: {row.get('vendedor','')}", "negrita": False, "fill": False},
-    ])
-    fila_grid(pdf, [
-        {"ancho": 95, "texto": f"Trabajo: {row.get('nombre_trabajo','')}", "negrita": False, "fill": False},
-        {"ancho": 95, "texto": f"OP Anterior: {row.get('op_anterior','N/A')}", "negrita": False, "fill": False},
-    ])
-    fila_grid(pdf, [
-        {"ancho": 190, "texto": f"Fecha de Creacion: {fmt_fecha_hora(row.get('created_at'), con_hora=False)}", "negrita": False, "fill": False},
-    ])
-
-# DATOS TECNICOS DE ENTRADA Y OBJETIVO
-    pdf.ln(4)
-    pdf.set_font("Arial","B",11)
-    pdf.cell(0,8,"2. DATOS TECNICOS Y OBJETIVO DEL PROCESO",0,1,fill=True)
-    pdf.set_font("Arial","",10)
-
-#  MATERIAL Y DIMENCIONES
-    pdf.cell(63,7,f"Material Base: {row.get('material','')}",1)
-    pdf.cell(63,7,f"Gramaje: {row.get('gramaje_rollos','')}g",1)
-    pdf.cell(64,7,f"Referencia Comercial: {row.get('ref_comercial','')}",1,1)
-
-# CANTIDADES
-    pdf.cell(95,7,f"Cantidad Rollos Solicitados: {row.get('cantidad_rollos','')}",1)
-    pdf.cell(95,7,f"Tipo de Creacion: {row.get('tipo_creacion','NUEVA')}",1,1)
-
-# OBJETIVO DE REBOBINADO (IMPRESION O PARA QUE )
-    pdf.set_font("Arial","B",10)
-    pdf.cell(190,7,"OBJETIVO PRINCIPAL DEL REBOBINADO:", "LTR", 1)
-    pdf.set_font("Arial","",10)
-    pdf.multi_cell(190,7, row.get('objetivo_rebobinado','No especificado'), "LRB")
-
-# OBSERVACIONES DE PLANIFICACION
-    pdf.ln(5)
-    pdf.set_font("Arial","B",11)
-    pdf.cell(0,8,"3. OBSERVACIONES ADICIONALES",0,1,fill=True)
-    pdf.set_font("Arial","",10)
-    pdf.multi_cell(0,7, row.get("observaciones_rollos","Sin observaciones adicionales"), 1)
-
-# ESPACIO PARA ANOTACIONES DE PLANTA 
-    pdf.ln(5)
-    pdf.set_font("Arial","I",8)
-    pdf.cell(0,5,"* Espacio reservado para el operario: verificar empalmes y diámetros finales.",0,1)
-
-# PIE DE PAGINA
-    pdf.ln(10)
-    pdf.set_font("Arial","I",7)
-    pdf.cell(0,10,f"SISTEMA C&B PAPELES - GENERADO: {hora_colombia().strftime('%d/%m/%Y %H:%M')}",0,1,"C")
-
-    return bytes(pdf.output())
-
-# Genera el PDF de Bolsas: especificaciones, producción, empaque y firmas.
-def generar_op_bolsas(row):
-    pdf = FPDF()
-    pdf.add_page()
-
-# LOGICA DE COLOR SEGUN ORDEN (misma logica que los demas PDF)
-    tipo_op = row.get('tipo_origen', '').upper()
-    if "NUEVA" in tipo_op:
-        r, g, b = (40, 167, 69)      # VERDE
-    elif "CAMBIOS" in tipo_op:
-        r, g, b = (255, 0, 0)       # ROJO
+# CACHE DE PDFs DE ORDEN: compartido por todas las sesiones del servidor, con limite de memoria (se expulsa el menos usado).
+PDF_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+@st.cache_resource(show_spinner=False)
+def _cache_pdfs_orden():
+    return {"pdfs": OrderedDict(), "bytes": 0, "lock": threading.Lock()}
+
+def _clave_pdf_orden(row):
+    """(op, hash del contenido de la fila): si la OP se edita, el hash cambia y el PDF se vuelve a generar."""
+    contenido = json.dumps(row, sort_keys=True, default=str).encode("utf-8")
+    return (str(row.get('op')), hashlib.sha1(contenido).hexdigest())
+
+def pdf_orden_en_cache(row):
+    """Devuelve los bytes del PDF de la orden si ya se genero con este mismo contenido, o None."""
+    cache = _cache_pdfs_orden()
+    clave = _clave_pdf_orden(row)
+    with cache["lock"]:
+        pdf_bytes = cache["pdfs"].get(clave)
+        if pdf_bytes is not None:
+            cache["pdfs"].move_to_end(clave)
+        return pdf_bytes
+
+def pdf_orden_cacheado(row):
+    """Devuelve el PDF de la orden desde la cache, generandolo solo si no esta (o si la fila cambio)."""
+    pdf_bytes = pdf_orden_en_cache(row)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    pdf_bytes = generar_pdf_orden_por_tipo(row)
+    _guardar_pdf_orden(row, pdf_bytes)
+    return pdf_bytes
+
+def _guardar_pdf_orden(row, pdf_bytes):
+    cache = _cache_pdfs_orden()
+    clave = _clave_pdf_orden(row)
+    with cache["lock"]:
+        if clave not in cache["pdfs"]:
+            cache["pdfs"][clave] = pdf_bytes
+            cache["bytes"] += len(pdf_bytes)
+        while cache["bytes"] > PDF_CACHE_MAX_BYTES and len(cache["pdfs"]) > 1:
+            _, expulsado = cache["pdfs"].popitem(last=False)
+            cache["bytes"] -= len(expulsado)
+
+# PAQUETE DE TRABAJO: todas las OPs de la cola de un area (o creadas entre dos fechas) en un solo PDF o ZIP. Los PDF
+# que no estan en la cache se generan en paralelo en varios procesos (lote_pdf.py) y quedan guardados en la cache.
+PAQUETE_MAX_OPS = 300
+
+def ordenes_para_paquete(area=None, desde=None, hasta=None):
+    """
+    Filas completas de las OPs no anuladas de la cola de 'area' (las mismas de
+    cola_ops_area, con las que tienen una entrega parcial activa en el area),
+    o creadas entre desde y hasta (date, inclusivas).
+    """
+    tz = pytz.timezone("America/Bogota")
+    consulta = supabase.table("ordenes_planeadas").select("*").not_.is_("anulada", "true")
+    if area:
+        consulta = consulta.or_(f"proxima_area.eq.{area},estado_parcial.eq.ACTIVO EN {area}")
     else:
-        r, g, b = (13, 71, 161)     # AZUL
-
-#  ENCABEZADO
-    pdf.set_fill_color(r, g, b)
-    pdf.rect(0, 0, 210, 35, 'F')
-    pdf.image("logo_cb.png", 2, 2, 60)
-    dibujar_caja_fecha_creacion(pdf, row)
-
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 18, "ORDEN DE PRODUCCION - BOLSAS", 0, 1, "C")
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 5, f"OP: {row['op']}   |   {row['tipo_origen']}", 0, 1, "C")
-
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(4)
-
-# INFORMACION GENERAL
-    pdf.set_fill_color(250, 224, 196)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "1. INFORMACION DE LA ORDEN", 0, 1, fill=True)
-
-    pdf.set_fill_color(250, 224, 196)
-    fila_grid(pdf, [
-        {"ancho": 20, "texto": " Cliente: ", "negrita": True, "fill": True},
-        {"ancho": 95, "texto": row.get('cliente',''), "negrita": False, "fill": False},
-        {"ancho": 20, "texto": " Vendedor: ", "negrita": True, "fill": True},
-        {"ancho": 55, "texto": row.get('vendedor',''), "negrita": False, "fill": False},
-    ])
-    fila_grid(pdf, [
-        {"ancho": 20, "texto": " Trabajo: ", "negrita": True, "fill": True},
-        {"ancho": 100, "texto": row.get('nombre_trabajo',''), "negrita": False, "fill": False},
-        {"ancho": 25, "texto": " Op Anterior: ", "negrita": True, "fill": True},
-        {"ancho": 45, "texto": row.get('op_anterior',''), "negrita": False, "fill": False},
-    ])
-    fila_grid(pdf, [
-        {"ancho": 40, "texto": " Cantidad De Bolsas: ", "negrita": True, "fill": True},
-        {"ancho": 80, "texto": row.get('bolsa_cantidad',''), "negrita": False, "fill": False},
-        {"ancho": 25, "texto": " Ticket: ", "negrita": True, "fill": True},
-        {"ancho": 45, "texto": row.get('num_ticket',''), "negrita": False, "fill": False},
-    ])
-
-# ESPECIFICACIONES DE LA BOLSA
-    pdf.set_fill_color(250, 224, 196)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "ESPECIFICACIONES DE LA BOLSA", 0, 1, "C", fill=True)
-
-# Guarda dónde empieza la tabla, para ubicar el diagrama de la bolsa a la derecha, a la misma altura.
-    y_inicio_specs = pdf.get_y()
-
-    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (C) Largo Total De La Bolsa: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_c_largo_total','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (c) Largo Util De La Bolsa: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_c_largo_util','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (W) Ancho De La Bolsa: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_w_ancho','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (H) Fuelle De La Bolsa: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_w_ancho','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (h) Pestaña De Fondo: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_h_pestana','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Tipo De Manija: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(30, 7, f"{row.get('bolsa_tipo_manija','')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Base De Bolsa: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(30, 7, f"{row.get('bolsa_base','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " Material Para Bolsa: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_material','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " Gramaje Del Material: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_gramaje','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(40, 7, " Certificacion FSC: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(20, 7, f"{row.get('bolsa_certificacion_fsc','')}", 1, 0)
-    pdf.set_font("Arial", "B", 10); pdf.cell(40, 7, "Cantidad De Tintas: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(20, 7, f"{row.get('bolsa_tintas_num','')}", 1, 1)
-    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Colores: ", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 10);  pdf.cell(90, 7, f"{row.get('bolsa_tintas_color','')}", 1, 1)
-
-    y_fin_specs = pdf.get_y()
-
-# Dibuja el diagrama de la bolsa (W, C, c, H, h) en el espacio libre a la derecha de la tabla.
-    alto_disponible_diagrama = y_fin_specs - y_inicio_specs - 2
-    try:
-        pdf.image("bolsa_diagrama.png", x=133, y=y_inicio_specs + 1, h=alto_disponible_diagrama)
-    except Exception:
-        pass  # si la imagen no esta disponible en el servidor, el PDF se genera igual sin el diagrama
-
-    pdf.set_y(y_fin_specs)
-
-
-# OBSERVACIONES
-    pdf.ln(3)
-    pdf.set_fill_color(250, 224, 196)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "OBSERVACIONES", 0, 1, "C", fill=True)
-    pdf.set_font("Arial", "", 9)
-    pdf.multi_cell(190, 7, row.get('observaciones_bolsa', '') or "Sin observaciones", 1)
-
-# ESPECIFICACIONES PRODUCCION
-    pdf.ln(3)
-    pdf.set_fill_color(250, 224, 196)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "ESPECIFICACIONES PRODUCCIÓN", 0, 1, "C", fill=True)
-
-    w_prod = 190 / 3
-    pdf.set_font("Arial", "B", 8)
-    pdf.cell(w_prod, 7, " Ancho de la bobina", 1, 0, fill=True)
-    pdf.cell(w_prod, 7, " Rodillo de Impresión", 1, 0, fill=True)
-    pdf.cell(w_prod, 7, " Metros Rebobinado", 1, 1, fill=True)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(w_prod, 8, f"{row.get('bolsa_ancho_bobina') or ''}", 1, 0, "C")
-    pdf.cell(w_prod, 8, f"{row.get('bolsa_rodillo_impresion') or ''}", 1, 0, "C")
-    pdf.cell(w_prod, 8, f"{row.get('bolsa_metros_rebobinado') or ''}", 1, 1, "C")
-
-    pdf.ln(2)
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(60, 8, " Bolsas Producidas:", 1, 0, fill=True)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(50, 8, f"{row.get('bolsa_producidas') or ''}", 1, 1, "C")
-
-# CONFIGURACION DE EMPAQUE
-    pdf.ln(3)
-    pdf.set_fill_color(250, 224, 196)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "CONFIGURACIÓN DE EMPAQUE", 0, 1, "C", fill=True)
-
-    w_emp = 190 / 3
-    pdf.set_font("Arial", "B", 8)
-    pdf.cell(w_emp, 7, "BOLSAS POR CAJA", 1, 0, "C", fill=True)
-    pdf.cell(w_emp, 7, "CAJAS EN TOTAL", 1, 0, "C", fill=True)
-    pdf.cell(w_emp, 7, "CAJAS POR ESTIBA", 1, 1, "C", fill=True)
-    pdf.set_font("Arial", "", 10)
-    pdf.cell(w_emp, 10, f"{row.get('bolsa_por_caja') or ''}", 1, 0, "C")
-    pdf.cell(w_emp, 10, f"{row.get('bolsa_cajas_total') or ''}", 1, 0, "C")
-    pdf.cell(w_emp, 10, f"{row.get('bolsa_cajas_por_estiba') or ''}", 1, 1, "C")
-
-# FIRMAS
-    pdf.ln(6)
-    pdf.set_fill_color(230, 230, 230)
-    pdf.set_font("Arial", "B", 6)
-    w_firma = 190 / 3
-    pdf.cell(w_firma, 6, "FIRMA COORDINADORA COMERCIAL", 1, 0, "C", fill=True)
-    pdf.cell(w_firma, 6, "FIRMA ASESOR", 1, 0, "C", fill=True)
-    pdf.cell(w_firma, 6, "FIRMA JEFE DE DISEÑO", 1, 1, "C", fill=True)
-    pdf.cell(w_firma, 18, "", 1, 0)
-    pdf.cell(w_firma, 18, "", 1, 0)
-    pdf.cell(w_firma, 18, "", 1, 1)
-
-    pdf.set_font("Arial", "B", 6)
-    pdf.cell(w_firma, 6, "FIRMA COTIZADORA", 1, 0, "C", fill=True)
-    pdf.cell(w_firma, 6, "FIRMA JEFE DE ÁREA DE PRODUCCIÓN", 1, 0, "C", fill=True)
-    pdf.cell(w_firma, 6, "FIRMA DE OPERARIO DE MÁQUINA", 1, 1, "C", fill=True)
-    pdf.cell(w_firma, 18, "", 1, 0)
-    pdf.cell(w_firma, 18, "", 1, 0)
-    pdf.cell(w_firma, 18, "", 1, 1)
-
-# PIE
-    pdf.set_font("Arial", "I", 6)
-    pdf.cell(0, 8, f"SISTEMA C&B PAPELES - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", 0, 1, "C")
-
-    return bytes(pdf.output())
+        consulta = consulta.neq("proxima_area", "ANULADA")
+        if desde:
+            consulta = consulta.gte("created_at", tz.localize(datetime.combine(desde, datetime.min.time())).isoformat())
+        if hasta:
+            consulta = consulta.lt("created_at", tz.localize(datetime.combine(hasta + timedelta(days=1), datetime.min.time())).isoformat())
+    return consulta.order("created_at").order("id").limit(PAQUETE_MAX_OPS).execute().data or []
+
+def pdfs_ordenes_lote(rows):
+    """PDF de cada orden, en el mismo orden: los que ya estan en la cache se reutilizan y el resto se genera en paralelo."""
+    pdfs = [pdf_orden_en_cache(row) for row in rows]
+    faltantes = [i for i, pdf_bytes in enumerate(pdfs) if pdf_bytes is None]
+    if faltantes:
+        nuevos = lote_pdf.generar_pdfs([rows[i] for i in faltantes], generar_pdf_orden_por_tipo)
+        for i, pdf_bytes in zip(faltantes, nuevos):
+            pdfs[i] = pdf_bytes
+            _guardar_pdf_orden(rows[i], pdf_bytes)
+    return pdfs
+
+def paquete_trabajo(rows, un_solo_pdf):
+    """(bytes, extension, mime) del paquete: un solo PDF con todas las OPs (si hay pypdf) o un ZIP con un PDF por OP."""
+    pdfs = pdfs_ordenes_lote(rows)
+    if un_solo_pdf and lote_pdf.PYPDF_DISPONIBLE:
+        return lote_pdf.unir_pdfs(pdfs), "pdf", "application/pdf"
+    archivos = {f"OP_{row['op']}.pdf": pdf_bytes for row, pdf_bytes in zip(rows, pdfs)}
+    return lote_pdf.zip_pdfs(archivos), "zip", "application/zip"
 
 
 # RADIOGRAFIA TECNICA
@@ -1353,6 +1171,32 @@ def modal_detalle_op(row):
 if 'sel_tipo' not in st.session_state: st.session_state.sel_tipo = None
 if 'rep' not in st.session_state: st.session_state.rep = None
 
+# KIOSKO DEL MONITOR PARA LAS TVs: si el secret KIOSKO_PUERTO esta configurado, un servidor HTTP de solo lectura por
+# proceso (monitor_kiosko.py) publica la foto compartida de la planta en ese puerto. Se levanta ANTES del login, con la
+# primera visita al sistema, y queda corriendo; publica datos desde que una sesion entra al sistema (antes responde 503,
+# ver /salud). Escucha en la IP de la red local o en el secret KIOSKO_HOST; las TVs abren http://<servidor>:<puerto>/.
+@st.cache_resource(show_spinner=False)
+def _fuente_kiosko():
+    return {"obtener": None}
+
+@st.cache_resource(show_spinner=False)
+def _servidor_kiosko():
+    try:
+        puerto = int(st.secrets.get("KIOSKO_PUERTO", 0) or 0)
+        host = st.secrets.get("KIOSKO_HOST") or None
+    except Exception:
+        puerto, host = 0, None
+    if not puerto:
+        return None
+    fuente = _fuente_kiosko()
+    try:
+        return monitor_kiosko.iniciar_en_hilo(lambda: fuente["obtener"]() if fuente["obtener"] else None, puerto, host)
+    except Exception as e:
+        print(f"No se pudo iniciar el kiosko del Monitor en el puerto {puerto}: {e}")
+        return None
+
+_servidor_kiosko()
+
 # LOGIN PRINCIPAL  LOGUIN
 if not st.session_state.get('autenticado'):
 
@@ -1498,6 +1342,14 @@ def obtener_estado_maquina(nombre_maquina):
     except:
         return True
 
+# Estado ON/OFF de TODAS las maquinas en una sola consulta: {maquina: estado}. Las que no estan en la tabla se asumen ON.
+def obtener_estados_maquinas():
+    try:
+        res = supabase.table("estado_maquinas").select("maquina,estado").execute()
+        return {r['maquina']: r['estado'] for r in (res.data or [])}
+    except Exception:
+        return {}
+
 # Cambia el estado ON/OFF de UNA maquina puntual (activa <-> fuera de servicio), usado por el administrador desde el Monitor
 def cambiar_estado_maquina(nombre_maquina, nuevo_estado, usuario="admin"):
     ahora_cambio_maq = hora_colombia().isoformat()
@@ -1520,23 +1372,52 @@ def cambiar_estado_maquina(nombre_maquina, nuevo_estado, usuario="admin"):
         }).execute()
     except Exception as e:
         print(f"Error al guardar historial de maquina_activa_{nombre_maquina}: {e}")
+    invalidar_snapshot_planta()
+
+# ULTIMA ACTIVIDAD DE CADA MAQUINA (ver sql/maquinas_ultima_actividad.sql): se actualiza en cada cierre para que
+# "INICIAR" calcule el tiempo libre con una sola lectura por clave.
+def marcar_actividad_maquina(nombre_maquina, fecha_txt, op=None):
+    """Guarda el cierre de un paso (fecha 'dd/mm/aaaa hh:mm', hora Colombia) como ultima actividad de la maquina."""
+    try:
+        fecha = pytz.timezone("America/Bogota").localize(datetime.strptime(fecha_txt, "%d/%m/%Y %H:%M"))
+        supabase.rpc("marcar_actividad_maquina", {
+            "p_maquina": nombre_maquina,
+            "p_fecha": fecha.isoformat(),
+            "p_op": op
+        }).execute()
+    except Exception as e:
+        print(f"Error al guardar la ultima actividad de {nombre_maquina}: {e}")
 
 def obtener_ultima_actividad_maquina(nombre_maquina):
     """
-    Busca en el historial de ordenes RECIENTES cual fue la ultima vez que esta
-    maquina termino un paso de produccion (ultima fecha en historial_procesos).
+    Cual fue la ultima vez que esta maquina termino un paso de produccion.
     Esto reemplaza la logica anterior que buscaba en 'tiempos_muertos', la cual
     nunca podia arrancar porque dependia de un registro previo en esa misma tabla
     que nunca llegaba a crearse.
     Devuelve un datetime con zona horaria Colombia, o None si la maquina nunca ha trabajado.
 
-    OPTIMIZACION: antes esta funcion traia el historial_procesos de TODAS las
-    ordenes de TODA la historia de la empresa cada vez que alguien presionaba
-    "INICIAR" en una maquina — con miles de ordenes historicas, eso volvia lenta
-    esa accion tan frecuente. Ahora solo se piden las 400 ordenes creadas mas
-    recientemente (mas que suficiente para encontrar la ultima actividad real de
-    cualquier maquina, ya que ninguna maquina deberia llevar meses sin trabajar).
+    Se lee la fila de la maquina en maquinas_ultima_actividad; si no la tiene,
+    el ultimo paso de historial_pasos (indice maquina, fecha). Solo si ninguna
+    de las dos tablas existe se revisa el historial_procesos de las 400 OPs mas
+    recientes, como antes.
     """
+    try:
+        fila = supabase.table("maquinas_ultima_actividad").select("fecha").eq("maquina", nombre_maquina).execute().data
+        if fila:
+            return _parsear_fecha_colombia(fila[0]["fecha"])
+    except Exception as e:
+        print(f"Error leyendo maquinas_ultima_actividad de {nombre_maquina}: {e}")
+
+    if historial_pasos_disponible():
+        try:
+            ultimo = (
+                supabase.table("historial_pasos").select("fecha")
+                .eq("maquina", nombre_maquina).not_.is_("fecha", "null")
+                .order("fecha", desc=True).limit(1).execute().data or []
+            )
+            return _parsear_fecha_colombia(ultimo[0]["fecha"]) if ultimo else None
+        except Exception as e:
+            print(f"Error leyendo historial_pasos de {nombre_maquina}, se usa el JSON: {e}")
     try:
         ops_data = (
             supabase.table("ordenes_planeadas")
@@ -1607,7 +1488,16 @@ def _ultima_fecha_relevante_historial(historial):
                 continue
     return None
 
-def calcular_tiempo_en_area(op_data):
+def fecha_entrada_area_actual(op_data):
+    """Momento en que la OP entro a su area actual: ultimo paso real del historial, o la creacion de la OP. None si no hay."""
+    entrada = _ultima_fecha_relevante_historial(op_data.get('historial_procesos'))
+    if entrada is None:
+        raw_creacion = op_data.get('created_at') or op_data.get('fecha_creacion')
+        if raw_creacion:
+            entrada = _parsear_fecha_colombia(raw_creacion)
+    return entrada
+
+def calcular_tiempo_en_area(op_data, tramos_por_clave=None):
     """
     Calcula cuanto tiempo lleva (o llevó) una OP en su area actual: desde el
     ultimo paso 'real' registrado en su historial (ignorando ediciones), o si
@@ -1621,72 +1511,237 @@ def calcular_tiempo_en_area(op_data):
     consultando el historial de encendido/apagado — sin importar si para
     cuando se hace este calculo la planta ya está reactivada de nuevo.
 
+    Si se pasa 'tramos_por_clave' (de cargar_tramos_inactivos, con la clave
+    'planta_activa' y una ventana que empiece en o antes de
+    fecha_entrada_area_actual(op_data)) se reutiliza en vez de consultar otra vez.
+
     Devuelve una tupla (segundos, texto 'H:MM:SS').
     """
-    tz = pytz.timezone("America/Bogota")
-    entrada = _ultima_fecha_relevante_historial(op_data.get('historial_procesos'))
-    if entrada is None:
-        raw_creacion = op_data.get('created_at') or op_data.get('fecha_creacion')
-        if raw_creacion:
-            try:
-                dt = datetime.fromisoformat(str(raw_creacion).replace("Z", "+00:00"))
-                entrada = dt.astimezone(tz) if dt.tzinfo else tz.localize(dt)
-            except Exception:
-                entrada = None
+    entrada = fecha_entrada_area_actual(op_data)
     if entrada is None:
         return 0, "N/A"
 
     ahora = hora_colombia()
     segundos_totales = max(0, (ahora - entrada).total_seconds())
-    segundos_detenido = segundos_inactivo_en_periodo("planta_activa", entrada, ahora)
+    segundos_detenido = segundos_inactivo_en_periodo("planta_activa", entrada, ahora, tramos_por_clave=tramos_por_clave)
     segundos = max(0, segundos_totales - segundos_detenido)
     return segundos, str(timedelta(seconds=int(segundos)))
 
 
-# Historial aplanado de todas las OPs (una fila por paso) para Rendimiento Maquinistas; cache 2 min.
-@st.cache_data(ttl=120, show_spinner="Cargando historial de producción...")
-def _cargar_historial_para_rendimiento():
-    data = supabase.table("ordenes_planeadas").select("op,tipo_orden,nombre_trabajo,cliente,historial_procesos").execute().data or []
+# PASOS DE PRODUCCION NORMALIZADOS (ver sql/historial_pasos.sql): cada paso del historial_procesos tambien queda como
+# una fila de historial_pasos, indexada por maquina y por operario. Si la tabla aun no existe, todo sigue con el JSON.
+@st.cache_data(ttl=300, show_spinner=False)
+def historial_pasos_disponible():
+    try:
+        supabase.table("historial_pasos").select("id").limit(1).execute()
+        return True
+    except Exception:
+        return False
+
+def registrar_paso_op(op, historial, cambios=None):
+    """
+    Guarda el ultimo paso de 'historial' (ya agregado al final de la lista)
+    junto con los demas cambios de la OP. Con historial_pasos instalado, la
+    funcion registrar_paso() de Supabase agrega el paso al JSON, aplica los
+    cambios y crea la fila normalizada en una sola transaccion; si no, se
+    actualiza la OP como antes.
+    """
+    cambios = dict(cambios or {})
+    guardado = False
+    if historial and historial_pasos_disponible():
+        try:
+            supabase.rpc("registrar_paso", {"p_op": op, "p_paso": historial[-1], "p_cambios": cambios}).execute()
+            guardado = True
+        except Exception as e:
+            print(f"Error en registrar_paso de la OP {op}, se guarda solo el JSON: {e}")
+    if not guardado:
+        cambios["historial_procesos"] = historial
+        supabase.table("ordenes_planeadas").update(cambios).eq("op", op).execute()
+    cola_ops_area.clear()
+    invalidar_snapshot_planta()
+
+# Los cierres en maquina (final, parcial, Bolsas) mueven la ultima actividad de esa maquina.
+    paso = historial[-1] if historial else {}
+    if paso.get("maquina") and paso["maquina"] != "—" and paso.get("fecha"):
+        marcar_actividad_maquina(paso["maquina"], paso["fecha"], op)
+
+def respaldar_historial_pasos():
+    """Copia a historial_pasos los pasos del JSON que todavia no esten (no duplica). Devuelve cuantos se agregaron."""
+    res = supabase.rpc("respaldar_historial_pasos", {}).execute()
+    return res.data or 0
+
+def adjuntar_historial_pasos(ordenes):
+    """
+    Reemplaza el historial_procesos de cada OP por sus filas de historial_pasos
+    (en orden), solo si la tabla ya tiene todos los pasos del JSON. Las OPs sin
+    pasos en el JSON no se consultan.
+    """
+    if not ordenes or not historial_pasos_disponible():
+        return ordenes
+    ids = [o["id"] for o in ordenes if o.get("id") is not None and o.get("historial_procesos")]
+    if not ids:
+        return ordenes
+    try:
+        filas = _traer_todas_las_filas(
+            lambda: supabase.table("historial_pasos").select("orden_id,orden_paso,paso")
+            .in_("orden_id", ids).order("orden_id").order("orden_paso")
+        )
+    except Exception as e:
+        print(f"Error leyendo historial_pasos, se usa el JSON: {e}")
+        return ordenes
+    pasos_por_orden = {}
+    for f in filas:
+        pasos_por_orden.setdefault(f["orden_id"], []).append(f["paso"])
+    for o in ordenes:
+        pasos = pasos_por_orden.get(o.get("id"))
+        if pasos and len(pasos) >= len(o.get("historial_procesos") or []):
+            o["historial_procesos"] = pasos
+    return ordenes
+
+
+# HISTORIAL APLANADO PARA RENDIMIENTO MAQUINISTAS (una fila por paso), leido de historial_pasos_detalle con el filtro
+# de operario o maquina y de fechas resuelto por la base de datos. Sin esa tabla se arma desde el JSON de las OPs.
+COLUMNAS_PASOS_RENDIMIENTO = [
+    "op", "tipo_orden", "nombre_trabajo", "cliente", "area", "maquina", "operario", "auxiliar",
+    "fecha_txt", "duracion_txt", "rollos", "cajas", "tipo_cierre", "fecha_dt", "duracion_td"
+]
+
+def _aplanar_pasos_op(o):
+    """Convierte el historial_procesos de UNA OP en filas de paso para Rendimiento (sin pasos sin maquina)."""
     filas = []
-    for o in data:
-        for paso in (o.get('historial_procesos') or []):
-            maquina_paso = paso.get('maquina', '')
-            if not maquina_paso or maquina_paso == '—':
-                continue
-            datos_cierre_paso = paso.get('datos_cierre') or {}
+    for paso in (o.get('historial_procesos') or []):
+        maquina_paso = paso.get('maquina', '')
+        if not maquina_paso or maquina_paso == '—':
+            continue
+        datos_cierre_paso = paso.get('datos_cierre') or {}
 # ROLLOS: puede venir de Corte (rollos_finales) o de Rebobinadoras (rollos_finales tambien)
-            rollos_paso = datos_cierre_paso.get('rollos_finales')
-            cajas_paso = datos_cierre_paso.get('cajas_totales')
+        rollos_paso = datos_cierre_paso.get('rollos_finales')
+        cajas_paso = datos_cierre_paso.get('cajas_totales')
 
 # Tipo de cierre: FINAL = avanzó de una vez / PARCIAL = entrega parcial o cambio de turno (sigue en la misma área).
-            tipo_cierre_paso = paso.get('tipo', 'FINAL')
-            if tipo_cierre_paso == 'PARCIAL':
-                cantidad_parcial_paso = (paso.get('datos_cierre') or {}).get('cantidad_parcial_entregada', 0) or 0
-                texto_cierre_paso = "🔄 Parcial / Cambio de Turno" if cantidad_parcial_paso <= 0 else "📦 Entrega Parcial"
-            elif tipo_cierre_paso == 'FINAL':
-                texto_cierre_paso = "✅ Finalizado"
-            else:
-                texto_cierre_paso = tipo_cierre_paso.title() if tipo_cierre_paso else "—"
-
-            filas.append({
-                "op": o.get('op'),
-                "tipo_orden": o.get('tipo_orden'),
-                "nombre_trabajo": o.get('nombre_trabajo', ''),
-                "cliente": o.get('cliente', ''),
-                "area": paso.get('area', ''),
-                "maquina": maquina_paso,
-                "operario": (paso.get('operario') or '').strip(),
-                "auxiliar": paso.get('auxiliar', ''),
-                "fecha_txt": paso.get('fecha', ''),
-                "duracion_txt": paso.get('duracion', ''),
-                "rollos": rollos_paso if rollos_paso else None,
-                "cajas": cajas_paso if cajas_paso else None,
-                "tipo_cierre": texto_cierre_paso,
-            })
-    df = pd.DataFrame(filas)
-    if df.empty:
-        return df
-    df['fecha_dt'] = pd.to_datetime(df['fecha_txt'], format='%d/%m/%Y %H:%M', errors='coerce')
+        tipo_cierre_paso = paso.get('tipo', 'FINAL')
+        if tipo_cierre_paso == 'PARCIAL':
+            cantidad_parcial_paso = (paso.get('datos_cierre') or {}).get('cantidad_parcial_entregada', 0) or 0
+            texto_cierre_paso = "🔄 Parcial / Cambio de Turno" if cantidad_parcial_paso <= 0 else "📦 Entrega Parcial"
+        elif tipo_cierre_paso == 'FINAL':
+            texto_cierre_paso = "✅ Finalizado"
+        else:
+            texto_cierre_paso = tipo_cierre_paso.title() if tipo_cierre_paso else "—"
+
+        try:
+            fecha_dt = datetime.strptime(paso.get('fecha', ''), '%d/%m/%Y %H:%M')
+        except Exception:
+            fecha_dt = None
+        filas.append({
+            "op": o.get('op'),
+            "tipo_orden": o.get('tipo_orden'),
+            "nombre_trabajo": o.get('nombre_trabajo', ''),
+            "cliente": o.get('cliente', ''),
+            "area": paso.get('area', ''),
+            "maquina": maquina_paso,
+            "operario": (paso.get('operario') or '').strip(),
+            "auxiliar": paso.get('auxiliar', ''),
+            "fecha_txt": paso.get('fecha', ''),
+            "duracion_txt": paso.get('duracion', ''),
+            "rollos": rollos_paso if rollos_paso else None,
+            "cajas": cajas_paso if cajas_paso else None,
+            "tipo_cierre": texto_cierre_paso,
+            "fecha_dt": fecha_dt,
+        })
+    return filas
+
+def hay_pasos_rendimiento():
+    try:
+        if historial_pasos_disponible():
+            return bool(supabase.table("historial_pasos").select("id").limit(1).execute().data)
+        return bool(supabase.table("ordenes_planeadas").select("id").neq("historial_procesos", "[]")
+                    .not_.is_("historial_procesos", "null").limit(1).execute().data)
+    except Exception as e:
+        print(f"Error leyendo historial_pasos: {e}")
+        return False
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _reconciliar_historial_pasos():
+    """
+    Copia a historial_pasos los pasos que solo quedaron en el JSON (cierres
+    guardados sin registrar_paso). Corre como maximo cada 10 minutos, antes de
+    leer Rendimiento; devuelve cuantos pasos agrego.
+    """
+    try:
+        agregados = respaldar_historial_pasos()
+    except Exception as e:
+        print(f"Error completando historial_pasos desde el JSON: {e}")
+        return 0
+    if agregados:
+        _pasos_rendimiento_tabla.clear()
+    return agregados
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _pasos_rendimiento_tabla(operario, maquina, desde, hasta):
+    """Pasos de historial_pasos_detalle para UN operario o UNA maquina, filtrados por fecha en la base de datos."""
+    tz = pytz.timezone("America/Bogota")
+
+    def consulta():
+        q = supabase.table("historial_pasos_detalle").select("op,tipo_orden,nombre_trabajo,cliente,paso")
+        q = q.eq("operario", operario) if operario is not None else q.eq("maquina", maquina)
+        if desde:
+            q = q.gte("fecha", tz.localize(datetime.combine(desde, datetime.min.time())).isoformat())
+        if hasta:
+            q = q.lt("fecha", tz.localize(datetime.combine(hasta + timedelta(days=1), datetime.min.time())).isoformat())
+        return q.order("fecha", desc=True).order("id", desc=True)
+
+    filas = []
+    for f in _traer_todas_las_filas(consulta):
+        filas.extend(p for p in _aplanar_pasos_op({**f, "historial_procesos": [f["paso"]]}) if p["fecha_dt"] is not None)
+    return filas
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _pasos_rendimiento_json(operario, maquina, desde, hasta):
+    """
+    Igual que _pasos_rendimiento_tabla, pero desde el historial_procesos de las
+    OPs (instalaciones sin historial_pasos). La base de datos solo trae las OPs
+    que tienen algun paso de ese operario o maquina; las fechas se filtran aqui.
+    """
+    paso_buscado = {"operario": operario} if operario is not None else {"maquina": maquina}
+
+    def consulta():
+        return (supabase.table("ordenes_planeadas").select("id,op,tipo_orden,nombre_trabajo,cliente,historial_procesos")
+                .contains("historial_procesos", json.dumps([paso_buscado])).order("id"))
+
+    filas = []
+    for pagina in _paginas_consulta(consulta):
+        for o in pagina:
+            for p in _aplanar_pasos_op(o):
+                if p["fecha_dt"] is None:
+                    continue
+                if operario is not None and p["operario"] != operario.strip():
+                    continue
+                if maquina is not None and p["maquina"] != maquina:
+                    continue
+                if (desde and p["fecha_dt"].date() < desde) or (hasta and p["fecha_dt"].date() > hasta):
+                    continue
+                filas.append(p)
+    filas.sort(key=lambda p: p["fecha_dt"], reverse=True)
+    return filas
+
+def pasos_rendimiento(operario=None, maquina=None, desde=None, hasta=None):
+    """
+    DataFrame con los pasos de UN operario o UNA maquina entre dos fechas
+    (date, inclusivas), del mas reciente al mas antiguo. Con historial_pasos
+    instalado el filtro lo resuelve la base de datos sobre sus indices (antes se
+    completan los pasos que solo esten en el JSON); si no, se lee el JSON.
+    """
+    try:
+        if historial_pasos_disponible():
+            _reconciliar_historial_pasos()
+            seleccion = _pasos_rendimiento_tabla(operario, maquina, desde, hasta)
+        else:
+            seleccion = _pasos_rendimiento_json(operario, maquina, desde, hasta)
+    except Exception as e:
+        print(f"Error leyendo los pasos de Rendimiento: {e}")
+        seleccion = []
+    df = pd.DataFrame(seleccion, columns=COLUMNAS_PASOS_RENDIMIENTO[:-1])
+    df['fecha_dt'] = pd.to_datetime(df['fecha_dt'])
     df['duracion_td'] = pd.to_timedelta(df['duracion_txt'], errors='coerce')
     return df
 
@@ -1827,13 +1882,438 @@ def radiografia_completa_op(datos, mostrar_obs_auditoria1=True):
     if mostrar_obs_auditoria1:
         st.info(f"**📝 OBSERVACIONES DE AUDITORIA 1:**\n{datos.get('observaciones_diseno', 'Sin observaciones')}")
 
+# MEMORIA POR SESION DE LOS REPORTES DE ADMIN: cada consulta corre la primera vez que se abre el reporte y se reutiliza
+# en las recargas siguientes de esa sesion, hasta que se pulse "Actualizar datos". Se guardan solo las ultimas
+# MEMO_REPORTES_MAX consultas (las de mas tiempo sin usarse salen primero), asi cada busqueda de Trazabilidad no
+# deja su resultado en la sesion para siempre.
+MEMO_REPORTES_MAX = 8
+
+def memo_reporte(clave, cargar):
+    memo = st.session_state.get('_memo_reportes')
+    if not isinstance(memo, OrderedDict):
+        memo = st.session_state['_memo_reportes'] = OrderedDict()
+    if clave in memo:
+        memo.move_to_end(clave)
+    else:
+        memo[clave] = cargar()
+        while len(memo) > MEMO_REPORTES_MAX:
+            memo.popitem(last=False)
+    return memo[clave]
+
+def limpiar_memo_reportes():
+    st.session_state['_memo_reportes'] = OrderedDict()
+    _pasos_rendimiento_tabla.clear()
+
+# BUSQUEDA DE ORDENES: una sola funcion para Seguimiento, Trazabilidad y Planificación.
+@st.cache_data(ttl=15, show_spinner=False)
+def buscar_ordenes(termino, finalizadas=None, tipo_patron=None, prefijo=None, pagina=1, tam_pagina=50):
+    """
+    Busca OPs por numero, cliente, trabajo, vendedor, origen o area, de la mas
+    parecida a la menos, y devuelve (filas, total) de la pagina pedida. Las
+    filas traen todas las columnas de la OP menos historial_procesos.
+
+    Usa la funcion buscar_ordenes de la base de datos (indices de trigramas y
+    texto completo, ver sql/buscar_ordenes.sql). Si esa funcion todavia no se
+    ha creado, busca con ilike como antes, ordenando por fecha de creacion.
+    """
+    termino = (termino or "").strip()
+    desde = (pagina - 1) * tam_pagina
+    try:
+        res = supabase.rpc("buscar_ordenes", {
+            "p_termino": termino,
+            "p_finalizadas": finalizadas,
+            "p_tipo": tipo_patron,
+            "p_prefijo": prefijo,
+            "p_limite": tam_pagina,
+            "p_desplazamiento": desde,
+        }).execute()
+        filas = res.data or []
+        return [f["orden"] for f in filas], (filas[0]["total"] if filas else 0)
+    except Exception as e:
+        print(f"buscar_ordenes por RPC no disponible, se usa ilike: {e}")
+
+    consulta = supabase.table("ordenes_planeadas").select("*", count="exact")
+    if finalizadas is not None:
+        consulta = consulta.eq("proxima_area", "FINALIZADO") if finalizadas else consulta.neq("proxima_area", "FINALIZADO")
+    if tipo_patron:
+        consulta = consulta.ilike("tipo_orden", tipo_patron)
+    if prefijo:
+        consulta = consulta.ilike("op", f"{prefijo}%")
+    if termino:
+# Comas y parentesis rompen la sintaxis del filtro or_ de PostgREST.
+        b_like = "%" + termino.replace(",", " ").replace("(", " ").replace(")", " ") + "%"
+        consulta = consulta.or_(
+            f"op.ilike.{b_like},cliente.ilike.{b_like},nombre_trabajo.ilike.{b_like},"
+            f"vendedor.ilike.{b_like},tipo_origen.ilike.{b_like},proxima_area.ilike.{b_like}"
+        )
+    res = consulta.order("created_at", desc=True).order("id", desc=True).range(desde, desde + tam_pagina - 1).execute()
+    filas = [{k: v for k, v in f.items() if k != 'historial_procesos'} for f in (res.data or [])]
+    return filas, res.count or 0
+
+def texto_sugerencias_ordenes(termino, limite=5):
+    """'OP (cliente) · OP (cliente)' con las OPs mas parecidas al texto, para ayudar cuando no hay coincidencia exacta."""
+    try:
+        filas, _ = buscar_ordenes(termino, tam_pagina=limite)
+    except Exception:
+        return ""
+    return " · ".join(f"{f.get('op')} ({f.get('cliente', '')})" for f in filas)
+
+# SEGUIMIENTO PAGINADO: categorias y ordenes posibles de la grilla, resueltos en la base de datos (no en Python).
+SEGUIMIENTO_TAM_PAGINA = 50
+CATEGORIAS_SEGUIMIENTO = {
+    "Todas": None,
+    "📄 Formas": "%FORMAS%",
+    "🧻 Rollos Blancos": "%ROLLOS BLANCOS%",
+    "🔄 Rebobinado": "%REBOBINADO%",
+    "🧵 Rollos Impresos": "%ROLLOS IMPRESOS%",
+    "👜 Bolsas": "%BOLSA%",
+}
+ORDENES_SEGUIMIENTO = {
+    "📅 Más recientes": ("created_at", True),
+    "📅 Más antiguas": ("created_at", False),
+    "🔢 Número de OP": ("op", False),
+    "👤 Cliente": ("cliente", False),
+}
+COLUMNAS_RESUMEN_SEGUIMIENTO = "op,tipo_orden,cliente,nombre_trabajo,vendedor,proxima_area,anulada,created_at,fecha_creacion"
+
+@st.cache_data(ttl=15, show_spinner=False)
+def _pagina_ordenes_seguimiento(finalizadas, categoria, busqueda, orden, pagina):
+    """
+    Una pagina de la grilla de Seguimiento con solo las columnas del resumen.
+    Filtra (pendientes/finalizadas, tipo de orden), ordena y pagina en
+    Supabase. Con texto de busqueda usa buscar_ordenes (ordenado por parecido).
+    Devuelve (filas, total de ordenes que cumplen el filtro).
+    """
+    patron_tipo = CATEGORIAS_SEGUIMIENTO.get(categoria)
+    if busqueda:
+        return buscar_ordenes(busqueda, finalizadas, patron_tipo, pagina=pagina, tam_pagina=SEGUIMIENTO_TAM_PAGINA)
+    consulta = supabase.table("ordenes_planeadas").select(COLUMNAS_RESUMEN_SEGUIMIENTO, count="exact")
+    consulta = consulta.eq("proxima_area", "FINALIZADO") if finalizadas else consulta.neq("proxima_area", "FINALIZADO")
+    if patron_tipo:
+        consulta = consulta.ilike("tipo_orden", patron_tipo)
+    columna, desc = ORDENES_SEGUIMIENTO[orden]
+    desde = (pagina - 1) * SEGUIMIENTO_TAM_PAGINA
+# 'id' al final: con OPs del mismo cliente o la misma fecha, el orden entre paginas queda fijo (no repite ni salta filas).
+    res = consulta.order(columna, desc=desc).order("id", desc=desc).range(desde, desde + SEGUIMIENTO_TAM_PAGINA - 1).execute()
+    return res.data or [], res.count or 0
+
+# Fila completa de la OP elegida en la grilla de Seguimiento; cache 15 s para no repetir la consulta en cada recarga.
+@st.cache_data(ttl=15, show_spinner=False)
+def _orden_completa_seguimiento(op):
+    filas = supabase.table("ordenes_planeadas").select("*").eq("op", op).execute().data or []
+    return filas[0] if filas else None
+
+# Ordenes pendientes con solo lo necesario para las alertas de OPs quietas y sin entrar a maquina; cache 1 min. De
+# cada OP se trae solo su ultimo paso (campo calculado ultimo_paso, ver sql/ordenes_ultimo_paso.sql), no el historial.
+@st.cache_data(ttl=60, show_spinner=False)
+def _ordenes_pendientes_para_alertas():
+    columnas = "op,cliente,proxima_area,created_at,fecha_creacion"
+    try:
+        return _traer_todas_las_filas(
+            lambda: supabase.table("ordenes_planeadas").select(columnas + ",ultimo_paso")
+            .neq("proxima_area", "FINALIZADO").order("created_at", desc=True).order("id", desc=True)
+        )
+    except Exception as e:
+        print(f"ultimo_paso no disponible, se baja historial_procesos: {e}")
+    try:
+        filas = _traer_todas_las_filas(
+            lambda: supabase.table("ordenes_planeadas").select(columnas + ",historial_procesos")
+            .neq("proxima_area", "FINALIZADO").order("created_at", desc=True).order("id", desc=True)
+        )
+    except Exception as e:
+        print(f"Error al cargar órdenes pendientes para alertas: {e}")
+        return []
+    for f in filas:
+        f["ultimo_paso"] = (f.pop("historial_procesos", None) or [None])[-1]
+    return filas
+
+# COLA DE OPs DE UN AREA PARA LAS MAQUINAS LIBRES: una consulta por area (solo op y trabajo) que comparten todas las
+# tarjetas y todas las sesiones que miran esa area; cache 10 s. Se limpia al registrar un paso (registrar_paso_op).
+@st.cache_data(ttl=10, show_spinner=False)
+def cola_ops_area(area, incluir_parciales=True):
+    consulta = supabase.table("ordenes_planeadas").select("op,nombre_trabajo")
+    if incluir_parciales:
+        consulta = consulta.or_(f"proxima_area.eq.{area},estado_parcial.eq.ACTIVO EN {area}")
+    else:
+        consulta = consulta.eq("proxima_area", area)
+    return consulta.execute().data or []
+
+# TRABAJOS ACTIVOS DE UN AREA, compartidos por las tarjetas de maquina de todas las sesiones; cache 5 s. Se limpia en
+# cada escritura de trabajos_activos desde los paneles (iniciar, parar, reanudar, cerrar) y con los avisos en vivo.
+@st.cache_data(ttl=5, show_spinner=False)
+def trabajos_activos_area(area):
+    return supabase.table("trabajos_activos").select("*").eq("area", area).execute().data or []
+
+# FRAGMENTOS: partes de la pagina que se vuelven a ejecutar solas (al tocar algo dentro de ellas o cada run_every
+# segundos) sin correr todo el archivo. En versiones de Streamlit sin st.fragment se dibujan normal.
+def fragmento(run_every=None):
+    if hasattr(st, "fragment"):
+        return st.fragment(run_every=run_every)
+    return lambda funcion: funcion
+
+def recargar_fragmento():
+    """Vuelve a dibujar solo el fragmento actual (o la pagina completa si no hay fragmentos)."""
+    if hasattr(st, "fragment"):
+        st.rerun(scope="fragment")
+    st.rerun()
+
+# FOTO DE LA PLANTA PARA EL MONITOR (estados, trabajos activos con nombre y cliente, tiempo laboral y alertas), UNA por
+# proceso: la primera pantalla que la pide despues de SNAPSHOT_PLANTA_SEGUNDOS la recalcula y las demas (TVs, tablets)
+# la leen de memoria, asi el costo del Monitor no depende de cuantas pantallas esten abiertas. Si el contador global de
+# cambios no se movio, solo se recalcula cada SNAPSHOT_PLANTA_MAX_SEGUNDOS (para que avancen los tiempos de trabajo y
+# las alertas de 4h; la foto se recalcula una vez por proceso, no por pantalla, asi que el costo sigue acotado).
+SNAPSHOT_PLANTA_SEGUNDOS = 10
+SNAPSHOT_PLANTA_MAX_SEGUNDOS = 30
+
+@st.cache_resource(show_spinner=False)
+def _almacen_snapshot_planta():
+    return {"lock": threading.Lock(), "revisado_en": 0.0, "calculado_en": 0.0, "version": None, "snapshot": None}
+
+def invalidar_snapshot_planta():
+    almacen = _almacen_snapshot_planta()
+    almacen["revisado_en"] = 0.0
+    almacen["calculado_en"] = 0.0
+
+# TABLERO DEL MONITOR EN UN SOLO BLOQUE HTML: todas las areas y tarjetas en un unico elemento (antes eran un
+# st.markdown por maquina mas sus columnas, ~100 elementos por refresco hacia las tablets). Se arma una vez por foto.
+def _tarjeta_html_monitor(m, estado_on, trabajo):
+    m = html.escape(m)
+    if not estado_on:
+        return (
+            "<div style='background-color: #424242; color: #9E9E9E; padding: 20px; border-radius: 15px; "
+            "text-align: center; border: 2px solid #212121; margin-bottom: 10px;'>"
+            f"<span style='font-size: 18px; font-weight: bold;'>{m}</span><br>"
+            "<span style='font-size: 14px;'>🚫 FUERA DE SERVICIO</span></div>"
+        )
+    if trabajo:
+        return (
+            f"<div class='card-produccion'>{m}<br>OP: {html.escape(str(trabajo['op']))}<br>"
+            f"👤 {html.escape(str(trabajo['cliente']))}<br>{html.escape(str(trabajo['nombre_trabajo']))}</div>"
+        )
+    return f"<div class='card-vacia'>{m}<br>LIBRE</div>"
+
+def html_tablero_monitor(estados, activos):
+    partes = []
+    for area, maquinas in MAQUINAS.items():
+        partes.append(f"<div class='title-area'>{html.escape(area)}</div>")
+        partes.append("<div style='display: grid; grid-template-columns: repeat(auto-fill, minmax(170px, 1fr)); column-gap: 16px;'>")
+        partes.extend(_tarjeta_html_monitor(m, estados.get(m, True), activos.get(m)) for m in maquinas)
+        partes.append("</div>")
+    return "".join(partes)
+
+# FOTO PARA EL KIOSKO DE LAS TVs (monitor_kiosko.py): mismas tarjetas que el Monitor, lista para JSON. Las alertas de
+# 3+ dias no van porque en el Monitor solo las ve el admin.
+def datos_kiosko(generado, estados, activos, duraciones, alertas):
+    areas = []
+    for area, maquinas in MAQUINAS.items():
+        tarjetas = []
+        for m in maquinas:
+            if not estados.get(m, True):
+                tarjetas.append({"maquina": m, "estado": "apagada"})
+            elif m in activos:
+                a = activos[m]
+                tarjetas.append({
+                    "maquina": m, "estado": "produccion", "op": a["op"], "cliente": a["cliente"],
+                    "trabajo": a["nombre_trabajo"], "tiempo": duraciones.get(m),
+                })
+            else:
+                tarjetas.append({"maquina": m, "estado": "libre"})
+        areas.append({"area": area, "maquinas": tarjetas})
+    return {
+        "generado": generado.isoformat(), "generado_txt": generado.strftime("%H:%M:%S"),
+        "areas": areas, "alertas": alertas,
+    }
+
+def _calcular_snapshot_planta():
+    lecturas = leer_en_paralelo({
+        "configuracion": (configuracion_sistema, {}),
+        "estados": (lambda: supabase.table("estado_maquinas").select("maquina, estado").execute().data or [], []),
+        "activos": (lambda: supabase.table("trabajos_activos").select("*").execute().data or [], []),
+        "ops_espera": (_ordenes_pendientes_para_alertas, []),
+    })
+    estados = {item['maquina']: item['estado'] for item in lecturas["estados"]}
+    act_data = lecturas["activos"]
+    ahora = hora_colombia()
+
+# NOMBRE DE TRABAJO Y CLIENTE SOLO DE LAS OPs ACTIVAS
+    op_ids_activos = list({str(a['op']) for a in act_data})
+    ops = []
+    if op_ids_activos:
+        try:
+            ops = supabase.table("ordenes_planeadas").select("op,nombre_trabajo,cliente").in_("op", op_ids_activos).execute().data or []
+        except Exception as e:
+            print(f"Error al cargar nombres de OPs activas: {e}")
+    map_ops = {o['op']: o['nombre_trabajo'] for o in ops}
+    map_clientes = {o['op']: o.get('cliente', 'SIN CLIENTE') for o in ops}
+    activos = {}
+    for a in act_data:
+        activos[a['maquina']] = {**a, "nombre_trabajo": map_ops.get(a['op'], "SIN NOMBRE"), "cliente": map_clientes.get(a['op'], "SIN CLIENTE")}
+
+# ALERTAS DE OP ESTANCADAS (Filtrando por ON/OFF); una sola consulta al historial de estados para todas las maquinas.
+    act_encendidas = [a for a in act_data if estados.get(a['maquina'], True)]
+    duraciones = calcular_duraciones_laborales(act_encendidas, ahora, estados)
+    alertas = []
+    for a in act_encendidas:
+        try:
+            tiempo_texto = duraciones.get(a['maquina'])
+            if not tiempo_texto:
+                continue
+            h, m, s = map(int, tiempo_texto.split(':'))
+            horas_laborales = h + m/60 + s/3600
+            if horas_laborales > 4:
+                alertas.append(f"🚨 OP {a['op']} en {a['maquina']} lleva {round(horas_laborales,1)}h de trabajo activo")
+        except Exception as e:
+            print(f"Error en alerta: {e}")
+
+# ALERTAS DE 3+ DIAS (el Monitor solo las muestra al admin)
+    alertas_3d = []
+    for a in act_encendidas:
+        try:
+            inicio_a = datetime.fromisoformat(a["hora_inicio"].replace("Z", "+00:00"))
+            dias_en_maquina = (ahora - inicio_a.astimezone(pytz.timezone("America/Bogota"))).days
+            if dias_en_maquina >= 3:
+                alertas_3d.append(f"🕒 OP {a['op']} en {a['maquina']} lleva {dias_en_maquina} día(s) SIN FINALIZARSE en la máquina")
+        except Exception as e:
+            print(f"Error en alerta 3 dias (activa): {e}")
+
+    ops_activas_ids = {str(a['op']) for a in act_data}
+    for o in lecturas["ops_espera"]:
+        try:
+            if (o.get('proxima_area') or '').upper() in ("FINALIZADO", "ANULADA"):
+                continue
+            if str(o.get('op')) in ops_activas_ids:
+                continue
+            if o.get('ultimo_paso'):
+                continue  # ya tuvo movimiento en algun momento, no aplica este caso
+            raw_fecha = o.get('created_at') or o.get('fecha_creacion')
+            if not raw_fecha:
+                continue
+            dt_creacion = datetime.fromisoformat(str(raw_fecha).replace("Z", "")).replace(tzinfo=pytz.utc).astimezone(pytz.timezone("America/Bogota"))
+            dias_sin_entrar = (ahora - dt_creacion).days
+            if dias_sin_entrar >= 3:
+                alertas_3d.append(f"📋 OP {o.get('op')} ({o.get('cliente','')}) lleva {dias_sin_entrar} día(s) creada SIN ENTRAR a ninguna máquina")
+        except Exception as e:
+            print(f"Error en alerta 3 dias (creacion): {e}")
+
+    return {
+        "generado": ahora, "estados": estados, "activos": activos,
+        "duraciones": duraciones, "alertas": alertas, "alertas_3d": alertas_3d,
+        "html_tablero": html_tablero_monitor(estados, activos),
+        "kiosko": datos_kiosko(ahora, estados, activos, duraciones, alertas),
+    }
+
+def snapshot_planta():
+    """Foto compartida de la planta; se recalcula a lo sumo cada SNAPSHOT_PLANTA_SEGUNDOS (no se debe modificar)."""
+    almacen = _almacen_snapshot_planta()
+    with almacen["lock"]:
+        if almacen["snapshot"] is not None and time.time() - almacen["revisado_en"] < SNAPSHOT_PLANTA_SEGUNDOS:
+            return almacen["snapshot"]
+        almacen["revisado_en"] = time.time()
+        version = version_cambios()
+        if (almacen["snapshot"] is None or version is None or version != almacen["version"]
+                or time.time() - almacen["calculado_en"] >= SNAPSHOT_PLANTA_MAX_SEGUNDOS):
+            almacen["snapshot"] = _calcular_snapshot_planta()
+            almacen["calculado_en"] = time.time()
+            almacen["version"] = version
+        return almacen["snapshot"]
+
+# AVISOS EN VIVO (ver sql/avisos_planta.sql): un hilo por proceso escucha el canal 'cambios_planta' de Postgres y, por
+# cada aviso, sube la version de la maquina afectada e invalida la foto de la planta, las colas de OPs y los trabajos
+# activos por area. Cada pagina lo nota comparando versiones en memoria (vigilar_en_vivo), sin consultas extra.
+@st.cache_resource(show_spinner=False)
+def _cambios_en_vivo():
+    almacen = {"lock": threading.Lock(), "activo": False, "version": 0, "por_maquina": {}}
+    try:
+        dsn = st.secrets.get("SUPABASE_DB_URL")
+    except Exception:
+        dsn = None
+    if PSYCOPG2_DISPONIBLE and dsn:
+        threading.Thread(target=_escuchar_cambios_planta, args=(dsn, almacen), daemon=True, name="avisos_planta").start()
+    return almacen
+
+def _registrar_aviso_planta(almacen, payload):
+    try:
+        maquina = json.loads(payload or "{}").get("maquina")
+    except Exception:
+        maquina = None
+    with almacen["lock"]:
+        almacen["version"] += 1
+        if maquina:
+            almacen["por_maquina"][maquina] = almacen["version"]
+    invalidar_snapshot_planta()
+    cola_ops_area.clear()
+    trabajos_activos_area.clear()
+
+def _escuchar_cambios_planta(dsn, almacen):
+    """Hilo que queda escuchando los avisos; si la conexion se cae, se reconecta a los 5 segundos."""
+    while True:
+        conexion = None
+        try:
+            conexion = psycopg2.connect(dsn)
+            conexion.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conexion.cursor().execute("LISTEN cambios_planta;")
+            almacen["activo"] = True
+            while True:
+                if select.select([conexion], [], [], 30) == ([], [], []):
+                    continue
+                conexion.poll()
+                while conexion.notifies:
+                    _registrar_aviso_planta(almacen, conexion.notifies.pop(0).payload)
+        except Exception as e:
+            almacen["activo"] = False
+            print(f"Avisos en vivo desconectados, reintentando: {e}")
+            if conexion is not None:
+                try:
+                    conexion.close()
+                except Exception:
+                    pass
+            time.sleep(5)
+
+def hay_cambios_en_vivo():
+    return _cambios_en_vivo()["activo"] and hasattr(st, "fragment")
+
+def version_en_vivo(maquinas=None):
+    """Version de los avisos recibidos: global, o la mas reciente de las maquinas indicadas."""
+    almacen = _cambios_en_vivo()
+    with almacen["lock"]:
+        if maquinas is None:
+            return almacen["version"]
+        return max((almacen["por_maquina"].get(m, 0) for m in maquinas), default=0)
+
+def vigilar_en_vivo(clave, maquinas=None):
+    """
+    Con avisos en vivo, un fragmento vacio que cada 2 s compara la version de
+    'maquinas' (o la global) con la que tenia esta pagina al dibujarse, y
+    vuelve a correr la pagina SOLO si llego un aviso de esas maquinas. Sin
+    cambios no se dibuja ni se envia nada. Se llama antes de dibujar los datos.
+    """
+    if not hay_cambios_en_vivo():
+        return
+    llave = f"_version_vivo_{clave}"
+    st.session_state[llave] = version_en_vivo(maquinas)
+
+    @fragmento(run_every=2)
+    def _vigilante():
+        if version_en_vivo(maquinas) != st.session_state.get(llave):
+            st.rerun()
+
+    _vigilante()
+
+# El kiosko ya corre desde la primera visita (ver _servidor_kiosko); desde aqui tiene de donde sacar la foto.
+_fuente_kiosko()["obtener"] = lambda: snapshot_planta()["kiosko"]
+
 # MODULO MONITOR 
 if menu == "🖥️ Monitor":
     st.markdown("<div class='title-area'>🖥️ MONITOR DE PRODUCCIÓN EN TIEMPO REAL</div>", unsafe_allow_html=True)
+    es_admin_monitor = st.session_state.get('rol','').lower() == 'admin'
+
+    planta_on_monitor = get_planta_activa()
 
 #  INTERRUPTOR GLOBAL DE PLANTA (solo admin)
-    if st.session_state.get('rol','').lower() == 'admin':
-        planta_on = get_planta_activa()
+    if es_admin_monitor:
+# Una vez al dia dobla el historial viejo de encendido/apagado en tramos compactados.
+        _compactar_estado_historial_diario()
+        planta_on = planta_on_monitor
         col_sw1, col_sw2, col_sw3 = st.columns([1, 2, 3])
         with col_sw1:
             nuevo_estado = st.toggle(
@@ -1853,198 +2333,93 @@ if menu == "🖥️ Monitor":
             else:
                 st.error("⏸️ Planta detenida — contadores congelados")
                 try:
-                    res_cfg = supabase.table("configuracion_sistema").select("updated_at,updated_by")\
-                              .eq("clave","planta_activa").single().execute().data
+                    res_cfg = configuracion_sistema().get("planta_activa")
                     if res_cfg:
-                        st.caption(f"Detenida por **{res_cfg['updated_by']}** a las {str(res_cfg['updated_at'])[:16]}")
-                except:
-                    pass
-
-        st.markdown("**⚙️ Interruptores por Área** (independientes del general — apagar una no afecta a las demás)")
-        cols_areas = st.columns(len(MAQUINAS))
-        for idx, area in enumerate(MAQUINAS.keys()):
-            with cols_areas[idx]:
-                area_on = get_area_activa(area)
-                nuevo_area_st = st.toggle(
-                    area if area_on else f"⏸️ {area}",
-                    value=area_on,
-                    key=f"toggle_area_{area}"
-                )
-                if nuevo_area_st != area_on:
-                    set_area_activa(area, nuevo_area_st, st.session_state.get('nombre_usuario','admin'))
-                    st.toast(f"Área {area} {'ACTIVADA' if nuevo_area_st else 'DESACTIVADA'}", icon="⚙️")
-                    time.sleep(0.5)
-                    st.rerun()
-    else:
-    
-# Operarios solo ven el estado, no pueden cambiarlo
-        if not get_planta_activa():
-            st.error("⏸️ Planta detenida por administración — los contadores están en pausa")
-
-        areas_apagadas = [a for a in MAQUINAS.keys() if not get_area_activa(a)]
-        if areas_apagadas:
-            st.warning(f"⏸️ Área(s) detenida(s) por administración: {', '.join(areas_apagadas)}")
-    
-#  TRAER ESTADOS DE MAQUINAS DE UN SOLO GOLPE 
-    try:
-        estados_db = supabase.table("estado_maquinas").select("maquina, estado").execute().data
-
-        diccionario_estados = {item['maquina']: item['estado'] for item in estados_db}
-    except Exception as e:
-        st.error(f"Error al cargar estados: {e}")
-        diccionario_estados = {}
-
-# Traer datos de trabajos activos
-    act_data = supabase.table("trabajos_activos").select("*").execute().data
-
-# ALERTAS DE OP ESTANCADAS (Filtrando por ON/OFF)
-    alertas = []
-    for a in act_data:
-        try:
-
-# USA EL DICCIONARIO PARA NO BUSCAR EN LA SUPABASE
-            if not diccionario_estados.get(a['maquina'], True):
-                continue 
-            
-            inicio = datetime.fromisoformat(a["hora_inicio"].replace("Z", "+00:00"))
-
-# PASA EL ESTADO ACTUAL ALA FUNCION 
-            tiempo_texto = calcular_duracion_laboral(inicio, ahora, a['maquina'], a.get('tiempo_pausa', 0))
-            
-            h, m, s = map(int, tiempo_texto.split(':'))
-            horas_laborales = h + m/60 + s/3600
-
-            if horas_laborales > 4:  
-                alertas.append(f"🚨 OP {a['op']} en {a['maquina']} lleva {round(horas_laborales,1)}h de trabajo activo")
-        except Exception as e:
-            print(f"Error en alerta: {e}")
-
-    if alertas:
-        st.error("🚨 ALERTAS DE PRODUCCIÓN:")
-        for al in alertas:
-            st.warning(al)
-
-# ALERTAS DE 3+ DIAS (SOLO VISIBLES PARA ADMIN)
-    if st.session_state.get('rol', '').lower() == 'admin':
-        alertas_3d = []
-
-#  OP ACTIVA EN UNA MAQUINA QUE LLEVA 3+ DIAS SIN FINALIZARSE
-        for a in act_data:
-            try:
-                if not diccionario_estados.get(a['maquina'], True):
-                    continue
-                inicio_a = datetime.fromisoformat(a["hora_inicio"].replace("Z", "+00:00"))
-                dias_en_maquina = (hora_colombia() - inicio_a.astimezone(pytz.timezone("America/Bogota"))).days
-                if dias_en_maquina >= 3:
-                    alertas_3d.append(f"🕒 OP {a['op']} en {a['maquina']} lleva {dias_en_maquina} día(s) SIN FINALIZARSE en la máquina")
-            except Exception as e:
-                print(f"Error en alerta 3 dias (activa): {e}")
-
-# OP CREADA HACE 3+ DIAS QUE NUNCA HA ENTRADO A NINGUNA MAQUINA
-        try:
-            ops_espera = supabase.table("ordenes_planeadas").select(
-                "op,cliente,nombre_trabajo,proxima_area,historial_procesos,created_at,fecha_creacion"
-            ).neq("proxima_area", "FINALIZADO").neq("proxima_area", "ANULADA").execute().data or []
-        except Exception:
-            ops_espera = []
-
-        ops_activas_ids = {str(a['op']) for a in act_data}
-        for o in ops_espera:
-            try:
-                if (o.get('proxima_area') or '').upper() == "FINALIZADO":
-                    continue
-                if str(o.get('op')) in ops_activas_ids:
-                    continue
-                if o.get('historial_procesos'):
-                    continue  # ya tuvo movimiento en algun momento, no aplica este caso
-                raw_fecha = o.get('created_at') or o.get('fecha_creacion')
-                if not raw_fecha:
-                    continue
-                dt_creacion = datetime.fromisoformat(str(raw_fecha).replace("Z", "")).replace(tzinfo=pytz.utc).astimezone(pytz.timezone("America/Bogota"))
-                dias_sin_entrar = (hora_colombia() - dt_creacion).days
-                if dias_sin_entrar >= 3:
-                    alertas_3d.append(f"📋 OP {o.get('op')} ({o.get('cliente','')}) lleva {dias_sin_entrar} día(s) creada SIN ENTRAR a ninguna máquina")
-            except Exception as e:
-                print(f"Error en alerta 3 dias (creacion): {e}")
+                        st.caption(f"Detenida por **{res_cfg['updated_by']}** a las {str(res_cfg['updated_at'])[:16]}")
+                except:
+                    pass
 
-        if alertas_3d:
-            st.markdown("---")
-            with st.expander(f"🕒 {len(alertas_3d)} ALERTA(S) DE 3+ DÍAS — solo visibles para Admin", expanded=True):
-                for al in alertas_3d:
-                    st.warning(al)
+# Los interruptores por area son un fragmento: cambiar uno solo vuelve a dibujar esta fila.
+        @fragmento()
+        def interruptores_areas():
+            st.markdown("**⚙️ Interruptores por Área** (independientes del general — apagar una no afecta a las demás)")
+            cols_areas = st.columns(len(MAQUINAS))
+            for idx, area in enumerate(MAQUINAS.keys()):
+                with cols_areas[idx]:
+                    area_on = get_area_activa(area)
+                    nuevo_area_st = st.toggle(
+                        area if area_on else f"⏸️ {area}",
+                        value=area_on,
+                        key=f"toggle_area_{area}"
+                    )
+                    if nuevo_area_st != area_on:
+                        set_area_activa(area, nuevo_area_st, st.session_state.get('nombre_usuario','admin'))
+                        st.toast(f"Área {area} {'ACTIVADA' if nuevo_area_st else 'DESACTIVADA'}", icon="⚙️")
+                        time.sleep(0.5)
+                        recargar_fragmento()
 
-# PREPARAR DATOS DE OPERACIONES  OPTIMIZACION: antes se traia "op,nombre_trabajo" de TODAS las ordenes de toda la
-    op_ids_activos = list({str(a['op']) for a in act_data}) if act_data else []
-    if op_ids_activos:
-        ops = supabase.table("ordenes_planeadas").select("op,nombre_trabajo,cliente").in_("op", op_ids_activos).execute().data or []
+        interruptores_areas()
     else:
-        ops = []
-    map_ops = {o['op']: o['nombre_trabajo'] for o in ops}
-    map_clientes = {o['op']: o.get('cliente', 'SIN CLIENTE') for o in ops}
-
-    act = {}
-    for a in act_data:
-        op = a['op']
-        a['nombre_trabajo'] = map_ops.get(op, "SIN NOMBRE")
-        a['cliente'] = map_clientes.get(op, "SIN CLIENTE")
-        act[a['maquina']] = a
-        
-#  DIBUJAR INTERFAZ (Con logica de colores) 
-    for area, maquinas in MAQUINAS.items():
-        st.markdown(f"<div class='title-area'>{area}</div>", unsafe_allow_html=True)
-
-# Fila de columnas nueva por cada bloque de 4 máquinas (no todas de una vez), para que el orden se vea bien también en celular.
-        for inicio_fila in range(0, len(maquinas), 4):
-            fila_maquinas = maquinas[inicio_fila:inicio_fila + 4]
-            cols = st.columns(4)
-
-            for idx, m in enumerate(fila_maquinas):
-                with cols[idx]:
-
-# Verificar si la maquina esta encendida en el diccionario
-                    esta_encendida = diccionario_estados.get(m, True)
+    
+# Operarios solo ven el estado, no pueden cambiarlo
+        if not planta_on_monitor:
+            st.error("⏸️ Planta detenida por administración — los contadores están en pausa")
 
-                    if not esta_encendida:
+        areas_apagadas = [a for a in MAQUINAS.keys() if not get_area_activa(a)]
+        if areas_apagadas:
+            st.warning(f"⏸️ Área(s) detenida(s) por administración: {', '.join(areas_apagadas)}")
+    
+#  REFRESCO AUTOMATICO: el tablero (alertas y tarjetas) es un fragmento que se redibuja solo desde la foto compartida
+# cada intervalo elegido, sin volver a correr el resto de la pagina. Con avisos en vivo la pagina se vuelve a dibujar
+# apenas llega un aviso (vigilar_en_vivo) y el tablero solo se refresca por tiempo cada SNAPSHOT_PLANTA_MAX_SEGUNDOS,
+# para que avancen los tiempos de trabajo. Sin st.fragment se recarga la pagina completa con st_autorefresh, como antes.
+    en_vivo_monitor = hay_cambios_en_vivo()
+    intervalo = st.session_state.get("intervalo_monitor", 30)
+    vigilar_en_vivo("monitor")
+
+    @fragmento(run_every=SNAPSHOT_PLANTA_MAX_SEGUNDOS if en_vivo_monitor else intervalo)
+    def tablero_monitor():
+# FOTO DE LA PLANTA COMPARTIDA: la calcula la primera pantalla que la pide y las demas la leen de memoria.
+#  ESTADOS DE MAQUINAS, TRABAJOS ACTIVOS (con trabajo y cliente) Y ALERTAS, tomados de la foto compartida
+        snapshot = snapshot_planta()
+
+        if snapshot["alertas"]:
+            st.error("🚨 ALERTAS DE PRODUCCIÓN:")
+            for al in snapshot["alertas"]:
+                st.warning(al)
 
-# TARJETA GRIS: Maquina apagada (Mantenimiento/etc)
-                        st.markdown(
-                            f"""<div style='background-color: #424242; color: #9E9E9E; padding: 20px; 
-                            border-radius: 15px; text-align: center; border: 2px solid #212121;'>
-                            <span style='font-size: 18px; font-weight: bold;'>{m}</span><br>
-                            <span style='font-size: 14px;'>🚫 FUERA DE SERVICIO</span>
-                            </div>""", 
-                            unsafe_allow_html=True
-                        )
-                    elif m in act:
+# ALERTAS DE 3+ DIAS (SOLO VISIBLES PARA ADMIN)
+        if es_admin_monitor and snapshot["alertas_3d"]:
+            st.markdown("---")
+            with st.expander(f"🕒 {len(snapshot['alertas_3d'])} ALERTA(S) DE 3+ DÍAS — solo visibles para Admin", expanded=True):
+                for al in snapshot["alertas_3d"]:
+                    st.warning(al)
+        st.caption(f"Datos de planta de las {snapshot['generado'].strftime('%H:%M:%S')}")
 
-# TARJETA  produccion
-                        st.markdown(
-                            f"<div class='card-produccion'>{m}<br>OP: {act[m]['op']}<br>👤 {act[m]['cliente']}<br>{act[m]['nombre_trabajo']}</div>",
-                            unsafe_allow_html=True
-                        )
-                    else:
+#  DIBUJAR INTERFAZ (Con logica de colores): todo el tablero en un solo elemento, armado una vez por foto
+        st.markdown(snapshot["html_tablero"], unsafe_allow_html=True)
 
-# TARJETA Libre
-                        st.markdown(
-                            f"<div class='card-vacia'>{m}<br>LIBRE</div>",
-                            unsafe_allow_html=True
-                        )
+    tablero_monitor()
 
-#  REFRESCO AUTOMATICO 
-    try:
-        from streamlit_autorefresh import st_autorefresh
+    if en_vivo_monitor:
+        st.caption("🟢 En vivo: el monitor se actualiza apenas una máquina inicia, pausa o termina.")
+    else:
         intervalo = st.select_slider(
             "🔄 Auto-refresco cada:",
             options=[15, 30, 60, 120],
             value=30,
-            format_func=lambda x: f"{x} segundos"
+            format_func=lambda x: f"{x} segundos",
+            key="intervalo_monitor"
         )
-        st_autorefresh(interval=intervalo * 1000, key="monitor_refresh")
-    except:
+        if not hasattr(st, "fragment"):
+            try:
+                from streamlit_autorefresh import st_autorefresh
+                st_autorefresh(interval=intervalo * 1000, key="monitor_refresh")
+            except:
       
-        col_ref = st.columns([3,1])[1]
-        if col_ref.button("🔄 Actualizar ahora"):
-            st.rerun()
+                col_ref = st.columns([3,1])[1]
+                if col_ref.button("🔄 Actualizar ahora"):
+                    st.rerun()
 
 # MODULO SEGUIMIENTO
 elif menu == "🔍 Seguimiento":
@@ -2063,369 +2438,338 @@ elif menu == "🔍 Seguimiento":
 
     busqueda = st.text_input("🔍 Filtrar por OP, Cliente, Trabajo o Vendedor:", "")
 
-# OPTIMIZACION DE VELOCIDAD DE CARGA:
-    try:
-        ordenes_pendientes = (
-            supabase.table("ordenes_planeadas")
-            .select("*")
-            .neq("proxima_area", "FINALIZADO")
-            .order("created_at", desc=True)
-            .execute().data or []
-        )
-    except Exception as e:
-        st.error(f"Error al cargar órdenes pendientes: {e}")
-        ordenes_pendientes = []
-
-    try:
-        if busqueda:
-            b_like = f"%{busqueda}%"
-            ordenes_finalizadas = (
-                supabase.table("ordenes_planeadas")
-                .select("*")
-                .eq("proxima_area", "FINALIZADO")
-                .or_(f"op.ilike.{b_like},cliente.ilike.{b_like},nombre_trabajo.ilike.{b_like},vendedor.ilike.{b_like}")
-                .order("created_at", desc=True)
-                .execute().data or []
-            )
-        else:
-            ordenes_finalizadas = (
-                supabase.table("ordenes_planeadas")
-                .select("*")
-                .eq("proxima_area", "FINALIZADO")
-                .order("created_at", desc=True)
-                .limit(200)
-                .execute().data or []
-            )
-    except Exception as e:
-        st.error(f"Error al cargar órdenes finalizadas: {e}")
-        ordenes_finalizadas = []
+# PAQUETE DE TRABAJO: todas las OPs de la cola de un area (o de un rango de fechas) en un solo archivo para imprimir
+    if st.session_state.get('rol') in ['admin', 'ventas', 'diseño']:
+        with st.expander("🖨️ Paquete de trabajo (varias OPs en un solo archivo)"):
+            c_modo, c_filtro, c_formato = st.columns([1, 2, 1])
+            modo_paquete = c_modo.radio("Elegir OPs", ["Cola de un área", "Rango de fechas"], key="paquete_modo")
+            if modo_paquete == "Cola de un área":
+                area_paquete = c_filtro.selectbox("Área", list(MAQUINAS.keys()), key="paquete_area")
+                desde_paquete = hasta_paquete = None
+            else:
+                area_paquete = None
+                desde_paquete = c_filtro.date_input("Creadas desde", value=hora_colombia().date() - timedelta(days=1), key="paquete_desde")
+                hasta_paquete = c_filtro.date_input("Hasta", value=hora_colombia().date(), key="paquete_hasta")
+            formatos_paquete = ["Un solo PDF", "ZIP (un PDF por OP)"] if lote_pdf.PYPDF_DISPONIBLE else ["ZIP (un PDF por OP)"]
+            formato_paquete = c_formato.radio("Formato", formatos_paquete, key="paquete_formato")
 
-    if not ordenes_pendientes and not ordenes_finalizadas:
-        st.warning("No hay órdenes registradas.")
-    else:
+            if st.button("🧾 Preparar paquete", key="paquete_preparar", use_container_width=True):
+                try:
+                    with st.spinner("Generando los PDF de las órdenes..."):
+                        filas_paquete = ordenes_para_paquete(area_paquete, desde_paquete, hasta_paquete)
+                        if filas_paquete:
+                            datos_paquete, ext_paquete, mime_paquete = paquete_trabajo(filas_paquete, formato_paquete == "Un solo PDF")
+                            nombre_paquete = area_paquete or f"{desde_paquete:%Y%m%d}_{hasta_paquete:%Y%m%d}"
+                            st.session_state["paquete_listo"] = {
+                                "datos": datos_paquete, "mime": mime_paquete, "n": len(filas_paquete),
+                                "archivo": f"PAQUETE_{nombre_paquete}_{hora_colombia():%Y%m%d_%H%M}.{ext_paquete}",
+                            }
+                        else:
+                            st.session_state.pop("paquete_listo", None)
+                            st.info("No hay órdenes para ese filtro.")
+                except Exception as e:
+                    st.error(f"No se pudo generar el paquete: {e}")
+
+            paquete = st.session_state.get("paquete_listo")
+            if paquete:
+                if paquete["n"] >= PAQUETE_MAX_OPS:
+                    st.warning(f"El paquete se limitó a las primeras {PAQUETE_MAX_OPS} órdenes.")
+                st.download_button(
+                    label=f"📥 Descargar paquete ({paquete['n']} OPs)",
+                    data=paquete["datos"],
+                    file_name=paquete["archivo"],
+                    mime=paquete["mime"],
+                    key="paquete_descargar",
+                    use_container_width=True
+                )
 
 # TABS DE SEGUIMIENTO: PENDIENTES / FINALIZADAS
-        tab_pendientes, tab_finalizadas = st.tabs(["⏳ EN PROCESO / PENDIENTES", "✅ FINALIZADAS"])
-
-        if not busqueda:
-            st.caption(f"Mostrando las {len(ordenes_finalizadas)} órdenes finalizadas más recientes. Usa el buscador para encontrar cualquier OP histórica.")
+    tab_pendientes, tab_finalizadas = st.tabs(["⏳ EN PROCESO / PENDIENTES", "✅ FINALIZADAS"])
 
 # ALERTA DE OPs QUIETAS (5+ DIAS SIN MOVIMIENTO) — SOLO VISIBLE PARA ADMIN
-        rol_seg_actual = st.session_state.get('rol', '').lower()
-        if rol_seg_actual == 'admin':
-            tz_col = pytz.timezone("America/Bogota")
-            ahora_seg = hora_colombia()
-            alertas_quietas = []
-            for r in ordenes_pendientes:
-                try:
-                    ultima_dt = None
-                    hist_r = r.get('historial_procesos') or []
-                    if hist_r:
-                        raw_ult = hist_r[-1].get('fecha') or hist_r[-1].get('fin') or hist_r[-1].get('inicio')
-                        if raw_ult:
-                            try:
-                                ultima_dt = tz_col.localize(datetime.strptime(raw_ult, "%d/%m/%Y %H:%M"))
-                            except Exception:
-                                ultima_dt = None
-                    if ultima_dt is None:
-                        raw_creacion = r.get('created_at') or r.get('fecha_creacion')
-                        if raw_creacion:
-                            ultima_dt = datetime.fromisoformat(str(raw_creacion).replace("Z", "")).replace(tzinfo=pytz.utc).astimezone(tz_col)
-                    if ultima_dt is None:
-                        continue
-                    dias_quieta = (ahora_seg - ultima_dt).days
-                    if dias_quieta >= 5:
-                        alertas_quietas.append(
-                            f"🕒 OP {r.get('op')} ({r.get('cliente','')}) lleva {dias_quieta} día(s) SIN MOVIMIENTO — en espera de {r.get('proxima_area','SIN ÁREA')}"
-                        )
-                except Exception as e:
-                    print(f"Error en alerta OP quieta: {e}")
-
-            if alertas_quietas:
-                with st.expander(f"🚨 {len(alertas_quietas)} OP(s) QUIETAS por 5+ días — solo visibles para Admin", expanded=True):
-                    for al in alertas_quietas:
-                        st.warning(al)
-
-# SEPARA UNA LISTA DE ORDENES EN FORMAS / ROLLOS BLANCOS / REBOBINADO / ROLLOS IMPRESOS / BOLSAS
-        def _categoria_op(row):
-            tipo = (row.get('tipo_orden') or '').upper()
-            if "BOLSA" in tipo:
-                return "BOLSAS"
-            elif "FORMAS" in tipo:
-                return "FORMAS"
-            elif "REBOBINADO" in tipo:
-                return "REBOBINADO"
-            elif "BLANCOS" in tipo:
-                return "ROLLOS_BLANCOS"
-            else:
-                return "ROLLOS_IMPRESOS"
-
-        def pintar_tarjeta_op(row):
-            op_id = str(row['op'])
-            area_destino = row.get('proxima_area', 'SIN ÁREA').upper()
-            cliente = row.get('cliente', 'N/A')
-            nombre_t = row.get('nombre_trabajo', 'SIN NOMBRE')
-            vendedor = row.get('vendedor', 'N/A')
-            lugar = row.get('tipo_origen', 'N/A')
-           
-# LOGICA DE FILTRADO
-            if busqueda:
-                b = busqueda.lower()
-                
-                if (b not in op_id.lower() and 
-                    b not in cliente.lower() and 
-                    b not in nombre_t.lower() and
-                    b not in lugar.lower() and  
-                    b not in area_destino.lower() and 
-                    b not in vendedor.lower()):
-                    return
+    rol_seg_actual = st.session_state.get('rol', '').lower()
+    if rol_seg_actual == 'admin':
+        tz_col = pytz.timezone("America/Bogota")
+        ahora_seg = hora_colombia()
+        alertas_quietas = []
+        for r in _ordenes_pendientes_para_alertas():
+            try:
+                ultima_dt = None
+                ultimo_r = r.get('ultimo_paso')
+                if ultimo_r:
+                    raw_ult = ultimo_r.get('fecha') or ultimo_r.get('fin') or ultimo_r.get('inicio')
+                    if raw_ult:
+                        try:
+                            ultima_dt = tz_col.localize(datetime.strptime(raw_ult, "%d/%m/%Y %H:%M"))
+                        except Exception:
+                            ultima_dt = None
+                if ultima_dt is None:
+                    raw_creacion = r.get('created_at') or r.get('fecha_creacion')
+                    if raw_creacion:
+                        ultima_dt = datetime.fromisoformat(str(raw_creacion).replace("Z", "")).replace(tzinfo=pytz.utc).astimezone(tz_col)
+                if ultima_dt is None:
+                    continue
+                dias_quieta = (ahora_seg - ultima_dt).days
+                if dias_quieta >= 5:
+                    alertas_quietas.append(
+                        f"🕒 OP {r.get('op')} ({r.get('cliente','')}) lleva {dias_quieta} día(s) SIN MOVIMIENTO — en espera de {r.get('proxima_area','SIN ÁREA')}"
+                    )
+            except Exception as e:
+                print(f"Error en alerta OP quieta: {e}")
+
+        if alertas_quietas:
+            with st.expander(f"🚨 {len(alertas_quietas)} OP(s) QUIETAS por 5+ días — solo visibles para Admin", expanded=True):
+                for al in alertas_quietas:
+                    st.warning(al)
+
+    def pintar_tarjeta_op(row):
+        op_id = str(row['op'])
+        area_destino = row.get('proxima_area', 'SIN ÁREA').upper()
+        cliente = row.get('cliente', 'N/A')
+        nombre_t = row.get('nombre_trabajo', 'SIN NOMBRE')
+        vendedor = row.get('vendedor', 'N/A')
 
 # LOGICA DE ESTATUS MEJORADA
-            esta_anulada = bool(row.get('anulada'))
-            if esta_anulada:
-                texto_estatus = "🚫 ORDEN ANULADA"
-                color_texto = "red"
-            elif area_destino == "FINALIZADO":
-                
-                texto_estatus = "🔵 ORDEN FINALIZADA (BODEGA / DESPACHOS)"
-                color_texto = "blue"
-            elif op_id in op_en_maquina:
-                
-                maquina_nombre = op_en_maquina[op_id]
-                texto_estatus = f"🟢 EN {area_destino} (PROCESANDO EN: {maquina_nombre})"
-                color_texto = "green"
-            else:
-               
-                texto_estatus = f"⏳ EN ESPERA DE {area_destino}"
-                color_texto = "orange"
+        esta_anulada = bool(row.get('anulada'))
+        if esta_anulada:
+            texto_estatus = "🚫 ORDEN ANULADA"
+            color_texto = "red"
+        elif area_destino == "FINALIZADO":
+            
+            texto_estatus = "🔵 ORDEN FINALIZADA (BODEGA / DESPACHOS)"
+            color_texto = "blue"
+        elif op_id in op_en_maquina:
+            
+            maquina_nombre = op_en_maquina[op_id]
+            texto_estatus = f"🟢 EN {area_destino} (PROCESANDO EN: {maquina_nombre})"
+            color_texto = "green"
+        else:
+           
+            texto_estatus = f"⏳ EN ESPERA DE {area_destino}"
+            color_texto = "orange"
 
 #  DISEÑO DE TARJETA 
-            tipo_op = row.get('tipo_orden', '')
-            if "BOLSA" in tipo_op.upper():
-                icono_tipo = "👜"
-                etiqueta_tipo = "BOLSAS"
-                color_tipo = "#E65100"
-                borde_tipo = "#E65100"
-            elif "FORMAS" in tipo_op:
-                icono_tipo = "📄"
-                etiqueta_tipo = "FORMAS"
-                color_tipo = "#1565C0"
-                borde_tipo = "#1565C0"
-            elif "ROLLOS" in tipo_op:
-                icono_tipo = "🧻"
-                etiqueta_tipo = "ROLLOS"
-                color_tipo = "#2E7D32"
-                borde_tipo = "#2E7D32"
-            elif "REBOBINADO" in tipo_op:
-                icono_tipo = "🔄"
-                etiqueta_tipo = "REBOBINADO"
-                color_tipo = "#6A1B9A"
-                borde_tipo = "#6A1B9A"
-            else:
-                icono_tipo = "📦"
-                etiqueta_tipo = "OTRO"
-                color_tipo = "#555"
-                borde_tipo = "#555"
-            
-            fecha_raw = row.get('created_at') or row.get('fecha_creacion') or ''
-            fecha_fmt = fmt_fecha_hora(fecha_raw, con_hora=False) if fecha_raw else ''
-            if fecha_fmt == '-':
-                fecha_fmt = ''
-            titulo_unico = f"{icono_tipo} {etiqueta_tipo} | OP {op_id} | {cliente} | 🛠️ {nombre_t} | 💼 {vendedor} | 📅 {fecha_fmt} | {texto_estatus}"
-
-            if esta_anulada:
-                titulo_unico = f"🚫🔴 ORDEN ANULADA 🔴🚫 | {icono_tipo} {etiqueta_tipo} | OP {op_id} | {cliente} | 🛠️ {nombre_t} | 📅 {fecha_fmt}"
+        tipo_op = row.get('tipo_orden', '')
+        if "BOLSA" in tipo_op.upper():
+            icono_tipo = "👜"
+            etiqueta_tipo = "BOLSAS"
+            color_tipo = "#E65100"
+            borde_tipo = "#E65100"
+        elif "FORMAS" in tipo_op:
+            icono_tipo = "📄"
+            etiqueta_tipo = "FORMAS"
+            color_tipo = "#1565C0"
+            borde_tipo = "#1565C0"
+        elif "ROLLOS" in tipo_op:
+            icono_tipo = "🧻"
+            etiqueta_tipo = "ROLLOS"
+            color_tipo = "#2E7D32"
+            borde_tipo = "#2E7D32"
+        elif "REBOBINADO" in tipo_op:
+            icono_tipo = "🔄"
+            etiqueta_tipo = "REBOBINADO"
+            color_tipo = "#6A1B9A"
+            borde_tipo = "#6A1B9A"
+        else:
+            icono_tipo = "📦"
+            etiqueta_tipo = "OTRO"
+            color_tipo = "#555"
+            borde_tipo = "#555"
+        
+        fecha_raw = row.get('created_at') or row.get('fecha_creacion') or ''
+        fecha_fmt = fmt_fecha_hora(fecha_raw, con_hora=False) if fecha_raw else ''
+        if fecha_fmt == '-':
+            fecha_fmt = ''
+        titulo_unico = f"{icono_tipo} {etiqueta_tipo} | OP {op_id} | {cliente} | 🛠️ {nombre_t} | 💼 {vendedor} | 📅 {fecha_fmt} | {texto_estatus}"
+
+        if esta_anulada:
+            titulo_unico = f"🚫🔴 ORDEN ANULADA 🔴🚫 | {icono_tipo} {etiqueta_tipo} | OP {op_id} | {cliente} | 🛠️ {nombre_t} | 📅 {fecha_fmt}"
 # TARJETA COMPLETA EN ROJO PARA RESALTAR SOBRE LAS DEMAS (bloque HTML autocontenido)
-                st.markdown(f"""
-                <div style="background-color:#FDECEA; border:2px solid #C62828; border-left:10px solid #C62828;
-                            border-radius:8px; padding:12px 16px; margin-bottom:6px;">
-                  <div style="color:#B71C1C; font-weight:800; font-size:15px; margin-bottom:6px;">{titulo_unico}</div>
-                  <div style="color:#B71C1C; font-size:13.5px;">
-                    <b>Motivo de anulación:</b> {row.get('motivo_anulacion', 'Sin motivo registrado')}<br>
-                    <b>Anulada por:</b> {row.get('anulada_por', 'N/A')} &nbsp;|&nbsp; <b>Fecha:</b> {row.get('fecha_anulacion', 'N/A')}
-                  </div>
-                </div>
-                """, unsafe_allow_html=True)
+            st.markdown(f"""
+            <div style="background-color:#FDECEA; border:2px solid #C62828; border-left:10px solid #C62828;
+                        border-radius:8px; padding:12px 16px; margin-bottom:6px;">
+              <div style="color:#B71C1C; font-weight:800; font-size:15px; margin-bottom:6px;">{titulo_unico}</div>
+              <div style="color:#B71C1C; font-size:13.5px;">
+                <b>Motivo de anulación:</b> {row.get('motivo_anulacion', 'Sin motivo registrado')}<br>
+                <b>Anulada por:</b> {row.get('anulada_por', 'N/A')} &nbsp;|&nbsp; <b>Fecha:</b> {row.get('fecha_anulacion', 'N/A')}
+              </div>
+            </div>
+            """, unsafe_allow_html=True)
 
-                toggle_key = f"toggle_detalle_anulada_{op_id}"
-                if toggle_key not in st.session_state:
-                    st.session_state[toggle_key] = False
-                if st.button("🔍 Ver detalles de la orden anulada" if not st.session_state[toggle_key] else "🔽 Ocultar detalles",
-                             key=f"btn_{toggle_key}"):
-                    st.session_state[toggle_key] = not st.session_state[toggle_key]
-
-                if not st.session_state[toggle_key]:
-                    st.markdown("<div style='margin-bottom:14px;'></div>", unsafe_allow_html=True)
-                    return
-                contenedor_detalle = st.container()
-            else:
-                contenedor_detalle = st.expander(titulo_unico)
+            toggle_key = f"toggle_detalle_anulada_{op_id}"
+            if toggle_key not in st.session_state:
+                st.session_state[toggle_key] = False
+            if st.button("🔍 Ver detalles de la orden anulada" if not st.session_state[toggle_key] else "🔽 Ocultar detalles",
+                         key=f"btn_{toggle_key}"):
+                st.session_state[toggle_key] = not st.session_state[toggle_key]
+
+            if not st.session_state[toggle_key]:
+                st.markdown("<div style='margin-bottom:14px;'></div>", unsafe_allow_html=True)
+                return
+            contenedor_detalle = st.container()
+        else:
+            contenedor_detalle = st.expander(titulo_unico, expanded=True)
 
-            with contenedor_detalle:
-                st.markdown(f"### ESTATUS DE TRABAJO: :{color_texto}[{texto_estatus}]")
-                st.divider()
+        with contenedor_detalle:
+            st.markdown(f"### ESTATUS DE TRABAJO: :{color_texto}[{texto_estatus}]")
+            st.divider()
 
-                tipo_op_actual = row.get('tipo_orden', '')
-
-                if tipo_op_actual in ["FORMAS IMPRESAS", "FORMAS BLANCAS"]:
-                    c1, c2, c3, c4 = st.columns(4)
-                    with c1:
-                        st.write("**👤 CLIENTE:**")
-                        st.info(cliente)
-                        st.write("**⚙️ TIPO DE TRABAJO:**")
-                        st.info(tipo_op_actual)
-                        st.write("**📦 CANTIDAD SOLICITADA:**")
-                        st.info(row.get('cantidad_formas', 'N/A'))
-                        st.write("**🔢 NÚMERO DE PARTES:**")
-                        st.info(row.get('num_partes', 'N/A'))
-                    with c2:
-                        st.write("**📝 NOMBRE DE TRABAJO:**")
-                        st.info(nombre_t)
-                        st.write("**📑 PRESENTACIÓN:**")
-                        st.info(row.get('presentacion', 'N/A'))
-                        st.write("**📎 ENCOLADO / GRAPADO:**")
-                        st.info(row.get('presentacion2', 'N/A'))
-                        st.write("**🪚 PERFORACIONES:**")
-                        st.info(row.get('perforaciones_detalle', 'N/A'))
-                    with c3:
-                        st.write("**💼 VENDEDOR:**")
-                        st.info(row.get('vendedor', 'N/A'))
-                        st.write("**📅 FECHA:**")
-                        st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
-                        st.write("**🏷️ CÓDIGO DE BARRAS:**")
-                        st.info(row.get('codigo_barras_detalle', 'N/A'))
-                        st.write("**🔢 NUMERACIÓN (DESDE / HASTA):**")
-                        st.info(f"{row.get('num_id','-')} / {row.get('num_fd','-')}")
-                        st.write("**📋 OBSERVACIONES:**")
-                        st.info(row.get('observaciones_formas', 'N/A'))
-
-                elif tipo_op_actual in ["ROLLOS IMPRESOS", "ROLLOS BLANCOS", "REBOBINADO"]:
-                    c1, c2, c3, c4 = st.columns(4)
-                    with c1:
-                        st.write("**👤 CLIENTE:**")
-                        st.info(cliente)
-                        st.write("**⚙️ TIPO DE TRABAJO:**")
-                        st.info(tipo_op_actual)
-                        st.write("**📑 MATERIAL:**")
-                        st.info(row.get('material', 'N/A'))
-                        st.write("**⚖️ GRAMAJE:**")
-                        st.info(row.get('gramaje_rollos', 'N/A'))
-                    with c2:
-                        st.write("**📝 NOMBRE DE TRABAJO:**")
-                        st.info(nombre_t)
-                        st.write("**📦 CANTIDAD DE ROLLOS:**")
-                        st.info(row.get('cantidad_rollos', 'N/A'))
-                        if tipo_op_actual == "REBOBINADO":
-                            st.write("**↔️ REFERENCIA COMERCIAL:**")
-                            st.info(row.get('ref_comercial', 'N/A'))
-                            st.write("**🎯 OBJETIVO DEL REBOBINADO:**")
-                            st.info(row.get('objetivo_rebobinado', 'N/A'))
-                        else:
-                            st.write("**⭕ CORE:**")
-                            st.info(row.get('core', 'N/A'))
-                            st.write("**📖 REFERENCIA COMERCIAL:**")
-                            st.info(row.get('ref_comercial', 'N/A'))
-                    with c3:
-                        st.write("**💼 VENDEDOR:**")
-                        st.info(row.get('vendedor', 'N/A'))
-                        st.write("**📅 FECHA:**")
-                        st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
-                        if tipo_op_actual != "REBOBINADO":
-                            st.write("**🎨 TINTAS FRENTE / RESPALDO:**")
-                            st.info(f"{row.get('tintas_frente_rollos','-')} / {row.get('tintas_respaldo_rollos','-')}")
-                            st.write("**📦 UNIDAD BOLSA / CAJA:**")
-                            st.info(f"{row.get('unidades_bolsa','-')} / {row.get('unidades_caja','-')}")
-                        st.write("**📋 OBSERVACIONES:**")
-                        st.info(row.get('observaciones_rollos', 'N/A'))
-
-                elif tipo_op_actual in ["BOLSA IMPRESA", "BOLSA BLANCA"]:
-                    c1, c2, c3, c4 = st.columns(4)
-                    with c1:
-                        st.write("**👤 CLIENTE:**")
-                        st.info(cliente)
-                        st.write("**⚙️ TIPO DE TRABAJO:**")
-                        st.info(tipo_op_actual)
-                        st.write("**📑 MATERIAL:**")
-                        st.info(row.get('bolsa_material', 'N/A'))
-                        st.write("**⚖️ GRAMAJE:**")
-                        st.info(row.get('bolsa_gramaje', 'N/A'))
-                        st.write("**🖐️ TIPO DE MANIJA:**")
-                        st.info(row.get('bolsa_tipo_manija', 'N/A'))
-                    with c2:
-                        st.write("**📝 NOMBRE DE TRABAJO:**")
-                        st.info(nombre_t)
-                        st.write("**📐 MEDIDAS (C / c / W):**")
-                        st.info(f"{row.get('bolsa_c_largo_total','-')} / {row.get('bolsa_c_largo_util','-')} / {row.get('bolsa_w_ancho','-')}")
-                        st.write("**📐 FUELLE / PESTAÑA (H / h):**")
-                        st.info(f"{row.get('bolsa_h_fuelle','-')} / {row.get('bolsa_h_pestana','-')}")
-                        st.write("**⬛ BASE:**")
-                        st.info(row.get('bolsa_base', 'N/A'))
-                    with c3:
-                        st.write("**💼 VENDEDOR:**")
-                        st.info(row.get('vendedor', 'N/A'))
-                        st.write("**📅 FECHA:**")
-                        st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
-                        st.write("**📦 CANTIDAD DE BOLSAS:**")
-                        st.info(row.get('bolsa_cantidad', 'N/A'))
-                        st.write("**🎨 TINTAS (N.° / COLOR):**")
-                        st.info(f"{row.get('bolsa_tintas_num','-')} / {row.get('bolsa_tintas_color','-')}")
-                        st.write("**♻️ CERTIFICACIÓN FSC:**")
-                        st.info(row.get('bolsa_certificacion_fsc', 'N/A'))
-                        st.write("**📋 OBSERVACIONES:**")
-                        st.info(row.get('observaciones_bolsa', 'N/A'))
+            tipo_op_actual = row.get('tipo_orden', '')
 
-                else:
-                    c1, c2, c3, c4 = st.columns(4)
-                    with c1:
-                        st.write("**👤 CLIENTE:**")
-                        st.info(cliente)
-                        st.write("**⚙️ TIPO DE TRABAJO:**")
-                        st.info(tipo_op_actual or 'N/A')
-                    with c2:
-                        st.write("**📝 NOMBRE DE TRABAJO:**")
-                        st.info(nombre_t)
-                    with c3:
-                        st.write("**💼 VENDEDOR:**")
-                        st.info(row.get('vendedor', 'N/A'))
-                        st.write("**📅 FECHA:**")
-                        st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
-
-                with c4:
-                    st.write("**🛠️ ACCIONES Y ENLACES:**")
+            if tipo_op_actual in ["FORMAS IMPRESAS", "FORMAS BLANCAS"]:
+                c1, c2, c3, c4 = st.columns(4)
+                with c1:
+                    st.write("**👤 CLIENTE:**")
+                    st.info(cliente)
+                    st.write("**⚙️ TIPO DE TRABAJO:**")
+                    st.info(tipo_op_actual)
+                    st.write("**📦 CANTIDAD SOLICITADA:**")
+                    st.info(row.get('cantidad_formas', 'N/A'))
+                    st.write("**🔢 NÚMERO DE PARTES:**")
+                    st.info(row.get('num_partes', 'N/A'))
+                with c2:
+                    st.write("**📝 NOMBRE DE TRABAJO:**")
+                    st.info(nombre_t)
+                    st.write("**📑 PRESENTACIÓN:**")
+                    st.info(row.get('presentacion', 'N/A'))
+                    st.write("**📎 ENCOLADO / GRAPADO:**")
+                    st.info(row.get('presentacion2', 'N/A'))
+                    st.write("**🪚 PERFORACIONES:**")
+                    st.info(row.get('perforaciones_detalle', 'N/A'))
+                with c3:
+                    st.write("**💼 VENDEDOR:**")
+                    st.info(row.get('vendedor', 'N/A'))
+                    st.write("**📅 FECHA:**")
+                    st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
+                    st.write("**🏷️ CÓDIGO DE BARRAS:**")
+                    st.info(row.get('codigo_barras_detalle', 'N/A'))
+                    st.write("**🔢 NUMERACIÓN (DESDE / HASTA):**")
+                    st.info(f"{row.get('num_id','-')} / {row.get('num_fd','-')}")
+                    st.write("**📋 OBSERVACIONES:**")
+                    st.info(row.get('observaciones_formas', 'N/A'))
+
+            elif tipo_op_actual in ["ROLLOS IMPRESOS", "ROLLOS BLANCOS", "REBOBINADO"]:
+                c1, c2, c3, c4 = st.columns(4)
+                with c1:
+                    st.write("**👤 CLIENTE:**")
+                    st.info(cliente)
+                    st.write("**⚙️ TIPO DE TRABAJO:**")
+                    st.info(tipo_op_actual)
+                    st.write("**📑 MATERIAL:**")
+                    st.info(row.get('material', 'N/A'))
+                    st.write("**⚖️ GRAMAJE:**")
+                    st.info(row.get('gramaje_rollos', 'N/A'))
+                with c2:
+                    st.write("**📝 NOMBRE DE TRABAJO:**")
+                    st.info(nombre_t)
+                    st.write("**📦 CANTIDAD DE ROLLOS:**")
+                    st.info(row.get('cantidad_rollos', 'N/A'))
+                    if tipo_op_actual == "REBOBINADO":
+                        st.write("**↔️ REFERENCIA COMERCIAL:**")
+                        st.info(row.get('ref_comercial', 'N/A'))
+                        st.write("**🎯 OBJETIVO DEL REBOBINADO:**")
+                        st.info(row.get('objetivo_rebobinado', 'N/A'))
+                    else:
+                        st.write("**⭕ CORE:**")
+                        st.info(row.get('core', 'N/A'))
+                        st.write("**📖 REFERENCIA COMERCIAL:**")
+                        st.info(row.get('ref_comercial', 'N/A'))
+                with c3:
+                    st.write("**💼 VENDEDOR:**")
+                    st.info(row.get('vendedor', 'N/A'))
+                    st.write("**📅 FECHA:**")
+                    st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
+                    if tipo_op_actual != "REBOBINADO":
+                        st.write("**🎨 TINTAS FRENTE / RESPALDO:**")
+                        st.info(f"{row.get('tintas_frente_rollos','-')} / {row.get('tintas_respaldo_rollos','-')}")
+                        st.write("**📦 UNIDAD BOLSA / CAJA:**")
+                        st.info(f"{row.get('unidades_bolsa','-')} / {row.get('unidades_caja','-')}")
+                    st.write("**📋 OBSERVACIONES:**")
+                    st.info(row.get('observaciones_rollos', 'N/A'))
+
+            elif tipo_op_actual in ["BOLSA IMPRESA", "BOLSA BLANCA"]:
+                c1, c2, c3, c4 = st.columns(4)
+                with c1:
+                    st.write("**👤 CLIENTE:**")
+                    st.info(cliente)
+                    st.write("**⚙️ TIPO DE TRABAJO:**")
+                    st.info(tipo_op_actual)
+                    st.write("**📑 MATERIAL:**")
+                    st.info(row.get('bolsa_material', 'N/A'))
+                    st.write("**⚖️ GRAMAJE:**")
+                    st.info(row.get('bolsa_gramaje', 'N/A'))
+                    st.write("**🖐️ TIPO DE MANIJA:**")
+                    st.info(row.get('bolsa_tipo_manija', 'N/A'))
+                with c2:
+                    st.write("**📝 NOMBRE DE TRABAJO:**")
+                    st.info(nombre_t)
+                    st.write("**📐 MEDIDAS (C / c / W):**")
+                    st.info(f"{row.get('bolsa_c_largo_total','-')} / {row.get('bolsa_c_largo_util','-')} / {row.get('bolsa_w_ancho','-')}")
+                    st.write("**📐 FUELLE / PESTAÑA (H / h):**")
+                    st.info(f"{row.get('bolsa_h_fuelle','-')} / {row.get('bolsa_h_pestana','-')}")
+                    st.write("**⬛ BASE:**")
+                    st.info(row.get('bolsa_base', 'N/A'))
+                with c3:
+                    st.write("**💼 VENDEDOR:**")
+                    st.info(row.get('vendedor', 'N/A'))
+                    st.write("**📅 FECHA:**")
+                    st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
+                    st.write("**📦 CANTIDAD DE BOLSAS:**")
+                    st.info(row.get('bolsa_cantidad', 'N/A'))
+                    st.write("**🎨 TINTAS (N.° / COLOR):**")
+                    st.info(f"{row.get('bolsa_tintas_num','-')} / {row.get('bolsa_tintas_color','-')}")
+                    st.write("**♻️ CERTIFICACIÓN FSC:**")
+                    st.info(row.get('bolsa_certificacion_fsc', 'N/A'))
+                    st.write("**📋 OBSERVACIONES:**")
+                    st.info(row.get('observaciones_bolsa', 'N/A'))
+
+            else:
+                c1, c2, c3, c4 = st.columns(4)
+                with c1:
+                    st.write("**👤 CLIENTE:**")
+                    st.info(cliente)
+                    st.write("**⚙️ TIPO DE TRABAJO:**")
+                    st.info(tipo_op_actual or 'N/A')
+                with c2:
+                    st.write("**📝 NOMBRE DE TRABAJO:**")
+                    st.info(nombre_t)
+                with c3:
+                    st.write("**💼 VENDEDOR:**")
+                    st.info(row.get('vendedor', 'N/A'))
+                    st.write("**📅 FECHA:**")
+                    st.info(fmt_fecha_hora(row.get('created_at'), con_hora=False))
+
+            with c4:
+                st.write("**🛠️ ACCIONES Y ENLACES:**")
 
 # BOTON DE READIOGRAFIA
-                    if st.button(f"📋 VER RADIOGRAFIA OP {op_id}", key=f"btn_seg_{op_id}", use_container_width=True):
-                        modal_detalle_op(row)
+                if st.button(f"📋 VER RADIOGRAFIA OP {op_id}", key=f"btn_seg_{op_id}", use_container_width=True):
+                    modal_detalle_op(row)
 
 # MOSTRAR      
-                    link_arte = row.get('link_diseno')
-                    num_ticket_seg = row.get('num_ticket')
+                link_arte = row.get('link_diseno')
+                num_ticket_seg = row.get('num_ticket')
 
-                    if link_arte:
-                        st.link_button("🎨 VER ARTE", link_arte, use_container_width=True)
+                if link_arte:
+                    st.link_button("🎨 VER ARTE", link_arte, use_container_width=True)
 
 # El ticket es un numero que el vendedor ingresa al crear la OP (num_ticket).
-                    if num_ticket_seg:
-                        st.metric("🎫 TICKET", num_ticket_seg)
+                if num_ticket_seg:
+                    st.metric("🎫 TICKET", num_ticket_seg)
 
-                    if not link_arte and not num_ticket_seg:
-                        st.caption("Sin links adjuntos")
+                if not link_arte and not num_ticket_seg:
+                    st.caption("Sin links adjuntos")
 
-                st.divider()
+            st.divider()
 
 #  BOTONES DE DESCARGA ORDEN EN PDF
-                if st.session_state.get('rol') in ['admin', 'ventas', 'diseño']:
-                    try:
-                        tipo = row.get('tipo_orden', '')
-                        if "BOLSA" in tipo:
-                            pdf_data = generar_op_bolsas(row)
-                        elif "FORMAS" in tipo:
-                            pdf_data = generar_op_formas(row)
-                        elif "ROLLOS" in tipo:
-                            pdf_data = generar_op_rollos(row)
-                        else:
-                            pdf_data = generar_op_rebobinado(row)
-                            
+# El PDF solo se genera cuando alguien lo pide (o si ya esta en la cache); antes se armaba uno por cada tarjeta en cada recarga.
+            if st.session_state.get('rol') in ['admin', 'ventas', 'diseño']:
+                try:
+                    pdf_data = pdf_orden_en_cache(row)
+                    if pdf_data is None and st.button(f"🧾 Preparar PDF Orden {op_id}", key=f"prep_pdf_{op_id}", use_container_width=True):
+                        pdf_data = pdf_orden_cacheado(row)
+                    if pdf_data is not None:
                         st.download_button(
                             label=f"📥 Descargar PDF Orden {op_id}",
                             data=pdf_data,
@@ -2434,79 +2778,69 @@ elif menu == "🔍 Seguimiento":
                             key=f"dl_pdf_{op_id}",
                             use_container_width=True
                         )
-                    except Exception as e:
-                        st.error(f"No se pudo generar el PDF: {e}")
+                except Exception as e:
+                    st.error(f"No se pudo generar el PDF: {e}")
+
+# GRILLA RESUMIDA Y PAGINADA (una fila por OP); la tarjeta completa solo se pinta para la OP que se elige.
+    def pintar_lista_paginada(finalizadas, key_sufijo):
+        c_cat, c_orden, c_pag = st.columns([2, 2, 1])
+        categoria = c_cat.selectbox("Tipo de orden", list(CATEGORIAS_SEGUIMIENTO.keys()), key=f"seg_cat_{key_sufijo}")
+        orden = c_orden.selectbox(
+            "Ordenar por", list(ORDENES_SEGUIMIENTO.keys()), key=f"seg_orden_{key_sufijo}",
+            disabled=bool(busqueda.strip()), help="Al buscar, las órdenes salen de la más parecida a la menos."
+        )
+# La pagina va atada a los filtros: al cambiar alguno se vuelve a la pagina 1.
+        filtros_pag = hashlib.md5(f"{categoria}|{orden}|{busqueda.strip()}".encode("utf-8")).hexdigest()[:10]
+        pagina = c_pag.number_input("Página", min_value=1, step=1, key=f"seg_pag_{key_sufijo}_{filtros_pag}")
 
-# RECORRIDO DE TARJETAS POR PESTAÑA, SEPARADAS EN FORMAS / ROLLOS BLANCOS / REBOBINADO / ROLLOS IMPRESOS / BOLSAS
-        with tab_pendientes:
-            sub_formas_p, sub_rblancos_p, sub_rebob_p, sub_rimpresos_p, sub_bolsas_p = st.tabs(
-                ["📄 Formas", "🧻 Rollos Blancos", "🔄 Rebobinado", "🧵 Rollos Impresos", "👜 Bolsas"]
-            )
-            pendientes_formas = [r for r in ordenes_pendientes if _categoria_op(r) == "FORMAS"]
-            pendientes_rblancos = [r for r in ordenes_pendientes if _categoria_op(r) == "ROLLOS_BLANCOS"]
-            pendientes_rebob = [r for r in ordenes_pendientes if _categoria_op(r) == "REBOBINADO"]
-            pendientes_rimpresos = [r for r in ordenes_pendientes if _categoria_op(r) == "ROLLOS_IMPRESOS"]
-            pendientes_bolsas = [r for r in ordenes_pendientes if _categoria_op(r) == "BOLSAS"]
-            with sub_formas_p:
-                if not pendientes_formas:
-                    st.info("No hay órdenes de FORMAS pendientes o en proceso.")
-                for row in pendientes_formas:
-                    pintar_tarjeta_op(row)
-            with sub_rblancos_p:
-                if not pendientes_rblancos:
-                    st.info("No hay órdenes de ROLLOS BLANCOS pendientes o en proceso.")
-                for row in pendientes_rblancos:
-                    pintar_tarjeta_op(row)
-            with sub_rebob_p:
-                if not pendientes_rebob:
-                    st.info("No hay órdenes de REBOBINADO pendientes o en proceso.")
-                for row in pendientes_rebob:
-                    pintar_tarjeta_op(row)
-            with sub_rimpresos_p:
-                if not pendientes_rimpresos:
-                    st.info("No hay órdenes de ROLLOS IMPRESOS pendientes o en proceso.")
-                for row in pendientes_rimpresos:
-                    pintar_tarjeta_op(row)
-            with sub_bolsas_p:
-                if not pendientes_bolsas:
-                    st.info("No hay órdenes de BOLSAS pendientes o en proceso.")
-                for row in pendientes_bolsas:
-                    pintar_tarjeta_op(row)
-
-        with tab_finalizadas:
-            sub_formas_f, sub_rblancos_f, sub_rebob_f, sub_rimpresos_f, sub_bolsas_f = st.tabs(
-                ["📄 Formas", "🧻 Rollos Blancos", "🔄 Rebobinado", "🧵 Rollos Impresos", "👜 Bolsas"]
-            )
-            finalizadas_formas = [r for r in ordenes_finalizadas if _categoria_op(r) == "FORMAS"]
-            finalizadas_rblancos = [r for r in ordenes_finalizadas if _categoria_op(r) == "ROLLOS_BLANCOS"]
-            finalizadas_rebob = [r for r in ordenes_finalizadas if _categoria_op(r) == "REBOBINADO"]
-            finalizadas_rimpresos = [r for r in ordenes_finalizadas if _categoria_op(r) == "ROLLOS_IMPRESOS"]
-            finalizadas_bolsas = [r for r in ordenes_finalizadas if _categoria_op(r) == "BOLSAS"]
-            with sub_formas_f:
-                if not finalizadas_formas:
-                    st.info("No hay órdenes de FORMAS finalizadas.")
-                for row in finalizadas_formas:
-                    pintar_tarjeta_op(row)
-            with sub_rblancos_f:
-                if not finalizadas_rblancos:
-                    st.info("No hay órdenes de ROLLOS BLANCOS finalizadas.")
-                for row in finalizadas_rblancos:
-                    pintar_tarjeta_op(row)
-            with sub_rebob_f:
-                if not finalizadas_rebob:
-                    st.info("No hay órdenes de REBOBINADO finalizadas.")
-                for row in finalizadas_rebob:
-                    pintar_tarjeta_op(row)
-            with sub_rimpresos_f:
-                if not finalizadas_rimpresos:
-                    st.info("No hay órdenes de ROLLOS IMPRESOS finalizadas.")
-                for row in finalizadas_rimpresos:
-                    pintar_tarjeta_op(row)
-            with sub_bolsas_f:
-                if not finalizadas_bolsas:
-                    st.info("No hay órdenes de BOLSAS finalizadas.")
-                for row in finalizadas_bolsas:
-                    pintar_tarjeta_op(row)
+        try:
+            filas, total = _pagina_ordenes_seguimiento(finalizadas, categoria, busqueda.strip(), orden, int(pagina))
+        except Exception as e:
+            st.error(f"Error al cargar órdenes: {e}")
+            return
+
+        total_paginas = max(1, -(-total // SEGUIMIENTO_TAM_PAGINA))
+        st.caption(f"{total} orden(es) — página {min(int(pagina), total_paginas)} de {total_paginas}")
+        if not filas:
+            st.info("No hay órdenes para mostrar con estos filtros.")
+            return
+
+        resumen = []
+        for r in filas:
+            op_r = str(r.get('op'))
+            area_r = (r.get('proxima_area') or 'SIN ÁREA').upper()
+            if r.get('anulada'):
+                estado_r = "🚫 ANULADA"
+            elif area_r == "FINALIZADO":
+                estado_r = "🔵 FINALIZADA"
+            elif op_r in op_en_maquina:
+                estado_r = f"🟢 {area_r} ({op_en_maquina[op_r]})"
+            else:
+                estado_r = f"⏳ ESPERA {area_r}"
+            resumen.append({
+                "OP": op_r,
+                "Tipo": r.get('tipo_orden', ''),
+                "Cliente": r.get('cliente', ''),
+                "Trabajo": r.get('nombre_trabajo', ''),
+                "Vendedor": r.get('vendedor', ''),
+                "Fecha": fmt_fecha_hora(r.get('created_at') or r.get('fecha_creacion'), con_hora=False),
+                "Estado": estado_r,
+            })
+        st.dataframe(pd.DataFrame(resumen), hide_index=True, use_container_width=True)
+
+        op_elegida = st.selectbox(
+            "🔎 Ver detalle de la OP:", ["—"] + [x["OP"] for x in resumen], key=f"seg_det_{key_sufijo}"
+        )
+        if op_elegida != "—":
+            fila_completa = _orden_completa_seguimiento(op_elegida)
+            if fila_completa:
+                pintar_tarjeta_op(fila_completa)
+
+    with tab_pendientes:
+        pintar_lista_paginada(False, "p")
+
+    with tab_finalizadas:
+        pintar_lista_paginada(True, "f")
 
 # MODULO DE DISEÑO
 elif menu == "🎨 Diseño y Pre-Prensa":
@@ -2587,10 +2921,9 @@ elif menu == "🎨 Diseño y Pre-Prensa":
                             "link_diseno": link_arte, 
                             "observaciones_diseno": obs_dis,
                             "observaciones_diseno2": obs_dise,  
-                            "proxima_area": destino_siguiente,
-                            "historial_procesos": hist_dis
+                            "proxima_area": destino_siguiente
                         }
-                        supabase.table("ordenes_planeadas").update(update_data).eq("op", op_id).execute()
+                        registrar_paso_op(op_id, hist_dis, update_data)
                         if es_bolsa_diseno:
                             st.success(f"Enviado a planta de producción de Bolsas ({destino_siguiente}).")
                         elif es_repeticion_exacta:
@@ -2635,10 +2968,7 @@ elif menu == "🎨 Diseño y Pre-Prensa":
                         "tiempo_total_area": tiempo_area_txt2,
                         "observaciones": ""
                     })
-                    supabase.table("ordenes_planeadas").update({
-                        "proxima_area": "REVISION_FINAL",
-                        "historial_procesos": hist_pre
-                    }).eq("op", op_id_2).execute()
+                    registrar_paso_op(op_id_2, hist_pre, {"proxima_area": "REVISION_FINAL"})
                     st.success("Enviado a Revisión Final."); time.sleep(1); st.rerun()
 
 # REVISION FINAL CON PLANCHA 
@@ -2689,11 +3019,10 @@ elif menu == "🎨 Diseño y Pre-Prensa":
                     })
 
 # Actualizamos a IMPRESION para que pase a la planta (incluye el link del arte,
-                    supabase.table("ordenes_planeadas").update({
+                    registrar_paso_op(op_id_3, hist_rev, {
                         "proxima_area": "IMPRESIÓN",
-                        "link_diseno": link_arte_final,
-                        "historial_procesos": hist_rev
-                    }).eq("op", op_id_3).execute()
+                        "link_diseno": link_arte_final
+                    })
                     st.success("Orden enviada a planta exitosamente."); time.sleep(1); st.rerun()
         else:
             st.info("No hay órdenes pendientes para revisión de plancha.")
@@ -2735,10 +3064,7 @@ elif menu == "🧐 Auditoría Ventas":
                     "duracion": tiempo_area_txt_av,
                     "tiempo_total_area": tiempo_area_txt_av
                 })
-                supabase.table("ordenes_planeadas").update({
-                    "proxima_area": ruta_siguiente_av,
-                    "historial_procesos": hist_av
-                }).eq("op", op_id_av).execute()
+                registrar_paso_op(op_id_av, hist_av, {"proxima_area": ruta_siguiente_av})
                 st.success(f"✅ OP {op_id_av} revisada. Continúa hacia {ruta_siguiente_av}.")
                 time.sleep(1.2)
                 st.rerun()
@@ -2786,10 +3112,7 @@ elif menu == "🧐 Auditoría Bolsas":
                     "duracion": tiempo_area_txt_ab,
                     "tiempo_total_area": tiempo_area_txt_ab
                 })
-                supabase.table("ordenes_planeadas").update({
-                    "proxima_area": ruta_siguiente_ab,
-                    "historial_procesos": hist_ab
-                }).eq("op", op_id_ab).execute()
+                registrar_paso_op(op_id_ab, hist_ab, {"proxima_area": ruta_siguiente_ab})
                 st.success(f"✅ OP {op_id_ab} revisada. Continúa hacia {ruta_siguiente_ab}.")
                 time.sleep(1.2)
                 st.rerun()
@@ -2824,6 +3147,9 @@ elif menu == "📅 Planificación":
                     st.session_state['op_editar_data'] = res_edit.data[0]
                 else:
                     st.error("❌ No se encontró esa OP.")
+                    sugerencias_edit = texto_sugerencias_ordenes(op_buscar_edit)
+                    if sugerencias_edit:
+                        st.info(f"¿Quizás buscabas?: {sugerencias_edit}")
                     st.session_state.pop('op_editar_data', None)
             else:
                 st.warning("Ingresa el número de OP.")
@@ -3106,9 +3432,7 @@ elif menu == "📅 Planificación":
                                     "observaciones": nueva_obs_gral,
                                     "nota":          f"Editado: {nueva_obs_gral}"
                                 })
-                                supabase.table("ordenes_planeadas").update({
-                                    "historial_procesos": hist
-                                }).eq("op", op_edit['op']).execute()
+                                registrar_paso_op(op_edit['op'], hist)
 
                                 st.success(f"✅ OP {op_edit['op']} actualizada correctamente.")
                                 st.session_state.pop('op_editar_data', None)
@@ -3139,6 +3463,9 @@ elif menu == "📅 Planificación":
                         st.session_state['op_anular_data'] = res_anular.data[0]
                     else:
                         st.error("❌ No se encontró esa OP.")
+                        sugerencias_anular = texto_sugerencias_ordenes(op_buscar_anular)
+                        if sugerencias_anular:
+                            st.info(f"¿Quizás buscabas?: {sugerencias_anular}")
                         st.session_state.pop('op_anular_data', None)
                 else:
                     st.warning("Ingresa el número de OP.")
@@ -3188,17 +3515,17 @@ elif menu == "📅 Planificación":
                                     "observaciones": f"OP anulada. Estaba en '{estado_anular_actual}'. Motivo: {motivo_anulacion_txt}"
                                 })
 
-                                supabase.table("ordenes_planeadas").update({
+                                registrar_paso_op(op_anular['op'], hist_anular, {
                                     "anulada": True,
                                     "motivo_anulacion": motivo_anulacion_txt,
                                     "fecha_anulacion": hora_colombia().strftime("%d/%m/%Y %H:%M"),
                                     "anulada_por": st.session_state.get('nombre_usuario', '?'),
-                                    "proxima_area": "ANULADA",
-                                    "historial_procesos": hist_anular
-                                }).eq("op", op_anular['op']).execute()
+                                    "proxima_area": "ANULADA"
+                                })
 
 # SI LA OP ESTABA ACTIVA EN UNA MAQUINA, SE LIBERA AUTOMATICAMENTE
                                 supabase.table("trabajos_activos").delete().eq("op", op_anular['op']).execute()
+                                trabajos_activos_area.clear()
 
                                 st.success(f"🚫 OP {op_anular['op']} anulada correctamente. Ya no aparece en ninguna ruta ni área, "
                                            f"y puedes crear una nueva OP con ese mismo número cuando quieras.")
@@ -3230,6 +3557,9 @@ elif menu == "📅 Planificación":
                         else:
                             st.session_state['datos_rec_cargados'] = {}
                             st.error("No se encontró la OP. Verifique el prefijo y número.")
+                            sugerencias_rep = texto_sugerencias_ordenes(op_a_buscar)
+                            if sugerencias_rep:
+                                st.info(f"¿Quizás buscabas?: {sugerencias_rep}")
                     except Exception as e:
                         st.error(f"Error en la base de datos: {e}")
                 else:
@@ -3658,6 +3988,7 @@ elif menu == "📅 Planificación":
 # Si la columna 'anulada' aún no existe en Supabase, reintenta guardar sin ella.
                             payload.pop("anulada", None)
                             _insertar_op_con_reintentos(payload)
+                    cola_ops_area.clear()
 
                     st.success(f"Orden {op_final} registrada.")
                     st.session_state.sel_tipo = None
@@ -3897,23 +4228,28 @@ elif menu == "📦 salida produccion P1":
 elif menu == "📊 Reportes Admin":
         st.title("📊 Panel de Control y Reportes")
         
-        tab_historial, tab_muertos, tab_paradas, tab_traza, tab_rendimiento, tab_movs = st.tabs([
+# Selector en vez de st.tabs: Streamlit ejecuta TODAS las pestañas en cada recarga; asi solo corre el reporte elegido.
+        col_rep_sel, col_rep_act = st.columns([5, 1])
+        reporte_sel = col_rep_sel.radio("Reporte", [
             "📦 Historial de Bodega", 
             "⏳ Disponibilidad (Máquina Libre)", 
             "🛑 Reporte de Paradas (Fallas)",
             "🗂️ Trazabilidad de OPs",
             "👷 Rendimiento Maquinistas",
             "🛠️ Movimientos del Sistema"
-        ])
+        ], horizontal=True, key="reporte_admin_sel", label_visibility="collapsed")
+        if col_rep_act.button("🔄 Actualizar datos", key="btn_actualizar_reportes", use_container_width=True):
+            limpiar_memo_reportes()
         
-        with tab_historial:
+        if reporte_sel == "📦 Historial de Bodega":
             st.subheader("Historial de Movimientos de Bodega")
 # OPTIMIZACION: por defecto solo trae los 500 movimientos mas recientes (mucho mas rapido); si se necesita revisar mas atras, el interruptor trae todo el historico.
+            boton_exportar_excel("bodega", "historial_bodega", "bodega_historial")
             ver_todo_bodega = st.checkbox("Ver historial completo (puede tardar más)", key="ver_todo_bodega")
             q_h = supabase.table("bodega_historial").select("*").order("fecha", desc=True)
             if not ver_todo_bodega:
                 q_h = q_h.limit(500)
-            res_h = q_h.execute().data
+            res_h = memo_reporte(f"bodega_{ver_todo_bodega}", lambda: q_h.execute().data)
             if res_h:
                 if not ver_todo_bodega:
                     st.caption(f"Mostrando los {len(res_h)} movimientos más recientes.")
@@ -3929,15 +4265,19 @@ elif menu == "📊 Reportes Admin":
             else:
                 st.info("Sin registros en bodega.")
 
-        with tab_muertos:
+        elif reporte_sel == "⏳ Disponibilidad (Máquina Libre)":
             st.subheader("⏳ Tiempo de Máquina Libre (Sin Órdenes)")
 
 #  TOMA DE TIEMPOS DE MAQUIA LIBRE ENTRE UNA OP Y OTRA 
+            boton_exportar_excel("muertos", "tiempo_maquina_libre", "tiempos_muertos", {
+                "maquina": "MÁQUINA", "motivo": "MOTIVO", "inicio": "INICIO", "fin": "FIN",
+                "fecha": "FECHA", "duracion_segundos": "DURACIÓN",
+            })
             ver_todo_muertos = st.checkbox("Ver historial completo (puede tardar más)", key="ver_todo_muertos")
             q_m = supabase.table("tiempos_muertos").select("*").order("fecha", desc=True)
             if not ver_todo_muertos:
                 q_m = q_m.limit(500)
-            res_m = q_m.execute().data
+            res_m = memo_reporte(f"muertos_{ver_todo_muertos}", lambda: q_m.execute().data)
             if res_m:
                 if not ver_todo_muertos:
                     st.caption(f"Mostrando los {len(res_m)} registros más recientes.")
@@ -3960,15 +4300,19 @@ elif menu == "📊 Reportes Admin":
             else:
                 st.info("No hay registros de tiempo libre.")
 
-        with tab_paradas:
+        elif reporte_sel == "🛑 Reporte de Paradas (Fallas)":
             st.subheader("🛑 Reporte de Fallas y Paradas Técnicas")
 
 # AQUI S EMUESTRA PORQUE LA MAQUINA SE DERUBO 
+            boton_exportar_excel("paradas", "paradas_maquina", "paradas_maquina", {
+                "maquina": "MÁQUINA", "motivo": "MOTIVO", "inicio": "INICIO", "fin": "FIN",
+                "fecha": "FECHA", "duracion_segundos": "DURACIÓN",
+            })
             ver_todo_paradas = st.checkbox("Ver historial completo (puede tardar más)", key="ver_todo_paradas")
             q_p = supabase.table("paradas_maquina").select("*").order("fecha", desc=True)
             if not ver_todo_paradas:
                 q_p = q_p.limit(500)
-            res_p = q_p.execute().data
+            res_p = memo_reporte(f"paradas_{ver_todo_paradas}", lambda: q_p.execute().data)
             if res_p:
                 if not ver_todo_paradas:
                     st.caption(f"Mostrando los {len(res_p)} registros más recientes.")
@@ -3993,16 +4337,19 @@ elif menu == "📊 Reportes Admin":
                 st.info("No hay reportes de fallas técnicos.")
 
 # TRAZABILIDAD COMPLETA DE OPs (desde que se crea hasta el ultimo paso) 
-        with tab_traza:
+        elif reporte_sel == "🗂️ Trazabilidad de OPs":
             st.subheader("🗂️ Trazabilidad Completa de Órdenes de Producción")
             st.caption("Quién creó cada orden y cada paso por el que ha pasado en planta, con fechas y responsables.")
 
 # SEPARA LAS ORDENES POR PREFIJO (RI-, RB-, FRI-, FRB-, RR-, BI-, BB-) PARA QUE SEA MAS FACIL
-            sub_ri, sub_rb, sub_fri, sub_frb, sub_rr, sub_bi, sub_bb = st.tabs([
-                "🧵 RI- (Rollos Impresos)", "🧻 RB- (Rollos Blancos)",
-                "📑 FRI- (Formas Impresas)", "📄 FRB- (Formas Blancas)", "🔄 RR- (Rebobinado)",
-                "👜 BI- (Bolsas Impresas)", "🛍️ BB- (Bolsas Blancas)"
-            ])
+            prefijos_traza = {
+                "🧵 RI- (Rollos Impresos)": ("RI-", "ri"), "🧻 RB- (Rollos Blancos)": ("RB-", "rb"),
+                "📑 FRI- (Formas Impresas)": ("FRI-", "fri"), "📄 FRB- (Formas Blancas)": ("FRB-", "frb"),
+                "🔄 RR- (Rebobinado)": ("RR-", "rr"),
+                "👜 BI- (Bolsas Impresas)": ("BI-", "bi"), "🛍️ BB- (Bolsas Blancas)": ("BB-", "bb")
+            }
+            prefijo_traza_sel = st.radio("Prefijo", list(prefijos_traza.keys()), horizontal=True,
+                                         key="prefijo_traza_sel", label_visibility="collapsed")
 
             def _tab_trazabilidad_por_prefijo(prefijo, key_sufijo):
                 busqueda_op = st.text_input(
@@ -4010,24 +4357,34 @@ elif menu == "📊 Reportes Admin":
                     key=f"busca_traza_{key_sufijo}"
                 )
 
-                todas_ops_traza = supabase.table("ordenes_planeadas").select("*").ilike("op", f"{prefijo}%").execute().data or []
-
-                if busqueda_op:
-                    b = busqueda_op.strip().lower()
-                    todas_ops_traza = [
-                        o for o in todas_ops_traza
-                        if b in str(o.get("op", "")).lower() or b in str(o.get("cliente", "")).lower()
-                    ]
-
-                def _fecha_orden_traza(o):
-                    return str(o.get("created_at") or o.get("fecha_creacion") or "")
-                todas_ops_traza.sort(key=_fecha_orden_traza, reverse=True)
-
-                if not busqueda_op:
-                    st.info(f"Mostrando las 50 órdenes {prefijo} más recientes de {len(todas_ops_traza)}. Usa el buscador para ver cualquier OP histórica.")
-                    todas_ops_traza = todas_ops_traza[:50]
+                def _cargar_ops_traza():
+                    if busqueda_op.strip():
+# La busqueda la resuelve la base de datos; luego se traen completas (con historial) solo las OPs encontradas.
+                        encontradas, total_traza = buscar_ordenes(busqueda_op, prefijo=prefijo, tam_pagina=50)
+                        ops_encontradas = [str(o.get("op")) for o in encontradas]
+                        completas = []
+                        if ops_encontradas:
+                            completas = supabase.table("ordenes_planeadas").select("*").in_("op", ops_encontradas).execute().data or []
+                        por_op = {str(o.get("op")): o for o in completas}
+                        return adjuntar_historial_pasos([por_op[op] for op in ops_encontradas if op in por_op]), total_traza
+                    res_traza = supabase.table("ordenes_planeadas").select("*", count="exact").ilike("op", f"{prefijo}%")\
+                        .order("created_at", desc=True).limit(50).execute()
+                    return adjuntar_historial_pasos(res_traza.data or []), res_traza.count
+
+                todas_ops_traza, total_traza = memo_reporte(f"traza_{prefijo}_{busqueda_op.strip()}", _cargar_ops_traza)
+                if busqueda_op.strip():
+                    st.caption(f"{total_traza} orden(es) encontradas" + (" — se muestran las 50 más parecidas" if total_traza > 50 else ""))
                 else:
-                    st.caption(f"{len(todas_ops_traza)} orden(es) encontradas")
+                    st.info(f"Mostrando las 50 órdenes {prefijo} más recientes de {total_traza or len(todas_ops_traza)}. Usa el buscador para ver cualquier OP histórica.")
+
+# Historial de encendido/apagado de la planta cargado UNA vez para todas las OPs de esta pestaña.
+                entradas_traza = [
+                    e for e in (
+                        fecha_entrada_area_actual(o) for o in todas_ops_traza
+                        if o.get("proxima_area") != "FINALIZADO" and not o.get("anulada")
+                    ) if e is not None
+                ]
+                tramos_planta_traza = cargar_tramos_inactivos(["planta_activa"], min(entradas_traza), hora_colombia()) if entradas_traza else {}
 
                 for o in todas_ops_traza:
                     fecha_creacion_raw = o.get("created_at") or o.get("fecha_creacion") or ""
@@ -4069,7 +4426,7 @@ elif menu == "📊 Reportes Admin":
 
 # TIEMPO EN EL AREA ACTUAL (si la orden todavia no ha finalizado ni fue anulada, se calcula en vivo)
                         if estado_actual != "FINALIZADO" and not esta_anulada:
-                            _, tiempo_actual_area = calcular_tiempo_en_area(o)
+                            _, tiempo_actual_area = calcular_tiempo_en_area(o, tramos_planta_traza)
                             st.info(f"⏳ Lleva **{tiempo_actual_area}** en el área actual (**{estado_actual}**)")
 
                         if not historial:
@@ -4110,38 +4467,45 @@ elif menu == "📊 Reportes Admin":
                                         st.table(df_paso)
                                 st.divider()
 
-# LLAMA LA FUNCION DE ARRIBA UNA VEZ POR CADA PESTAÑA, FILTRANDO POR SU PROPIO PREFIJO DE OP
-            with sub_ri:
-                _tab_trazabilidad_por_prefijo("RI-", "ri")
-            with sub_rb:
-                _tab_trazabilidad_por_prefijo("RB-", "rb")
-            with sub_fri:
-                _tab_trazabilidad_por_prefijo("FRI-", "fri")
-            with sub_frb:
-                _tab_trazabilidad_por_prefijo("FRB-", "frb")
-            with sub_rr:
-                _tab_trazabilidad_por_prefijo("RR-", "rr")
-            with sub_bi:
-                _tab_trazabilidad_por_prefijo("BI-", "bi")
-            with sub_bb:
-                _tab_trazabilidad_por_prefijo("BB-", "bb")
+# LLAMA LA FUNCION DE ARRIBA SOLO PARA EL PREFIJO ELEGIDO
+            _tab_trazabilidad_por_prefijo(*prefijos_traza[prefijo_traza_sel])
 
 #  TAB NUEVA: RENDIMIENTO DE MAQUINISTAS (por operario y por maquina, dia por dia) 
-        with tab_rendimiento:
+        elif reporte_sel == "👷 Rendimiento Maquinistas":
             st.subheader("👷 Rendimiento de Maquinistas")
             st.caption("Se arma con el historial real de cada OP (quién trabajó qué, en qué máquina, cuánto tiempo) y, para Corte, con el detalle de varillas de Seguimiento Cortadoras.")
             if not PLOTLY_DISPONIBLE:
                 st.info("ℹ️ Para ver los gráficos de anillo instala Plotly en el servidor: `pip install plotly`. Mientras tanto, se muestran tablas y barras nativas.")
 
-            df_hist_rend = _cargar_historial_para_rendimiento()
-
-            if df_hist_rend.empty:
+# RESPALDO MANUAL: vuelve a copiar a historial_pasos los pasos del JSON que falten (p. ej. guardados sin la funcion registrar_paso)
+            if historial_pasos_disponible():
+                if st.button("🧱 Completar historial de pasos desde las OPs", key="btn_respaldar_pasos"):
+                    try:
+                        with st.spinner("Copiando pasos..."):
+                            agregados = respaldar_historial_pasos()
+                        _pasos_rendimiento_tabla.clear()
+                        _reconciliar_historial_pasos.clear()
+                        st.success(f"✅ {agregados} paso(s) agregados a historial_pasos.")
+                    except Exception as e:
+                        st.error(f"No se pudo completar historial_pasos: {e}")
+                with st.expander("📊 Exportar pasos de producción a Excel"):
+                    boton_exportar_excel("rendimiento", "pasos_produccion", "historial_pasos_detalle", {
+                        "fecha": "FECHA", "op": "OP", "tipo_orden": "TIPO", "cliente": "CLIENTE", "nombre_trabajo": "TRABAJO",
+                        "area": "ÁREA", "maquina": "MÁQUINA", "operario": "OPERARIO", "auxiliar": "AUXILIAR",
+                        "tipo": "CIERRE", "duracion_segundos": "DURACIÓN",
+                    }, seleccion="fecha,op,tipo_orden,cliente,nombre_trabajo,area,maquina,operario,auxiliar,tipo,duracion_segundos")
+
+            with st.spinner("Cargando historial de producción..."):
+                hay_pasos = hay_pasos_rendimiento()
+
+            if not hay_pasos:
                 st.info("Todavía no hay historial de producción registrado.")
             else:
-                sub_op_rend, sub_maq_rend = st.tabs(["🙋 Por Operario", "⚙️ Por Máquina"])
+                vista_rend = st.radio("Vista", ["🙋 Por Operario", "⚙️ Por Máquina"], horizontal=True,
+                                      key="vista_rend_sel", label_visibility="collapsed")
 
 # ==================== POR OPERARIO ====================
-                with sub_op_rend:
+                if vista_rend == "🙋 Por Operario":
                     operarios_lista = _lista_nombres_maquinistas()
                     if not operarios_lista:
                         st.info("Todavía no hay perfiles de maquinista creados en el Panel de Administración de Usuarios.")
@@ -4151,11 +4515,7 @@ elif menu == "📊 Reportes Admin":
                         fecha_ini_op = colf2.date_input("Desde", value=hora_colombia().date() - timedelta(days=30), key="fecha_ini_op_rend")
                         fecha_fin_op = colf3.date_input("Hasta", value=hora_colombia().date(), key="fecha_fin_op_rend")
 
-                        df_op = df_hist_rend[
-                            (df_hist_rend['operario'] == operario_sel) &
-                            (df_hist_rend['fecha_dt'].dt.date >= fecha_ini_op) &
-                            (df_hist_rend['fecha_dt'].dt.date <= fecha_fin_op)
-                        ].sort_values('fecha_dt', ascending=False)
+                        df_op = pasos_rendimiento(operario=operario_sel, desde=fecha_ini_op, hasta=fecha_fin_op)
 
                         if df_op.empty:
                             st.warning(f"{operario_sel} no tiene trabajos registrados en ese rango de fechas.")
@@ -4198,18 +4558,14 @@ elif menu == "📊 Reportes Admin":
                             st.dataframe(df_op_mostrar, use_container_width=True, hide_index=True)
 
 # ==================== POR MAQUINA ====================
-                with sub_maq_rend:
+                else:
                     todas_las_maquinas = sorted({m for lista in MAQUINAS.values() for m in lista})
                     colm1, colm2, colm3 = st.columns([2, 1, 1])
                     maquina_sel = colm1.selectbox("⚙️ Selecciona la máquina:", todas_las_maquinas, key="maq_sel_rend")
                     fecha_ini_maq = colm2.date_input("Desde", value=hora_colombia().date() - timedelta(days=30), key="fecha_ini_maq_rend")
                     fecha_fin_maq = colm3.date_input("Hasta", value=hora_colombia().date(), key="fecha_fin_maq_rend")
 
-                    df_maq = df_hist_rend[
-                        (df_hist_rend['maquina'] == maquina_sel) &
-                        (df_hist_rend['fecha_dt'].dt.date >= fecha_ini_maq) &
-                        (df_hist_rend['fecha_dt'].dt.date <= fecha_fin_maq)
-                    ].sort_values('fecha_dt', ascending=False)
+                    df_maq = pasos_rendimiento(maquina=maquina_sel, desde=fecha_ini_maq, hasta=fecha_fin_maq)
 
                     if df_maq.empty:
                         st.warning(f"La máquina {maquina_sel} no tiene trabajos registrados en ese rango de fechas.")
@@ -4255,14 +4611,18 @@ elif menu == "📊 Reportes Admin":
                                 )
 
 #  TAB NUEVA: MOVIMIENTOS DEL SISTEMA (coins, usuarios, etc) 
-        with tab_movs:
+        elif reporte_sel == "🛠️ Movimientos del Sistema":
             st.subheader("🛠️ Movimientos y Actividad del Sistema")
 
-            sub_coins, sub_usuarios = st.tabs(["🪙 Movimientos de Coins", "👥 Usuarios del Sistema"])
+            vista_movs = st.radio("Vista", ["🪙 Movimientos de Coins", "👥 Usuarios del Sistema"], horizontal=True,
+                                  key="vista_movs_sel", label_visibility="collapsed")
 
-            with sub_coins:
+            if vista_movs == "🪙 Movimientos de Coins":
                 st.caption("Cada vez que se asignan o descuentan coins a un trabajador, queda registrado aquí.")
-                res_coins = supabase.table("monedas_historial").select("*").order("fecha", desc=True).execute().data or []
+                boton_exportar_excel("coins", "movimientos_coins", "monedas_historial")
+                res_coins = memo_reporte(
+                    "coins", lambda: supabase.table("monedas_historial").select("*").order("fecha", desc=True).execute().data or []
+                )
                 if res_coins:
                     df_coins = pd.DataFrame(res_coins)
                     if 'cantidad' in df_coins.columns:
@@ -4276,12 +4636,14 @@ elif menu == "📊 Reportes Admin":
                 else:
                     st.info("Sin movimientos de coins registrados todavía.")
 
-            with sub_usuarios:
+            else:
                 st.caption("Listado de todos los usuarios con acceso al sistema (no se muestran contraseñas).")
-                try:
-                    res_usuarios = supabase.table("usuarios").select("usuario, nombre, rol, maquina_asignada").execute().data or []
-                except Exception:
-                    res_usuarios = supabase.table("usuarios").select("usuario, nombre, rol").execute().data or []
+                def _cargar_usuarios_reporte():
+                    try:
+                        return supabase.table("usuarios").select("usuario, nombre, rol, maquina_asignada").execute().data or []
+                    except Exception:
+                        return supabase.table("usuarios").select("usuario, nombre, rol").execute().data or []
+                res_usuarios = memo_reporte("usuarios", _cargar_usuarios_reporte)
                 if res_usuarios:
                     df_usuarios = pd.DataFrame(res_usuarios)
                     st.dataframe(df_usuarios, use_container_width=True, hide_index=True)
@@ -4570,7 +4932,6 @@ elif menu == "⏱️ Seguimiento Cortadoras":
 #  CRONOGRAMA DE IMPRESIÓN ESTILO NOTION
 elif menu == "📆 Cronograma Impresión":
     import streamlit.components.v1 as components
-    import json
 
     st.markdown("<div class='title-area'>📆 CRONOGRAMA DE IMPRESIÓN</div>", unsafe_allow_html=True)
     st.caption("Arrastra las tarjetas al cronograma. Mueve o estira los bloques para ajustar. Todo se guarda solo.")
@@ -4911,137 +5272,148 @@ elif menu in ["🖨️ Impresión", "✂️ Corte", "📥 Colectoras", "📕 Enc
 
     st.markdown(f"<div class='title-area'>PANEL DE PRODUCCIÓN: {area_act}</div>", unsafe_allow_html=True)
     
-    activos_data = supabase.table("trabajos_activos").select("*").eq("area", area_act).execute().data
-    activos = {a['maquina']: a for a in activos_data}
-
 # SI ES MAQUINISTA, SOLO VE SU MAQUINA. SI NO, VE TODAS LAS DEL AREA (supervisor/admin)
     maquinas_a_mostrar = [mi_maquina_asignada] if rol_actual == "maquinista" else MAQUINAS[area_act]
 
-# Fila de columnas por cada bloque de 3 máquinas, para que el orden se vea bien también en celular/tablet.
-    for inicio_fila_prod in range(0, len(maquinas_a_mostrar), 3):
-        fila_maquinas_prod = maquinas_a_mostrar[inicio_fila_prod:inicio_fila_prod + 3]
-        cols = st.columns(3)
-        for idx, m in enumerate(fila_maquinas_prod):
-            with cols[idx]:
-                if m in activos:
-                    tr = activos[m]
+# CADA TARJETA DE MAQUINA ES UN FRAGMENTO: parar, reanudar o iniciar en COR-03 solo vuelve a dibujar COR-03.
+# No se redibuja sola por tiempo: tiene los formularios de cierre y parada, y un refresco a mitad de digitacion los
+# reiniciaria. Se vuelve a dibujar al tocarla, con recargar_fragmento() despues de cada escritura y, con avisos en vivo,
+# cuando otra pantalla cambia alguna de las maquinas de esta pagina (vigilar_en_vivo).
+    vigilar_en_vivo(f"produccion_{area_act}", maquinas_a_mostrar)
 
-                    st.markdown(f"<div class='card-produccion'>🟡 EN PROCESO<br>{m}<br>OP: {tr['op']}</div>", unsafe_allow_html=True)
+    @fragmento()
+    def tarjeta_maquina_produccion(m):
+        activos = {a['maquina']: a for a in trabajos_activos_area(area_act)}
+        ops_p = cola_ops_area(area_act)
+        if m in activos:
+            tr = activos[m]
+
+            st.markdown(f"<div class='card-produccion'>🟡 EN PROCESO<br>{m}<br>OP: {tr['op']}</div>", unsafe_allow_html=True)
 
      # LOGICA DE PARADAS TECNICAS 
-                    if not tr.get("pausado"):
+            if not tr.get("pausado"):
 
     # BOTON DE PARADA 
-                        with st.popover("🚨 REGISTRAR PARADA"):
-                            motivo_p = st.selectbox("Motivo de parada:", MOTIVOS_PARADA, key=f"mot_{m}")
-                            if st.button("Confirmar Parada", key=f"btn_p_{m}", type="primary"):
-                                supabase.table("trabajos_activos").update({
-                                    "pausado": True,
-                                    "inicio_pausa": hora_colombia().isoformat(),
-                                    "motivo_pausa": motivo_p 
-                                }).eq("maquina", m).execute()
-                                st.rerun()
-                    else:
+                with st.popover("🚨 REGISTRAR PARADA"):
+                    motivo_p = st.selectbox("Motivo de parada:", MOTIVOS_PARADA, key=f"mot_{m}")
+                    if st.button("Confirmar Parada", key=f"btn_p_{m}", type="primary"):
+                        supabase.table("trabajos_activos").update({
+                            "pausado": True,
+                            "inicio_pausa": hora_colombia().isoformat(),
+                            "motivo_pausa": motivo_p 
+                        }).eq("maquina", m).execute()
+                        trabajos_activos_area.clear()
+                        recargar_fragmento()
+            else:
 
     # MOSTRAR PORQUE ESTA DETENIDA LA AMQUINA 
-                        st.error(f"DETENIDA POR: {tr.get('motivo_pausa', 'Sin motivo')}")
-                        if st.button(f"▶️ REANUDAR TRABAJO", key=f"r_{m}", type="secondary"):
-                            try:
-                                inicio_p = datetime.fromisoformat(tr["inicio_pausa"].replace("Z", "+00:00"))
-                                ahora = hora_colombia()
-                                pausa_segundos = (ahora - inicio_p).total_seconds()
-            
+                st.error(f"DETENIDA POR: {tr.get('motivo_pausa', 'Sin motivo')}")
+                if st.button(f"▶️ REANUDAR TRABAJO", key=f"r_{m}", type="secondary"):
+                    try:
+                        inicio_p = datetime.fromisoformat(tr["inicio_pausa"].replace("Z", "+00:00"))
+                        ahora = hora_colombia()
+                        pausa_segundos = (ahora - inicio_p).total_seconds()
+
     # GUARDAR ENH LA TABLA DE TIEMPOS MUERTOS
-                                registro_parada = {
-                                    "maquina": m,
-                                    "motivo": tr.get('motivo_pausa'),
-                                    "inicio": tr["inicio_pausa"],
-                                    "fin": ahora.isoformat(),
-                                    "fecha": ahora.isoformat(),
-                                    "duracion_segundos": pausa_segundos
-                                }
-                                try:
-                                    supabase.table("paradas_maquina").insert(registro_parada).execute()
-                                except Exception as e_parada:
-                                    try:
-                                        registro_parada.pop("duracion_segundos", None)
-                                        supabase.table("paradas_maquina").insert(registro_parada).execute()
-                                    except Exception as e_parada2:
+                        registro_parada = {
+                            "maquina": m,
+                            "motivo": tr.get('motivo_pausa'),
+                            "inicio": tr["inicio_pausa"],
+                            "fin": ahora.isoformat(),
+                            "fecha": ahora.isoformat(),
+                            "duracion_segundos": pausa_segundos
+                        }
+                        try:
+                            supabase.table("paradas_maquina").insert(registro_parada).execute()
+                        except Exception as e_parada:
+                            try:
+                                registro_parada.pop("duracion_segundos", None)
+                                supabase.table("paradas_maquina").insert(registro_parada).execute()
+                            except Exception as e_parada2:
 # Si vuelve a fallar, se deja constancia en consola para poder diagnosticarlo.
-                                        print(f"Error al guardar en paradas_maquina: {e_parada} / {e_parada2}")
+                                print(f"Error al guardar en paradas_maquina: {e_parada} / {e_parada2}")
 
     # ACTUALIZAR EL REGISTRO DE ACTIVOS PARA IR TRABAJANO
-                                nuevo_tiempo_acumulado = tr.get("tiempo_pausa", 0) + pausa_segundos
-                                supabase.table("trabajos_activos").update({
-                                    "pausado": False,
-                                    "tiempo_pausa": nuevo_tiempo_acumulado,
-                                    "inicio_pausa": None,
-                                    "motivo_pausa": None
-                                }).eq("maquina", m).execute()
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Error: {e}")
+                        nuevo_tiempo_acumulado = tr.get("tiempo_pausa", 0) + pausa_segundos
+                        supabase.table("trabajos_activos").update({
+                            "pausado": False,
+                            "tiempo_pausa": nuevo_tiempo_acumulado,
+                            "inicio_pausa": None,
+                            "motivo_pausa": None
+                        }).eq("maquina", m).execute()
+                        trabajos_activos_area.clear()
+                        recargar_fragmento()
+                    except Exception as e:
+                        st.error(f"Error: {e}")
 
     #  BOTON FINALIZAR SIEMPRE VERLO
-                    if st.button(f"✅ FINALIZAR TRABAJO", key=f"f_{m}"):
-                        st.session_state.rep = tr
-                        st.rerun()
-                else:
-                    st.markdown(f"<div class='card-vacia'>⚪ DISPONIBLE<br>{m}</div>", unsafe_allow_html=True)
-                    ops_p = supabase.table("ordenes_planeadas").select("*").or_(f"proxima_area.eq.{area_act},estado_parcial.eq.ACTIVO EN {area_act}").execute().data
-                    if ops_p:
-                        op_dict = {f"{o['op']} - {o['nombre_trabajo']}": o['op'] for o in ops_p}
+            if st.button(f"✅ FINALIZAR TRABAJO", key=f"f_{m}"):
+                st.session_state.rep = tr
+                st.rerun()
+        else:
+            st.markdown(f"<div class='card-vacia'>⚪ DISPONIBLE<br>{m}</div>", unsafe_allow_html=True)
+            if ops_p:
+                op_dict = {f"{o['op']} - {o['nombre_trabajo']}": o['op'] for o in ops_p}
+
+                sel_op_label = st.selectbox("Seleccionar OP", list(op_dict.keys()), key=f"s_{m}")
+                sel_op = op_dict[sel_op_label]
+
+                if st.button(f"🚀 INICIAR {m}", key=f"str_{m}"):
+                    ahora_iso = hora_colombia().isoformat()
 
-                        sel_op_label = st.selectbox("Seleccionar OP", list(op_dict.keys()), key=f"s_{m}")
-                        sel_op = op_dict[sel_op_label]
-                    
-                        if st.button(f"🚀 INICIAR {m}", key=f"str_{m}"):
-                            ahora_iso = hora_colombia().isoformat()
-    
     # BUSCAR CUANDO TERMINO REALMENTE EL ULTIMO TRABAJO DE ESTA MAQUINA
-                            fin_ultimo = obtener_ultima_actividad_maquina(m)
-    
-                            if fin_ultimo:
-                                ocio_segundos = (hora_colombia() - fin_ultimo).total_seconds()
-        
-    # GUARDA TIEMPO QUE ESTUVO LIBRE O SIN TRABAJO 
-                                if ocio_segundos > 10: # Ignora solo dobles-clics/parpadeos, no huecos reales
-                                    registro_tiempo_libre = {
-                                        "maquina": m,
-                                        "motivo": "TIEMPO LIBRE (ENTRE OPs)",
-                                        "inicio": fin_ultimo.isoformat(),
-                                        "fin": ahora_iso,
-                                        "fecha": ahora_iso,
-                                        "duracion_segundos": ocio_segundos
-                                    }
-                                    try:
-                                        supabase.table("tiempos_muertos").insert(registro_tiempo_libre).execute()
-                                    except Exception as e_libre:
-
-                                        try:
-                                            registro_tiempo_libre.pop("duracion_segundos", None)
-                                            supabase.table("tiempos_muertos").insert(registro_tiempo_libre).execute()
-                                        except Exception as e_libre2:
-# Si vuelve a fallar, se deja constancia en consola para poder diagnosticarlo.
-                                            print(f"Error al guardar en tiempos_muertos: {e_libre} / {e_libre2}")
+                    fin_ultimo = obtener_ultima_actividad_maquina(m)
 
-    # INICIAR TRABAJO NORMAL
-                            registro_nuevo_trabajo = {
+                    if fin_ultimo:
+                        ocio_segundos = (hora_colombia() - fin_ultimo).total_seconds()
+
+    # GUARDA TIEMPO QUE ESTUVO LIBRE O SIN TRABAJO 
+                        if ocio_segundos > 10: # Ignora solo dobles-clics/parpadeos, no huecos reales
+                            registro_tiempo_libre = {
                                 "maquina": m,
-                                "area": area_act,
-                                "op": sel_op,
-                                "hora_inicio": ahora_iso,
-                                "pausado": False,
-                                "tiempo_pausa": 0,
-                                "inicio_pausa": None,
-                                "operario": st.session_state.get('nombre_usuario', 'Operario Planta')
+                                "motivo": "TIEMPO LIBRE (ENTRE OPs)",
+                                "inicio": fin_ultimo.isoformat(),
+                                "fin": ahora_iso,
+                                "fecha": ahora_iso,
+                                "duracion_segundos": ocio_segundos
                             }
                             try:
-                                supabase.table("trabajos_activos").insert(registro_nuevo_trabajo).execute()
-                            except Exception:
-                                registro_nuevo_trabajo.pop("operario", None)
-                                supabase.table("trabajos_activos").insert(registro_nuevo_trabajo).execute()
-                            st.rerun()
+                                supabase.table("tiempos_muertos").insert(registro_tiempo_libre).execute()
+                            except Exception as e_libre:
+
+                                try:
+                                    registro_tiempo_libre.pop("duracion_segundos", None)
+                                    supabase.table("tiempos_muertos").insert(registro_tiempo_libre).execute()
+                                except Exception as e_libre2:
+# Si vuelve a fallar, se deja constancia en consola para poder diagnosticarlo.
+                                    print(f"Error al guardar en tiempos_muertos: {e_libre} / {e_libre2}")
+
+    # INICIAR TRABAJO NORMAL
+                    registro_nuevo_trabajo = {
+                        "maquina": m,
+                        "area": area_act,
+                        "op": sel_op,
+                        "hora_inicio": ahora_iso,
+                        "pausado": False,
+                        "tiempo_pausa": 0,
+                        "inicio_pausa": None,
+                        "operario": st.session_state.get('nombre_usuario', 'Operario Planta')
+                    }
+                    try:
+                        supabase.table("trabajos_activos").insert(registro_nuevo_trabajo).execute()
+                    except Exception:
+                        registro_nuevo_trabajo.pop("operario", None)
+                        supabase.table("trabajos_activos").insert(registro_nuevo_trabajo).execute()
+                    trabajos_activos_area.clear()
+                    recargar_fragmento()
+
+# Fila de columnas por cada bloque de 3 máquinas, para que el orden se vea bien también en celular/tablet.
+    for inicio_fila_prod in range(0, len(maquinas_a_mostrar), 3):
+        fila_maquinas_prod = maquinas_a_mostrar[inicio_fila_prod:inicio_fila_prod + 3]
+        cols = st.columns(3)
+        for idx, m in enumerate(fila_maquinas_prod):
+            with cols[idx]:
+                tarjeta_maquina_produccion(m)
 
     if st.session_state.rep and st.session_state.rep["area"] == area_act:
         r = st.session_state.rep
@@ -5234,8 +5606,14 @@ elif menu in ["🖨️ Impresión", "✂️ Corte", "📥 Colectoras", "📕 Enc
 #  HORA ACTUAL CONSISTENTE
                     fin = hora_colombia()
 
-#  CALCULAR DURACION
-                    duracion = calcular_duracion_laboral(inicio, fin, r.get('maquina'), r.get('tiempo_pausa', 0))
+# DETENER OP  NO CUENTA TIEMPO DE LA OP PERO SI DE PARADA
+                    d_op = supabase.table("ordenes_planeadas").select("*").eq("op", r['op']).single().execute().data
+
+#  CALCULAR DURACION (una sola consulta de estados para la duracion y para el tiempo en area, desde lo que empiece primero)
+                    desde_cierre = min(inicio, fecha_entrada_area_actual(d_op or {}) or inicio)
+                    tramos_cierre = cargar_tramos_inactivos(claves_estado_maquina(r.get('maquina')), desde_cierre, fin)
+                    pausas_cierre = cargar_pausas_trabajos([r], fin).get(r.get('maquina'))
+                    duracion = calcular_duracion_laboral(inicio, fin, r.get('maquina'), r.get('tiempo_pausa', 0), tramos_cierre, pausas_cierre)
 
 #  LOGICA DE DESCUENTO DE INVENTARIO
                     if area_act == "CORTE" and 'id_tubo_inventario' in datos_c:
@@ -5258,8 +5636,6 @@ elif menu in ["🖨️ Impresión", "✂️ Corte", "📥 Colectoras", "📕 Enc
                                 supabase.table("inventario_cajas").update({"stock_actual": nuevo_stock_caja}).eq("id", id_cj).execute()
                                 datos_c['info_inventario_caja'] = f"Descontadas {cant_cj} de {datos_c.get('nombre_caja')}"
 
-# DETENER OP  NO CUENTA TIEMPO DE LA OP PERO SI DE PARADA
-                    d_op = supabase.table("ordenes_planeadas").select("*").eq("op", r['op']).single().execute().data
                     tipo = d_op['tipo_orden']
                     n_area = "FINALIZADO"
 
@@ -5295,7 +5671,7 @@ elif menu in ["🖨️ Impresión", "✂️ Corte", "📥 Colectoras", "📕 Enc
                             n_area = "FINALIZADO"
 
                     hist = d_op.get('historial_procesos') or []
-                    _, tiempo_area_prod = calcular_tiempo_en_area(d_op)
+                    _, tiempo_area_prod = calcular_tiempo_en_area(d_op, tramos_cierre)
                     hist.append({
                         "area": area_act,
                         "maquina": r['maquina'],
@@ -5309,15 +5685,15 @@ elif menu in ["🖨️ Impresión", "✂️ Corte", "📥 Colectoras", "📕 Enc
                         "observaciones": obs_prod
                     })
 
-                    supabase.table("ordenes_planeadas").update({
+                    registrar_paso_op(r['op'], hist, {
                         "proxima_area": n_area,
-                        "historial_procesos": hist,
                         "estado_parcial": None
-                    }).eq("op", r['op']).execute()
+                    })
 
 # El ingreso a bodega ya no es automático al finalizar Corte: ahora se registra 100% manual desde Salida Producción P1.
 
                     supabase.table("trabajos_activos").delete().eq("maquina", r['maquina']).execute()
+                    trabajos_activos_area.clear()
                     st.session_state.rep = None
                     st.rerun()
 
@@ -5348,12 +5724,15 @@ elif menu in ["🖨️ Impresión", "✂️ Corte", "📥 Colectoras", "📕 Enc
                 inicio = inicio.astimezone(tz)
                 
             fin = hora_colombia()
-            duracion = calcular_duracion_laboral(inicio, fin, r['maquina'], r.get('tiempo_pausa', 0))
 
 # Preparar el nuevo historial — leer desde ordenes_planeadas, no desde trabajos_activos
             d_op_hist = supabase.table("ordenes_planeadas").select("*").eq("op", r['op']).single().execute().data
+            desde_parcial = min(inicio, fecha_entrada_area_actual(d_op_hist or {}) or inicio)
+            tramos_parcial = cargar_tramos_inactivos(claves_estado_maquina(r['maquina']), desde_parcial, fin)
+            pausas_parcial = cargar_pausas_trabajos([r], fin).get(r['maquina'])
+            duracion = calcular_duracion_laboral(inicio, fin, r['maquina'], r.get('tiempo_pausa', 0), tramos_parcial, pausas_parcial)
             hist = d_op_hist.get('historial_procesos') or [] if d_op_hist else []
-            _, tiempo_area_parcial = calcular_tiempo_en_area(d_op_hist or {})
+            _, tiempo_area_parcial = calcular_tiempo_en_area(d_op_hist or {}, tramos_parcial)
             
             datos_c['cantidad_parcial_entregada'] = cantidad_parcial
             if obs_parcial:
@@ -5413,14 +5792,14 @@ elif menu in ["🖨️ Impresión", "✂️ Corte", "📥 Colectoras", "📕 Enc
             try:
 
 # OP avanza a siguiente area Y queda visible en area origen
-                supabase.table("ordenes_planeadas").update({
+                registrar_paso_op(r['op'], hist, {
                     "proxima_area": n_area_parcial,
-                    "estado_parcial": f"ACTIVO EN {area_act}",
-                    "historial_procesos": hist
-                }).eq("op", r['op']).execute()
+                    "estado_parcial": f"ACTIVO EN {area_act}"
+                })
 
 # Maquina queda LIBRE
                 supabase.table("trabajos_activos").delete().eq("maquina", r['maquina']).execute()
+                trabajos_activos_area.clear()
 
                 st.success(f"✅ Guardado. La máquina {r['maquina']} quedó libre. La OP sigue disponible en {area_act} (para que el siguiente turno la continúe) y también quedó activa en {n_area_parcial}.")
                 st.session_state.rep = None
@@ -5453,10 +5832,6 @@ elif menu == "👜 Bolsas":
         st.error(f"⛔ El rol '{rol_bolsas_actual}' no tiene permiso para el área de Bolsas")
         st.stop()
 
-    activos_bolsas_data = supabase.table("trabajos_activos").select("*")\
-        .in_("area", ["BOLSAS - FLEXO", "BOLSAS - ARMADORAS"]).execute().data
-    activos_bolsas = {a['maquina']: a for a in activos_bolsas_data}
-
 # Si es maquinista, solo su máquina; si no, las 2 sub-áreas completas, una debajo de la otra.
     if rol_bolsas_actual == "maquinista":
         area_de_mi_maquina = MAQUINA_A_AREA.get(mi_maquina_bolsas)
@@ -5467,6 +5842,112 @@ elif menu == "👜 Bolsas":
             ("BOLSAS - ARMADORAS", MAQUINAS["BOLSAS - ARMADORAS"]),
         ]
 
+# Cada tarjeta de Bolsas tambien es un fragmento independiente (ver tarjeta_maquina_produccion).
+    vigilar_en_vivo("bolsas", [m for _, maquinas_grupo in grupos_bolsas for m in maquinas_grupo])
+
+    @fragmento()
+    def tarjeta_maquina_bolsas(m, area_bolsa_grupo):
+        activos_bolsas = {a['maquina']: a for a in trabajos_activos_area(area_bolsa_grupo)}
+        ops_bolsas_pend = cola_ops_area(area_bolsa_grupo, incluir_parciales=False)
+        if m in activos_bolsas:
+            tr_b = activos_bolsas[m]
+
+            st.markdown(f"<div class='card-produccion'>🟡 EN PROCESO<br>{m}<br>OP: {tr_b['op']}</div>", unsafe_allow_html=True)
+
+            if not tr_b.get("pausado"):
+                with st.popover("🚨 REGISTRAR PARADA"):
+                    motivo_b = st.selectbox("Motivo de parada:", MOTIVOS_PARADA, key=f"mot_b_{m}")
+                    if st.button("Confirmar Parada", key=f"btn_pb_{m}", type="primary"):
+                        supabase.table("trabajos_activos").update({
+                            "pausado": True,
+                            "inicio_pausa": hora_colombia().isoformat(),
+                            "motivo_pausa": motivo_b
+                        }).eq("maquina", m).execute()
+                        trabajos_activos_area.clear()
+                        recargar_fragmento()
+            else:
+                st.error(f"DETENIDA POR: {tr_b.get('motivo_pausa', 'Sin motivo')}")
+                if st.button("▶️ REANUDAR TRABAJO", key=f"r_b_{m}", type="secondary"):
+                    try:
+                        inicio_pb = datetime.fromisoformat(tr_b["inicio_pausa"].replace("Z", "+00:00"))
+                        ahora_b = hora_colombia()
+                        pausa_segundos_b = (ahora_b - inicio_pb).total_seconds()
+
+                        registro_parada_b = {
+                            "maquina": m,
+                            "motivo": tr_b.get('motivo_pausa'),
+                            "inicio": tr_b["inicio_pausa"],
+                            "fin": ahora_b.isoformat(),
+                            "fecha": ahora_b.isoformat(),
+                            "duracion_segundos": pausa_segundos_b
+                        }
+                        try:
+                            supabase.table("paradas_maquina").insert(registro_parada_b).execute()
+                        except Exception:
+                            pass
+
+                        nuevo_tiempo_acum_b = tr_b.get("tiempo_pausa", 0) + pausa_segundos_b
+                        supabase.table("trabajos_activos").update({
+                            "pausado": False,
+                            "tiempo_pausa": nuevo_tiempo_acum_b,
+                            "inicio_pausa": None,
+                            "motivo_pausa": None
+                        }).eq("maquina", m).execute()
+                        trabajos_activos_area.clear()
+                        recargar_fragmento()
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+
+            if st.button("✅ FINALIZAR TRABAJO", key=f"f_b_{m}"):
+                st.session_state.rep_bolsas = tr_b
+                st.rerun()
+        else:
+            st.markdown(f"<div class='card-vacia'>⚪ DISPONIBLE<br>{m}</div>", unsafe_allow_html=True)
+
+            if ops_bolsas_pend:
+                op_dict_b = {f"{o['op']} - {o['nombre_trabajo']}": o['op'] for o in ops_bolsas_pend}
+                sel_op_label_b = st.selectbox("Seleccionar OP", list(op_dict_b.keys()), key=f"s_b_{m}")
+                sel_op_b = op_dict_b[sel_op_label_b]
+
+                if st.button(f"🚀 INICIAR {m}", key=f"str_b_{m}"):
+                    ahora_iso_b = hora_colombia().isoformat()
+
+# Busca cuándo terminó el último trabajo de la máquina, para que 'Máquina Libre' también funcione en Bolsas.
+                    fin_ultimo_b = obtener_ultima_actividad_maquina(m)
+                    if fin_ultimo_b:
+                        ocio_segundos_b = (hora_colombia() - fin_ultimo_b).total_seconds()
+                        if ocio_segundos_b > 10:
+                            registro_tiempo_libre_b = {
+                                "maquina": m,
+                                "motivo": "TIEMPO LIBRE (ENTRE OPs)",
+                                "inicio": fin_ultimo_b.isoformat(),
+                                "fin": ahora_iso_b,
+                                "fecha": ahora_iso_b,
+                                "duracion_segundos": ocio_segundos_b
+                            }
+                            try:
+                                supabase.table("tiempos_muertos").insert(registro_tiempo_libre_b).execute()
+                            except Exception as e_libre_b:
+                                print(f"Error al guardar en tiempos_muertos (bolsas): {e_libre_b}")
+
+                    registro_nuevo_trabajo_b = {
+                        "maquina": m,
+                        "area": area_bolsa_grupo,
+                        "op": sel_op_b,
+                        "hora_inicio": ahora_iso_b,
+                        "pausado": False,
+                        "tiempo_pausa": 0,
+                        "inicio_pausa": None,
+                        "operario": st.session_state.get('nombre_usuario', 'Operario Bolsas')
+                    }
+                    try:
+                        supabase.table("trabajos_activos").insert(registro_nuevo_trabajo_b).execute()
+                    except Exception:
+                        registro_nuevo_trabajo_b.pop("operario", None)
+                        supabase.table("trabajos_activos").insert(registro_nuevo_trabajo_b).execute()
+                    trabajos_activos_area.clear()
+                    recargar_fragmento()
+
     for area_bolsa_grupo, maquinas_bolsa_grupo in grupos_bolsas:
         etiqueta_grupo = "🖨️ Flexo (Impresión de Bolsas)" if area_bolsa_grupo == "BOLSAS - FLEXO" else "🛍️ Armadoras (Formado de Bolsas)"
         st.subheader(etiqueta_grupo)
@@ -5477,103 +5958,7 @@ elif menu == "👜 Bolsas":
             cols_b = st.columns(3)
             for idx_b, m in enumerate(fila_maquinas_b):
                 with cols_b[idx_b]:
-                    if m in activos_bolsas:
-                        tr_b = activos_bolsas[m]
-
-                        st.markdown(f"<div class='card-produccion'>🟡 EN PROCESO<br>{m}<br>OP: {tr_b['op']}</div>", unsafe_allow_html=True)
-
-                        if not tr_b.get("pausado"):
-                            with st.popover("🚨 REGISTRAR PARADA"):
-                                motivo_b = st.selectbox("Motivo de parada:", MOTIVOS_PARADA, key=f"mot_b_{m}")
-                                if st.button("Confirmar Parada", key=f"btn_pb_{m}", type="primary"):
-                                    supabase.table("trabajos_activos").update({
-                                        "pausado": True,
-                                        "inicio_pausa": hora_colombia().isoformat(),
-                                        "motivo_pausa": motivo_b
-                                    }).eq("maquina", m).execute()
-                                    st.rerun()
-                        else:
-                            st.error(f"DETENIDA POR: {tr_b.get('motivo_pausa', 'Sin motivo')}")
-                            if st.button("▶️ REANUDAR TRABAJO", key=f"r_b_{m}", type="secondary"):
-                                try:
-                                    inicio_pb = datetime.fromisoformat(tr_b["inicio_pausa"].replace("Z", "+00:00"))
-                                    ahora_b = hora_colombia()
-                                    pausa_segundos_b = (ahora_b - inicio_pb).total_seconds()
-
-                                    registro_parada_b = {
-                                        "maquina": m,
-                                        "motivo": tr_b.get('motivo_pausa'),
-                                        "inicio": tr_b["inicio_pausa"],
-                                        "fin": ahora_b.isoformat(),
-                                        "fecha": ahora_b.isoformat(),
-                                        "duracion_segundos": pausa_segundos_b
-                                    }
-                                    try:
-                                        supabase.table("paradas_maquina").insert(registro_parada_b).execute()
-                                    except Exception:
-                                        pass
-
-                                    nuevo_tiempo_acum_b = tr_b.get("tiempo_pausa", 0) + pausa_segundos_b
-                                    supabase.table("trabajos_activos").update({
-                                        "pausado": False,
-                                        "tiempo_pausa": nuevo_tiempo_acum_b,
-                                        "inicio_pausa": None,
-                                        "motivo_pausa": None
-                                    }).eq("maquina", m).execute()
-                                    st.rerun()
-                                except Exception as e:
-                                    st.error(f"Error: {e}")
-
-                        if st.button("✅ FINALIZAR TRABAJO", key=f"f_b_{m}"):
-                            st.session_state.rep_bolsas = tr_b
-                            st.rerun()
-                    else:
-                        st.markdown(f"<div class='card-vacia'>⚪ DISPONIBLE<br>{m}</div>", unsafe_allow_html=True)
-
-                        ops_bolsas_pend = supabase.table("ordenes_planeadas").select("*")\
-                            .eq("proxima_area", area_bolsa_grupo).execute().data
-                        if ops_bolsas_pend:
-                            op_dict_b = {f"{o['op']} - {o['nombre_trabajo']}": o['op'] for o in ops_bolsas_pend}
-                            sel_op_label_b = st.selectbox("Seleccionar OP", list(op_dict_b.keys()), key=f"s_b_{m}")
-                            sel_op_b = op_dict_b[sel_op_label_b]
-
-                            if st.button(f"🚀 INICIAR {m}", key=f"str_b_{m}"):
-                                ahora_iso_b = hora_colombia().isoformat()
-
-# Busca cuándo terminó el último trabajo de la máquina, para que 'Máquina Libre' también funcione en Bolsas.
-                                fin_ultimo_b = obtener_ultima_actividad_maquina(m)
-                                if fin_ultimo_b:
-                                    ocio_segundos_b = (hora_colombia() - fin_ultimo_b).total_seconds()
-                                    if ocio_segundos_b > 10:
-                                        registro_tiempo_libre_b = {
-                                            "maquina": m,
-                                            "motivo": "TIEMPO LIBRE (ENTRE OPs)",
-                                            "inicio": fin_ultimo_b.isoformat(),
-                                            "fin": ahora_iso_b,
-                                            "fecha": ahora_iso_b,
-                                            "duracion_segundos": ocio_segundos_b
-                                        }
-                                        try:
-                                            supabase.table("tiempos_muertos").insert(registro_tiempo_libre_b).execute()
-                                        except Exception as e_libre_b:
-                                            print(f"Error al guardar en tiempos_muertos (bolsas): {e_libre_b}")
-
-                                registro_nuevo_trabajo_b = {
-                                    "maquina": m,
-                                    "area": area_bolsa_grupo,
-                                    "op": sel_op_b,
-                                    "hora_inicio": ahora_iso_b,
-                                    "pausado": False,
-                                    "tiempo_pausa": 0,
-                                    "inicio_pausa": None,
-                                    "operario": st.session_state.get('nombre_usuario', 'Operario Bolsas')
-                                }
-                                try:
-                                    supabase.table("trabajos_activos").insert(registro_nuevo_trabajo_b).execute()
-                                except Exception:
-                                    registro_nuevo_trabajo_b.pop("operario", None)
-                                    supabase.table("trabajos_activos").insert(registro_nuevo_trabajo_b).execute()
-                                st.rerun()
+                    tarjeta_maquina_bolsas(m, area_bolsa_grupo)
 
         st.divider()
 
@@ -5594,14 +5979,20 @@ elif menu == "👜 Bolsas":
             obs_cierre_b = st.text_area("Observaciones").upper()
 
             if st.form_submit_button("✅ CONFIRMAR CIERRE"):
-                inicio_b = datetime.fromisoformat(tr_cierre_b["hora_inicio"].replace("Z", "+00:00"))
+                inicio_b = _parsear_fecha_colombia(tr_cierre_b["hora_inicio"])
                 fin_b = hora_colombia()
-                segundos_trabajados_b = (fin_b - inicio_b).total_seconds() - tr_cierre_b.get("tiempo_pausa", 0)
-                duracion_b = str(timedelta(seconds=max(0, int(segundos_trabajados_b))))
-
                 d_op_b = supabase.table("ordenes_planeadas").select("*").eq("op", tr_cierre_b['op']).single().execute().data
+
+# Misma regla que las demás áreas: se une lo detenido por planta/área/máquina con las paradas del trabajo.
+                desde_b = min(inicio_b, fecha_entrada_area_actual(d_op_b or {}) or inicio_b)
+                tramos_b = cargar_tramos_inactivos(claves_estado_maquina(tr_cierre_b['maquina']), desde_b, fin_b)
+                pausas_b = cargar_pausas_trabajos([tr_cierre_b], fin_b).get(tr_cierre_b['maquina'])
+                duracion_b = calcular_duracion_laboral(
+                    inicio_b, fin_b, tr_cierre_b['maquina'], tr_cierre_b.get("tiempo_pausa", 0), tramos_b, pausas_b
+                )
+
                 hist_b = (d_op_b.get('historial_procesos') or []) if d_op_b else []
-                _, tiempo_area_b = calcular_tiempo_en_area(d_op_b or {})
+                _, tiempo_area_b = calcular_tiempo_en_area(d_op_b or {}, tramos_b)
 
 # SI TERMINA EN FLEXO, SIGUE A ARMADORAS. SI TERMINA EN ARMADORAS, LA OP FINALIZA.
                 siguiente_area_b = "BOLSAS - ARMADORAS" if area_cierre_b == "BOLSAS - FLEXO" else "FINALIZADO"
@@ -5619,12 +6010,10 @@ elif menu == "👜 Bolsas":
                     "observaciones": obs_cierre_b
                 })
 
-                supabase.table("ordenes_planeadas").update({
-                    "proxima_area": siguiente_area_b,
-                    "historial_procesos": hist_b
-                }).eq("op", tr_cierre_b['op']).execute()
+                registrar_paso_op(tr_cierre_b['op'], hist_b, {"proxima_area": siguiente_area_b})
 
                 supabase.table("trabajos_activos").delete().eq("maquina", tr_cierre_b['maquina']).execute()
+                trabajos_activos_area.clear()
                 st.session_state.rep_bolsas = None
                 st.success(f"✅ Cierre registrado. La OP {tr_cierre_b['op']} continúa hacia: {siguiente_area_b}")
                 time.sleep(1.2)
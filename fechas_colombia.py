@@ -0,0 +1,48 @@
+"""
+FECHAS EN HORA COLOMBIA: la hora actual y el formato unico 'DD/MM/AAAA HH:MM' que usa todo el sistema. Viven aparte
+del script de Streamlit para que los modulos que corren fuera de una sesion (pdf_ordenes.py en los procesos de
+lote_pdf.py) usen exactamente el mismo formato.
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytz
+
+def hora_colombia():
+    tz = pytz.timezone("America/Bogota")
+    return datetime.now(tz)
+
+def fmt_fecha_hora(valor, con_hora=True):
+    """
+    Convierte CUALQUIER fecha/hora (string ISO con o sin zona horaria, en UTC,
+    en Colombia, con microsegundos, etc.) al formato unico que debe usarse en
+    TODO el programa: 'DD/MM/AAAA HH:MM' en hora Colombia, sin segundos.
+    Si con_hora=False, devuelve solo 'DD/MM/AAAA'.
+    Si el valor es vacio, None, o no se puede interpretar, lo devuelve tal cual
+    (o '-' si esta vacio) para no romper nada que ya estuviera funcionando.
+    """
+    if valor is None or valor == "":
+        return "-"
+    if not isinstance(valor, (list, dict)):
+        try:
+            if pd.isna(valor):
+                return "-"
+        except (TypeError, ValueError):
+            pass
+    if isinstance(valor, (datetime,)):
+        dt = valor
+    else:
+        try:
+            texto = str(valor).strip().replace("Z", "+00:00")
+            dt = datetime.fromisoformat(texto)
+        except Exception:
+            return valor
+    try:
+        tz_col = pytz.timezone("America/Bogota")
+        if dt.tzinfo is None:
+            dt = tz_col.localize(dt)
+        else:
+            dt = dt.astimezone(tz_col)
+        return dt.strftime("%d/%m/%Y %H:%M") if con_hora else dt.strftime("%d/%m/%Y")
+    except Exception:
+        return valor
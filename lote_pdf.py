@@ -0,0 +1,66 @@
+"""
+PAQUETES DE TRABAJO: los PDF de muchas OPs generados en paralelo, un proceso por nucleo, y entregados en un solo PDF
+o en un ZIP.
+
+Los procesos se crean con 'spawn' (interpretes nuevos que solo importan el modulo del generador, ver pdf_ordenes.py),
+nunca con 'fork': copiar el servidor de Streamlit con sus hilos (Tornado, el pool de lecturas, el hilo de LISTEN, el
+kiosko) puede dejar al hijo trabado en un lock heredado. El generador debe ser una funcion de modulo importable y las
+filas viajan a los procesos por pickle. Arrancar los procesos cuesta alrededor de un segundo, asi que los lotes chicos
+se generan en el mismo proceso; si el pool falla tambien. Si el lote no termina a tiempo se corta con TimeoutError.
+"""
+import io
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Unir varios PDF en uno solo; sin pypdf el paquete solo se puede bajar en ZIP.
+try:
+    from pypdf import PdfWriter
+    PYPDF_DISPONIBLE = True
+except ImportError:
+    PYPDF_DISPONIBLE = False
+
+SEGUNDOS_MAX_PAQUETE = 180
+MIN_FILAS_POR_PROCESO = 4
+
+def generar_pdfs(rows, generador, procesos=None, segundos_max=SEGUNDOS_MAX_PAQUETE):
+    """
+    Bytes del PDF de cada fila con generador(row), en el mismo orden que rows.
+    Si todo el lote tarda mas de 'segundos_max' lanza TimeoutError; los PDF
+    que faltaban se cancelan y no se espera a los procesos.
+    """
+    procesos = min(procesos or os.cpu_count() or 1, len(rows) // MIN_FILAS_POR_PROCESO)
+    if procesos < 2:
+        return [generador(row) for row in rows]
+    limite = time.monotonic() + segundos_max
+    try:
+        pool = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+        futuros = [pool.submit(generador, row) for row in rows]
+    except Exception as e:
+        print(f"Error en el pool de PDFs, se generan en serie: {e}")
+        return [generador(row) for row in rows]
+    try:
+        return [f.result(timeout=max(0.0, limite - time.monotonic())) for f in futuros]
+    except TimeoutError:
+        raise TimeoutError(f"los PDF no terminaron en {segundos_max} s; intente con menos órdenes") from None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def unir_pdfs(pdfs):
+    """Un solo PDF con las paginas de todos, en orden (requiere pypdf)."""
+    escritor = PdfWriter()
+    for pdf_bytes in pdfs:
+        escritor.append(io.BytesIO(pdf_bytes))
+    salida = io.BytesIO()
+    escritor.write(salida)
+    return salida.getvalue()
+
+def zip_pdfs(archivos):
+    """ZIP con {nombre_archivo: bytes_pdf}. Los PDF ya vienen comprimidos, asi que se guardan tal cual."""
+    salida = io.BytesIO()
+    with zipfile.ZipFile(salida, "w", zipfile.ZIP_STORED) as zf:
+        for nombre, pdf_bytes in archivos.items():
+            zf.writestr(nombre, pdf_bytes)
+    return salida.getvalue()
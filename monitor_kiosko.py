@@ -0,0 +1,272 @@
+"""
+MONITOR KIOSKO PARA LAS TVs DE PLANTA: servidor HTTP de solo lectura, sin sesion de Streamlit ni login.
+
+    /              pagina HTML estatica que se actualiza sola (consulta monitor.json cada pocos segundos)
+    /monitor.json  foto de la planta (areas, tarjetas de maquina y alertas) con ETag
+    /salud         200 si ya hay foto para publicar, 503 mientras no (para monitoreo)
+
+El sistema lo levanta en un hilo dentro del mismo proceso de Streamlit cuando el secret KIOSKO_PUERTO esta
+configurado, y le entrega la foto compartida del Monitor: las TVs no abren sesiones ni hacen consultas propias a la
+base de datos, y mientras la foto no cambia cada consulta se responde con un 304 sin cuerpo.
+
+Streamlit solo ejecuta el script cuando alguien abre la pagina, asi que despues de reiniciar el servidor el kiosko
+arranca con la primera visita (aunque sea la pantalla de login) y publica datos desde que un usuario entra al sistema;
+hasta entonces /monitor.json y /salud responden 503 y las TVs muestran "Esperando datos". Escucha en la IP de la red
+local del servidor (o en KIOSKO_HOST si esta configurado), no en todas las interfaces.
+
+Para probarlo en local con datos falsos (sin Supabase ni Streamlit):
+
+    python monitor_kiosko.py --puerto 8600
+"""
+import argparse
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEGUNDOS_ENTRE_CONSULTAS = 3
+
+PAGINA_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>MONITOR DE PRODUCCIÓN - C&amp;B PAPELES</title>
+<style>
+body { margin: 0; padding: 16px; background: #0E1117; font-family: Arial, sans-serif; }
+.title-area { background-color: #0D47A1; color: white; padding: 15px; border-radius: 10px; text-align: center; font-weight: bold; font-size: 22px; margin-bottom: 20px; }
+.grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(170px, 1fr)); column-gap: 16px; }
+.card-produccion { background-color: #00E676; border: 2px solid #00C853; padding: 20px; border-radius: 15px; text-align: center; color: #000000; font-weight: bold; font-size: 18px; margin-bottom: 10px; }
+.card-vacia { background-color: #F5F5F5; border: 1px solid #E0E0E0; padding: 20px; border-radius: 15px; text-align: center; color: #000000; font-size: 16px; margin-bottom: 10px; }
+.card-apagada { background-color: #424242; color: #9E9E9E; padding: 20px; border-radius: 15px; text-align: center; border: 2px solid #212121; font-size: 14px; margin-bottom: 10px; }
+.card-apagada b { font-size: 18px; }
+.tiempo { font-size: 14px; font-weight: normal; }
+#alertas div { background: #FFF3CD; color: #7A4F01; padding: 10px; border-radius: 8px; margin-bottom: 6px; font-size: 18px; }
+#pie { color: #9E9E9E; font-size: 13px; text-align: right; }
+</style>
+</head>
+<body>
+<div class="title-area">🖥️ MONITOR DE PRODUCCIÓN EN TIEMPO REAL</div>
+<div id="alertas"></div>
+<div id="tablero"></div>
+<div id="pie"></div>
+<script>
+const tarjetas = {};
+let generado = null;
+let areas = null;
+
+function texto(valor) {
+  const div = document.createElement("div");
+  div.textContent = valor == null ? "" : String(valor);
+  return div.innerHTML;
+}
+
+function contenido(m) {
+  if (m.estado === "apagada") return ["card-apagada", "<b>" + texto(m.maquina) + "</b><br>🚫 FUERA DE SERVICIO"];
+  if (m.estado === "produccion") return ["card-produccion", texto(m.maquina) + "<br>OP: " + texto(m.op) + "<br>👤 " + texto(m.cliente)
+    + "<br>" + texto(m.trabajo) + (m.tiempo ? "<br><span class='tiempo'>⏱️ " + texto(m.tiempo) + "</span>" : "")];
+  return ["card-vacia", texto(m.maquina) + "<br>LIBRE"];
+}
+
+// Arma las areas una sola vez (o si cambia la lista de maquinas); despues solo se tocan las tarjetas que cambiaron.
+function armar(datos) {
+  const tablero = document.getElementById("tablero");
+  tablero.innerHTML = "";
+  for (const k in tarjetas) delete tarjetas[k];
+  for (const area of datos.areas) {
+    const titulo = document.createElement("div");
+    titulo.className = "title-area";
+    titulo.textContent = area.area;
+    const grid = document.createElement("div");
+    grid.className = "grid";
+    for (const m of area.maquinas) {
+      const el = document.createElement("div");
+      grid.appendChild(el);
+      tarjetas[m.maquina] = {el: el, firma: null};
+    }
+    tablero.appendChild(titulo);
+    tablero.appendChild(grid);
+  }
+}
+
+function dibujar(datos) {
+  const firmaAreas = JSON.stringify(datos.areas.map(a => [a.area, a.maquinas.map(m => m.maquina)]));
+  if (firmaAreas !== areas) { armar(datos); areas = firmaAreas; }
+  for (const area of datos.areas) {
+    for (const m of area.maquinas) {
+      const tarjeta = tarjetas[m.maquina];
+      const firma = JSON.stringify(m);
+      if (tarjeta.firma === firma) continue;
+      const [clase, html] = contenido(m);
+      tarjeta.el.className = clase;
+      tarjeta.el.innerHTML = html;
+      tarjeta.firma = firma;
+    }
+  }
+  document.getElementById("alertas").innerHTML = datos.alertas.map(a => "<div>" + texto(a) + "</div>").join("");
+  document.getElementById("pie").textContent = "Datos de planta de las " + datos.generado_txt;
+}
+
+async function consultar() {
+  try {
+    // cache "no-cache": el navegador revalida con If-None-Match y el servidor responde 304 si nada cambio.
+    const respuesta = await fetch("monitor.json", {cache: "no-cache"});
+    if (respuesta.ok) {
+      const datos = await respuesta.json();
+      if (datos.generado !== generado) { dibujar(datos); generado = datos.generado; }
+    } else if (respuesta.status === 503) {
+      document.getElementById("pie").textContent = "Esperando datos: falta que un usuario entre al sistema...";
+    }
+  } catch (e) {
+    document.getElementById("pie").textContent = "Sin conexión con el servidor, reintentando...";
+  }
+  setTimeout(consultar, __SEGUNDOS__ * 1000);
+}
+consultar();
+</script>
+</body>
+</html>
+""".replace("__SEGUNDOS__", str(SEGUNDOS_ENTRE_CONSULTAS))
+
+def _etag(cuerpo):
+    return '"' + hashlib.sha1(cuerpo).hexdigest()[:20] + '"'
+
+def ip_lan():
+    """IP de este equipo en la red local (la de la interfaz con salida a la red); 127.0.0.1 si no hay red."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(("10.255.255.255", 1))  # UDP: no envia nada, solo elige la interfaz
+        return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        s.close()
+
+def crear_servidor(obtener_datos, puerto, host=None):
+    """
+    Servidor del kiosko. obtener_datos() devuelve la foto ya lista para JSON
+    (o None si todavia no hay); mientras devuelva el MISMO objeto se
+    reutilizan el cuerpo y el ETag ya calculados, asi que cada consulta de
+    una TV no cuesta mas que un lock. Sin host escucha en ip_lan().
+    """
+    pagina = PAGINA_HTML.encode("utf-8")
+    publicado = {"lock": threading.Lock(), "fuente": None, "cuerpo": b"{}", "etag": _etag(b"{}")}
+    recursos = {
+        "/": (pagina, _etag(pagina), "text/html; charset=utf-8"),
+        "/index.html": (pagina, _etag(pagina), "text/html; charset=utf-8"),
+    }
+
+    def _json_actual():
+        datos = obtener_datos()
+        if datos is None:
+            return None, None
+        with publicado["lock"]:
+            if datos is not publicado["fuente"]:
+                cuerpo = json.dumps(datos, ensure_ascii=False, default=str).encode("utf-8")
+                publicado.update(fuente=datos, cuerpo=cuerpo, etag=_etag(cuerpo))
+            return publicado["cuerpo"], publicado["etag"]
+
+    class _Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ruta = self.path.split("?", 1)[0]
+            try:
+                if ruta == "/salud":
+                    datos = obtener_datos()
+                    estado = {"estado": "ok", "generado": datos.get("generado")} if datos is not None else {"estado": "esperando datos"}
+                    self._responder_json(200 if datos is not None else 503, estado)
+                    return
+                if ruta == "/monitor.json":
+                    cuerpo, etag = _json_actual()
+                    if cuerpo is None:
+                        self._responder_json(503, {"estado": "esperando datos"})
+                        return
+                    tipo = "application/json; charset=utf-8"
+                elif ruta in recursos:
+                    cuerpo, etag, tipo = recursos[ruta]
+                else:
+                    self.send_error(404)
+                    return
+            except Exception as e:
+                print(f"Error en el kiosko del Monitor: {e}")
+                self.send_error(503)
+                return
+            if etag in (self.headers.get("If-None-Match") or ""):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def _responder_json(self, codigo, datos):
+            cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host or ip_lan(), puerto), _Manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+def iniciar_en_hilo(obtener_datos, puerto, host=None):
+    """Levanta el kiosko en un hilo de fondo y devuelve el servidor."""
+    servidor = crear_servidor(obtener_datos, puerto, host)
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="monitor_kiosko").start()
+    return servidor
+
+# DATOS FALSOS PARA PROBAR EN LOCAL: la planta cambia al azar cada 10 s, y entre cambios se devuelve el mismo objeto
+# (igual que la foto compartida del sistema), asi se puede ver el 304 en las herramientas del navegador.
+_AREAS_FALSAS = {
+    "IMPRESIÓN": ["HR-22", "ATF-22", "HR-17", "DID-11"],
+    "CORTE": [f"COR-{i:02d}" for i in range(1, 7)],
+    "REBOBINADORAS": ["REB-01", "REB-02", "REB-03"],
+}
+_falsos = {"lock": threading.Lock(), "calculado_en": 0.0, "datos": None}
+
+def _datos_falsos():
+    with _falsos["lock"]:
+        if _falsos["datos"] is not None and time.time() - _falsos["calculado_en"] < 10:
+            return _falsos["datos"]
+        ahora = datetime.now()
+        areas = []
+        for area, maquinas in _AREAS_FALSAS.items():
+            tarjetas = []
+            for m in maquinas:
+                estado = random.choices(["produccion", "libre", "apagada"], [5, 3, 1])[0]
+                tarjeta = {"maquina": m, "estado": estado}
+                if estado == "produccion":
+                    tarjeta.update(op=f"OP-{random.randint(1000, 9999)}", cliente="CLIENTE DE PRUEBA",
+                                   trabajo="TRABAJO DE PRUEBA", tiempo=f"{random.randint(0, 5):02d}:{random.randint(0, 59):02d}:00")
+                tarjetas.append(tarjeta)
+            areas.append({"area": area, "maquinas": tarjetas})
+        alertas = [f"🚨 OP {t['op']} en {t['maquina']} lleva más de 4h de trabajo activo"
+                   for a in areas for t in a["maquinas"] if t.get("tiempo", "00").startswith(("04", "05"))]
+        _falsos["datos"] = {
+            "generado": ahora.isoformat(), "generado_txt": ahora.strftime("%H:%M:%S"),
+            "areas": areas, "alertas": alertas,
+        }
+        _falsos["calculado_en"] = time.time()
+        return _falsos["datos"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor kiosko con datos falsos, para pruebas locales.")
+    parser.add_argument("--puerto", type=int, default=8600)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    print(f"Monitor kiosko de prueba en http://{args.host}:{args.puerto}/")
+    crear_servidor(_datos_falsos, args.puerto, args.host).serve_forever()
@@ -0,0 +1,690 @@
+"""
+PDF DE ORDENES DE PRODUCCION (certificado y orden por tipo: rollos, formas, rebobinado, bolsas).
+
+Viven en un modulo importable, sin Streamlit ni Supabase, para que lote_pdf.py pueda generarlos en procesos nuevos
+('spawn') que solo importan este archivo: asi los paquetes de muchas OPs usan todos los nucleos sin copiar con 'fork'
+el servidor de Streamlit y sus hilos. Cada proceso carga las imagenes fijas una sola vez.
+"""
+import threading
+
+from fpdf import FPDF
+
+from fechas_colombia import fmt_fecha_hora, hora_colombia
+from texto_pdf import cell_fit, fila_grid
+
+# Imagenes de los PDF (logo, diagrama de bolsa) decodificadas una vez por proceso; sin esta API de fpdf2 se leen del
+# disco en cada PDF, como antes.
+try:
+    from fpdf.image_parsing import preload_image
+    PRECARGA_IMAGENES_PDF = True
+except ImportError:
+    PRECARGA_IMAGENES_PDF = False
+
+MESES_ES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
+    7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+}
+
+def _fecha_creacion_legible(row):
+    """Devuelve la fecha de creacion de la OP en formato 'Mes DD del AAAA', en español (hora Colombia)."""
+    raw = row.get('created_at') or row.get('fecha_creacion') or ''
+    if not raw:
+        return "-"
+    fecha_dd_mm_aaaa = fmt_fecha_hora(raw, con_hora=False)  # 'DD/MM/AAAA' ya en hora Colombia
+    try:
+        dia, mes, anio = fecha_dd_mm_aaaa.split('/')
+        return f"{MESES_ES.get(int(mes), mes)} {dia} del {anio}"
+    except Exception:
+        return fecha_dd_mm_aaaa or "-"
+
+def dibujar_caja_fecha_creacion(pdf, row, x=145, y=4, w=63, h=16):
+    """Escribe la fecha de creacion de la OP en la esquina opuesta al logo,
+    solo como texto (sin caja ni fondo), a juego con el resto del encabezado.
+    No mueve el cursor del PDF, lo deja igual que antes de llamarla."""
+    x0, y0 = pdf.get_x(), pdf.get_y()
+
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_xy(x, y)
+    pdf.set_font("Arial", "B", 8)
+    pdf.cell(w, 5, "FECHA DE CREACIÓN", 0, 2, "R")
+    pdf.set_x(x)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(w, 7, _fecha_creacion_legible(row), 0, 2, "R")
+
+    pdf.set_xy(x0, y0)
+
+# PLANTILLA DE LOS PDF DE OP: leer, decodificar y recomprimir logo_cb.png era casi todo el costo de cada PDF. Las
+# imagenes fijas se preparan UNA vez por proceso y cada PDF nuevo arranca con ellas ya cargadas; el encabezado de color
+# (logo, fecha de creacion, titulo y OP) es uno solo para todos los generar_op_*, y cada OP solo pone sus datos.
+IMAGENES_PDF_OP = ("logo_cb.png", "bolsa_diagrama.png")
+
+_precargadas = {"lock": threading.Lock(), "cache": None}
+
+def _imagenes_pdf_precargadas():
+    with _precargadas["lock"]:
+        if _precargadas["cache"] is None:
+            base = FPDF()
+            if PRECARGA_IMAGENES_PDF:
+                for nombre in IMAGENES_PDF_OP:
+                    try:
+                        preload_image(base.image_cache, nombre)
+                    except Exception as e:
+                        print(f"No se pudo precargar la imagen {nombre} para los PDF: {e}")
+            _precargadas["cache"] = base.image_cache
+        return _precargadas["cache"]
+
+def nuevo_pdf_op():
+    """FPDF con su primera pagina y las imagenes fijas ya cargadas (no se vuelven a leer del disco)."""
+    pdf = FPDF()
+    precargadas = _imagenes_pdf_precargadas()
+    for nombre, info in precargadas.images.items():
+        pdf.image_cache.images[nombre] = copia = type(info)(info)
+        copia["usages"] = 0
+    pdf.image_cache.icc_profiles.update(precargadas.icc_profiles)
+    pdf.add_page()
+    return pdf
+
+def color_encabezado_op(row):
+    """Color del encabezado segun el tipo de orden: nueva verde, con cambios rojo, las demas azul."""
+    tipo_op = (row.get('tipo_origen') or '').upper()
+    if "NUEVA" in tipo_op:
+        return (40, 167, 69)      # VERDE
+    if "CAMBIOS" in tipo_op:
+        return (255, 0, 0)        # ROJO
+    return (13, 71, 161)          # AZUL
+
+def encabezado_op(pdf, row, titulo):
+    """Banda de color con logo, fecha de creacion, titulo del documento y numero de OP."""
+    pdf.set_fill_color(*color_encabezado_op(row))
+    pdf.rect(0, 0, 210, 35, 'F')
+    pdf.image("logo_cb.png", 2, 2, 60)
+    dibujar_caja_fecha_creacion(pdf, row)
+
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 18, titulo, 0, 1, "C")
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 5, f"OP: {row['op']}   |   {row['tipo_origen']}", 0, 1, "C")
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(4)
+
+# GENERA EL PDF DE ORDEN DE PRODUCCION — version base/generica (encabezado y estructura comun del documento)
+def generar_pdf_op(row):
+    pdf = nuevo_pdf_op()
+    
+# ENCABEZADO INDUSTRIAL PDF CERTIFICADO 
+    pdf.set_fill_color(13, 71, 161)
+    pdf.rect(0, 0, 210, 40, 'F')
+
+# LOGO CYB PAPELES
+    pdf.image("logo_cb.png", 2, 2, 60)
+    dibujar_caja_fecha_creacion(pdf, row)
+    
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", 'B', 18)
+    pdf.cell(0, 20, f" CERTIFICADO DE PRODUCCION - OP: {row['op']}", ln=True, align='C')
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 8, f"TRABAJO: {row['nombre_trabajo']}", ln=True, align='C')
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(0.5)
+    
+#  SECCION DATOS DE VENTA PDF
+    pdf.set_font("Arial", 'B', 11)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.cell(0, 8, " 1. INFORMACION GENERAL Y ORIGEN", ln=True, fill=True)
+    pdf.set_font("Arial", '', 10)
+    
+    c1 = 100
+    pdf.cell(c1, 7, f"Cliente: {row.get('cliente')}", border='B')
+    pdf.cell(0, 7, f"Vendedor: {row.get('vendedor')}", border='B', ln=True)
+    pdf.cell(c1, 7, f"Tipo de Orden: {row.get('tipo_orden')}", border='B')
+    pdf.cell(0, 7, f"Fecha Creacion: {fmt_fecha_hora(row.get('created_at'), con_hora=False)}", border='B', ln=True)
+    pdf.ln(5)
+
+#  SECCION ESPECIFICACIONES PDF
+    pdf.set_font("Arial", 'B', 11)
+    pdf.cell(0, 8, " 2. ESPECIFICACIONES TECNICAS", ln=True, fill=True)
+    pdf.set_font("Arial", '', 10)
+
+    if "FORMAS" in row.get('tipo_orden', ''):
+        pdf.cell(c1, 7, f"Cantidad: {row.get('cantidad_formas')}", border='B')
+        pdf.cell(0, 7, f"Partes: {row.get('num_partes')}", border='B', ln=True)
+        pdf.cell(c1, 7, f"Presentacion: {row.get('presentacion')}", border='B')
+        pdf.cell(0, 7, f"Destino: {row.get('destino_formas', 'N/A')}", border='B', ln=True)
+    else:
+        pdf.cell(c1, 7, f"Material: {row.get('material')}", border='B')
+        pdf.cell(0, 7, f"Gramaje: {row.get('gramaje_rollos')}g", border='B', ln=True)
+        pdf.cell(c1, 7, f"Cantidad: {row.get('cantidad_rollos')}", border='B')
+        pdf.cell(0, 7, f"Core: {row.get('core')}", border='B', ln=True)
+
+    pdf.ln(5)
+
+#  SECCION BITACORA TECNICA  
+    pdf.set_font("Arial", 'B', 11)
+    pdf.cell(0, 8, " 3. TRAZABILIDAD Y REGISTROS DE PLANTA", ln=True, fill=True)
+    
+    historial = row.get('historial_procesos', [])
+    if not historial:
+        pdf.set_font("Arial", 'I', 10)
+        pdf.cell(0, 10, "Pendiente de procesamiento.", ln=True)
+    else:
+        for h in historial:
+            pdf.ln(2)
+
+# FILA DE TITULO DE AREA
+            pdf.set_font("Arial", 'B', 10)
+            pdf.set_fill_color(240, 245, 255)
+            area_txt  = str(h.get('area','?')).encode('latin-1','replace').decode('latin-1')
+            maq_txt   = str(h.get('maquina','?')).encode('latin-1','replace').decode('latin-1')
+            op_txt    = str(h.get('operario') or h.get('usuario','N/A')).encode('latin-1','replace').decode('latin-1')
+            aux_txt   = str(h.get('auxiliar','N/A')).encode('latin-1','replace').decode('latin-1')
+            fecha_txt = str(h.get('fecha') or h.get('fin') or h.get('inicio',''))[:19].encode('latin-1','replace').decode('latin-1')
+            dur_txt   = str(h.get('duracion','0:00:00')).encode('latin-1','replace').decode('latin-1')
+
+            pdf.cell(0, 7, f" AREA: {area_txt} | MAQUINA: {maq_txt}", ln=True, fill=True, border=1)
+
+# FILA DE RESPONSABLES POR OP
+            pdf.set_font("Arial", 'B', 9)
+            pdf.cell(65, 6, f"Operador: {op_txt}", border='LR')
+            pdf.cell(65, 6, f"Auxiliar: {aux_txt}", border='R')
+            pdf.cell(0, 6, f"Fecha: {fecha_txt}", border='R', ln=True)
+
+# FILA DE TIEMPOS TOMADOS POR OP
+            pdf.cell(0, 6, f"Duracion del Proceso: {dur_txt}", border='LRB', ln=True)
+
+# DATOS TECNICOS SALIDA JHSON
+            pdf.set_font("Arial", '', 8)
+
+            datos_c = h.get('datos_cierre', {})
+
+            if datos_c:
+
+                pdf.set_font("Arial", 'B', 7)
+                pdf.set_fill_color(230,230,230)
+
+# ENCABEZADOS TABLA
+                pdf.cell(47,6,"OBJETO",1,0,'C',True)
+                pdf.cell(48,6,"DATO",1,0,'C',True)
+                pdf.cell(47,6,"OBJETO",1,0,'C',True)
+                pdf.cell(48,6,"DATO",1,1,'C',True)
+
+                pdf.set_font("Arial",'',8)
+
+                items = list(datos_c.items())
+
+                for i in range(0,len(items),2):
+
+                    k1,v1 = items[i]
+                    key1 = k1.replace("_"," ").upper()
+
+                    if i+1 < len(items):
+                        k2,v2 = items[i+1]
+                        key2 = k2.replace("_"," ").upper()
+                    else:
+                        key2=""
+                        v2=""
+
+                    pdf.cell(47,6,key1,1)
+                    pdf.cell(48,6,str(v1),1)
+                    pdf.cell(47,6,key2,1)
+                    pdf.cell(48,6,str(v2),1,1)
+            
+# BLOQUE OBSERVACIONES
+            if h.get('observaciones'):
+                pdf.set_font("Arial", 'I', 8)
+                pdf.multi_cell(0, 5, f"OBSERVACIONES: {h['observaciones']}", border=1)
+            else:
+                pdf.cell(0, 1, "", ln=True, border='T')
+            pdf.ln(2)
+
+    pdf.ln(10)
+    pdf.set_font("Arial", 'I', 7)
+    pdf.cell(0, 10, f"DOCUMENTO OFICIAL C&B PAPELES - GENERADO AUTOMATICAMENTE - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", align='C')
+    
+    return bytes(pdf.output())
+
+# GENERA EL PDF DE ORDEN DE PRODUCCION — version para ROLLOS (impresos o blancos)
+def generar_op_rollos(row):
+    pdf = nuevo_pdf_op()
+    encabezado_op(pdf, row, "ORDEN DE PRODUCCION - ROLLOS")
+
+# INFORMACION GENERAL
+    pdf.set_fill_color(230, 230, 230)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "1. INFORMACION DE LA ORDEN", 0, 1, fill=True)
+
+    fila_grid(pdf, [
+        {"ancho": 20, "texto": " Cliente: ", "negrita": True, "fill": True},
+        {"ancho": 95, "texto": row.get('cliente',''), "negrita": False, "fill": False},
+        {"ancho": 20, "texto": " Vendedor: ", "negrita": True, "fill": True},
+        {"ancho": 55, "texto": row.get('vendedor',''), "negrita": False, "fill": False},
+    ])
+    fila_grid(pdf, [
+        {"ancho": 20, "texto": " Trabajo: ", "negrita": True, "fill": True},
+        {"ancho": 100, "texto": row.get('nombre_trabajo',''), "negrita": False, "fill": False},
+        {"ancho": 25, "texto": " Tipo Orden: ", "negrita": True, "fill": True},
+        {"ancho": 45, "texto": row.get('tipo_orden',''), "negrita": False, "fill": False},
+    ])
+
+#  ESPECIFICACIONES TECNICAS
+    pdf.ln(4)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "2. ESPECIFICACIONES TECNICAS", 0, 1, fill=True)
+
+    pdf.set_font("Arial", "B", 10); pdf.cell(20, 7, " Material: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(43, 7, f"{row.get('material','')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(20, 7, " Gramaje: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(43, 7, f"{row.get('gramaje_rollos','')} GRS", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(20, 7, " Core: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(44, 7, f"{row.get('core','')}", 1, 1) 
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Cant. Rollos: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(33, 7, f"{row.get('cantidad_rollos','')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Unid. Bolsa: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(33, 7, f"{row.get('unidades_bolsa','')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Unid. Caja: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(34, 7, f"{row.get('unidades_caja','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Ref. Comercial: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(100, 7, f"{row.get('ref_comercial','')}", 1, 0)
+    trans = "SI" if row.get('transportadora_rollos') else "NO"
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Transportadora: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(25, 7, f"{trans}", 1, 1) 
+    pdf.set_font("Arial", "B", 10); pdf.cell(20, 8, "Impresión", 1, 0, 'C', fill=True)
+    pdf.set_font("Arial", "B", 10); pdf.cell(27, 8, " Frente: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(65, 8, f"{row.get('tintas_frente_rollos', 'N/A')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(23, 8, " Respaldo: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(55, 8, f"{row.get('tintas_respaldo_rollos', 'N/A')}", 1, 1) 
+    pdf.set_font("Arial", "B", 10); pdf.cell(25, 7, " Destino: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(165, 7, f"{row.get('destino_rollos','PLANTA')}", 1, 1)
+
+# OBSERFVACIONES Y PERFORACIONES 
+    pdf.ln(4); pdf.set_font("Arial", "B", 11); 
+    pdf.cell(0, 8, "3. ADICIONALES Y OBSERVACIONES", 0, 1, fill=True)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(0, 7, f"Perforaciones: {row.get('perforaciones_detalle', 'NO')}", 1, 1)
+    pdf.set_text_color(255, 0, 0)
+    pdf.multi_cell(0, 7, f"Observaciones: {row.get('observaciones_rollos','')}", 1)
+
+# FIRMAS O SELLOS
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(4); pdf.set_font("Arial", "B", 11); 
+    pdf.cell(0, 8, "4. FIRMAS", 0, 1, fill=True)
+    pdf.ln(1); pdf.set_font("Arial", "B", 6)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.cell(63, 6, "COORDINADORA COMERCIAL", 1, 0, "C", fill=True) 
+    pdf.cell(63, 6, "ASESOR", 1, 0, "C", fill=True) 
+    pdf.cell(64, 6, "SUPERVISOR DE PRODUCCION", 1, 1, "C", fill=True)
+    pdf.cell(63, 20, "", 1, 0); pdf.cell(63, 20, "", 1, 0); pdf.cell(64, 20, "", 1, 1)
+
+# DATOS DE ESTIBAS 
+    pdf.set_font("Arial", "", 11)
+    y_est = pdf.get_y() + 2
+    pdf.set_xy(10, y_est)
+    pdf.set_fill_color(210, 210, 210); pdf.set_font("Arial", 'B', 11)
+    pdf.cell(190, 5, "5 .REPORTE DE CAJAS POR ESTIBAS (PRODUCCIÓN)", 1, 1, 'C', True)
+    
+    w_e = 190 / 3
+    pdf.set_font("Arial", '', 8)
+    for i in range(4): 
+        pdf.cell(w_e, 7, f" ESTIBA {i*3+1} | Cant:_________H:___________", 1, 0)
+        pdf.cell(w_e, 7, f" ESTIBA {i*3+2} | Cant:_________H:___________", 1, 0)
+        pdf.cell(w_e, 7, f" ESTIBA {i*3+3} | Cant:_________H:___________", 1, 1)
+
+# OBSERVACIONES FINALIZADO
+    pdf.set_font("Arial", "B", 8)
+    pdf.cell(130, 8, "OBSERVACIONES FINALIZADO", 1, 0, "C"); pdf.cell(60, 8, "RECIBE", 1, 1, "C")
+    pdf.set_font("Arial", "", 7)
+    for _ in range(2):
+        pdf.cell(130, 6, "", 1, 0); pdf.cell(60, 6, "", 1, 1)
+
+# PIE
+    pdf.set_font("Arial", "I", 6)
+    pdf.cell(0, 5, f"SISTEMA C&B PAPELES - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", 0, 1, "C")
+
+    return bytes(pdf.output())
+
+
+# GENERAR PDF FORMAS       
+def generar_op_formas(row):
+    pdf = nuevo_pdf_op()
+    encabezado_op(pdf, row, "ORDEN DE PRODUCCION - FORMAS")
+
+#  INFORMACION DE LA ORDEN 
+    pdf.set_fill_color(230, 230, 230)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "1. INFORMACION DE LA ORDEN", 0, 1, fill=True)
+    fila_grid(pdf, [
+        {"ancho": 25, "texto": " Cliente: ", "negrita": True, "fill": True},
+        {"ancho": 70, "texto": row.get('cliente',''), "negrita": False, "fill": False},
+        {"ancho": 25, "texto": " Vendedor: ", "negrita": True, "fill": True},
+        {"ancho": 70, "texto": row.get('vendedor',''), "negrita": False, "fill": False},
+    ])
+    fila_grid(pdf, [
+        {"ancho": 25, "texto": " Trabajo: ", "negrita": True, "fill": True},
+        {"ancho": 70, "texto": row.get('nombre_trabajo',''), "negrita": False, "fill": False},
+        {"ancho": 25, "texto": " Tipo Orden: ", "negrita": True, "fill": True},
+        {"ancho": 70, "texto": row.get('tipo_orden',''), "negrita": False, "fill": False},
+    ])
+    fila_grid(pdf, [
+        {"ancho": 25, "texto": " OP Anterior: ", "negrita": True, "fill": True},
+        {"ancho": 70, "texto": row.get('op_anterior',''), "negrita": False, "fill": False},
+        {"ancho": 25, "texto": " Ticket ", "negrita": True, "fill": True},
+        {"ancho": 70, "texto": fmt_fecha_hora(row.get('num_ticket'), con_hora=False), "negrita": False, "fill": False},
+    ])
+
+# ESPECIFICACIONES GENERALES Y ACABADOS 
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "2. ESPECIFICACIONES GENERALES Y ACABADOS", 0, 1, fill=True)
+    pdf.set_font("Arial", "B", 10); pdf.cell(23, 7, " Cantidad: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(40, 7, f"{row.get('cantidad_formas','')}FORMAS", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(18, 7, " Partes: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(45, 7, f"{row.get('num_partes','')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(26, 7, " Presentación: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(38, 7, f"{row.get('presentacion','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Numeración Del: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('num_id','NO')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Numeración Al: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('num_fd','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(35, 7, " Código Barras: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(90, 7, f"{row.get('codigo_barras_detalle','')}", 1, 0)
+    trans = "SI" if row.get('transportadora_formas') else "NO"
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Transportadora: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(35, 7, f"{trans}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(25, 7, " Tipo Pegue: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(70, 7, f"{row.get('presentacion2', 'N/A')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(25, 7, " Destino: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(70, 7, f"{row.get('destino_formas','NO APLICA')}", 1, 1)
+
+# PERFORACIONES
+    pdf.ln(4)
+    pdf.set_font("Arial","B",11)
+    pdf.cell(0,8,"3. PERFORACIONES",0,1,fill=True)
+    pdf.set_font("Arial","",10)
+    pdf.multi_cell(0,7,row.get("perforaciones_detalle","SIN PERFORACIONES"), 1)
+
+# DETALLE TECNICO POR PARTE
+    pdf.ln(4)
+    pdf.set_font("Arial","B",11)
+    pdf.cell(0,8,"4. DETALLE TECNICO POR PARTE",0,1,fill=True)
+    pdf.set_font("Arial","B",8)
+    pdf.set_fill_color(200,200,200)
+    pdf.cell(4,7,"P",1,0,"C",True)
+    pdf.cell(15,7,"ANCHO",1,0,"C",True)
+    pdf.cell(15,7,"LARGO",1,0,"C",True)
+    pdf.cell(28,7,"PAPEL",1,0,"C",True)
+    pdf.cell(20,7,"COLOR",1,0,"C",True)
+    pdf.cell(12,7,"GR",1,0,"C",True)
+    pdf.cell(50,7,"T. FRENTE",1,0,"C",True)
+    pdf.cell(23,7,"T. RESP",1,0,"C",True)
+    pdf.cell(23,7,"OBS",1,1,"C",True)
+
+    pdf.set_font("Arial","",7.5)
+    partes = row.get("detalles_partes_json",[])
+    for p in partes:
+        cell_fit(pdf,4,7,p.get("p",""))
+        cell_fit(pdf,15,7,p.get("anc",""))
+        cell_fit(pdf,15,7,p.get("lar",""))
+        cell_fit(pdf,28,7,p.get("papel",""))
+        cell_fit(pdf,20,7,p.get("color_fondo",""))
+        cell_fit(pdf,12,7,p.get("gramos",""))
+        cell_fit(pdf,50,7,p.get("tf",""))
+        cell_fit(pdf,23,7,p.get("tr",""))
+        cell_fit(pdf,23,7,p.get("obs_parte","")) 
+        pdf.ln()
+
+# OBSERVACIONES GENERALES
+    pdf.ln(5)
+    pdf.set_font("Arial","B",11)
+    pdf.set_text_color(255, 0, 0)
+    pdf.cell(0,8,"5. OBSERVACIONES GENERALES",0,1,fill=True)
+    pdf.set_font("Arial","",10)
+    pdf.multi_cell(0,7,row.get("observaciones_formas",""), 1)
+
+# FIRMAS
+    pdf.ln(1)
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(4); pdf.set_font("Arial", "B", 11); 
+    pdf.cell(0, 8, "4. FIRMAS", 0, 1, fill=True)
+    pdf.ln(1); pdf.set_font("Arial", "B", 6)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.cell(63, 6, "COORDINADORA COMERCIAL", 1, 0, "C", fill=True) 
+    pdf.cell(63, 6, "ASESOR", 1, 0, "C", fill=True) 
+    pdf.cell(64, 6, "SUPERVISOR DE PRODUCCION", 1, 1, "C", fill=True)
+    pdf.cell(63, 20, "", 1, 0); pdf.cell(63, 20, "", 1, 0); pdf.cell(64, 20, "", 1, 1)
+
+    pdf.set_font("Arial","B",8)
+    pdf.cell(130,8,"OBSERVACIONES",1,0,"C")
+    pdf.cell(60,8,"RECIBE",1,1,"C")
+
+    pdf.set_font("Arial", "B", 8)
+    pdf.cell(130, 8, "OBSERVACIONES FINALIZADO", 1, 0, "C"); pdf.cell(60, 8, "RECIBE", 1, 1, "C")
+    pdf.set_font("Arial", "", 7)
+    for _ in range(2):
+        pdf.cell(130, 6, "", 1, 0); pdf.cell(60, 6, "", 1, 1)
+
+# PIE
+    pdf.set_font("Arial", "I", 6)
+    pdf.cell(0, 5, f"SISTEMA C&B PAPELES - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", 0, 1, "C")
+
+    return bytes(pdf.output())
+
+# GENERA EL PDF DE ORDEN DE PRODUCCION — version para REBOBINADO
+def generar_op_rebobinado(row):
+    pdf = nuevo_pdf_op()
+    encabezado_op(pdf, row, "ORDEN DE PRODUCCION - REBOBINADO")
+
+# INFORMACION GENERAL
+    pdf.set_fill_color(230,230,230)
+    pdf.set_font("Arial","B",11)
+    pdf.cell(0,8,"1. INFORMACION GENERAL",0,1,fill=True)
+    pdf.set_font("Arial","",10)
+
+    fila_grid(pdf, [
+        {"ancho": 95, "texto": f"Cliente: {row.get('cliente','')}", "negrita": False, "fill": False},
+        {"ancho": 95, "texto": f"Vendedor: {row.get('vendedor','')}", "negrita": False, "fill": False},
+    ])
+    fila_grid(pdf, [
+        {"ancho": 95, "texto": f"Trabajo: {row.get('nombre_trabajo','')}", "negrita": False, "fill": False},
+        {"ancho": 95, "texto": f"OP Anterior: {row.get('op_anterior','N/A')}", "negrita": False, "fill": False},
+    ])
+    fila_grid(pdf, [
+        {"ancho": 190, "texto": f"Fecha de Creacion: {fmt_fecha_hora(row.get('created_at'), con_hora=False)}", "negrita": False, "fill": False},
+    ])
+
+# DATOS TECNICOS DE ENTRADA Y OBJETIVO
+    pdf.ln(4)
+    pdf.set_font("Arial","B",11)
+    pdf.cell(0,8,"2. DATOS TECNICOS Y OBJETIVO DEL PROCESO",0,1,fill=True)
+    pdf.set_font("Arial","",10)
+
+#  MATERIAL Y DIMENCIONES
+    pdf.cell(63,7,f"Material Base: {row.get('material','')}",1)
+    pdf.cell(63,7,f"Gramaje: {row.get('gramaje_rollos','')}g",1)
+    pdf.cell(64,7,f"Referencia Comercial: {row.get('ref_comercial','')}",1,1)
+
+# CANTIDADES
+    pdf.cell(95,7,f"Cantidad Rollos Solicitados: {row.get('cantidad_rollos','')}",1)
+    pdf.cell(95,7,f"Tipo de Creacion: {row.get('tipo_creacion','NUEVA')}",1,1)
+
+# OBJETIVO DE REBOBINADO (IMPRESION O PARA QUE )
+    pdf.set_font("Arial","B",10)
+    pdf.cell(190,7,"OBJETIVO PRINCIPAL DEL REBOBINADO:", "LTR", 1)
+    pdf.set_font("Arial","",10)
+    pdf.multi_cell(190,7, row.get('objetivo_rebobinado','No especificado'), "LRB")
+
+# OBSERVACIONES DE PLANIFICACION
+    pdf.ln(5)
+    pdf.set_font("Arial","B",11)
+    pdf.cell(0,8,"3. OBSERVACIONES ADICIONALES",0,1,fill=True)
+    pdf.set_font("Arial","",10)
+    pdf.multi_cell(0,7, row.get("observaciones_rollos","Sin observaciones adicionales"), 1)
+
+# ESPACIO PARA ANOTACIONES DE PLANTA 
+    pdf.ln(5)
+    pdf.set_font("Arial","I",8)
+    pdf.cell(0,5,"* Espacio reservado para el operario: verificar empalmes y diámetros finales.",0,1)
+
+# PIE DE PAGINA
+    pdf.ln(10)
+    pdf.set_font("Arial","I",7)
+    pdf.cell(0,10,f"SISTEMA C&B PAPELES - GENERADO: {hora_colombia().strftime('%d/%m/%Y %H:%M')}",0,1,"C")
+
+    return bytes(pdf.output())
+
+# Genera el PDF de Bolsas: especificaciones, producción, empaque y firmas.
+def generar_op_bolsas(row):
+    pdf = nuevo_pdf_op()
+    encabezado_op(pdf, row, "ORDEN DE PRODUCCION - BOLSAS")
+
+# INFORMACION GENERAL
+    pdf.set_fill_color(250, 224, 196)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "1. INFORMACION DE LA ORDEN", 0, 1, fill=True)
+
+    pdf.set_fill_color(250, 224, 196)
+    fila_grid(pdf, [
+        {"ancho": 20, "texto": " Cliente: ", "negrita": True, "fill": True},
+        {"ancho": 95, "texto": row.get('cliente',''), "negrita": False, "fill": False},
+        {"ancho": 20, "texto": " Vendedor: ", "negrita": True, "fill": True},
+        {"ancho": 55, "texto": row.get('vendedor',''), "negrita": False, "fill": False},
+    ])
+    fila_grid(pdf, [
+        {"ancho": 20, "texto": " Trabajo: ", "negrita": True, "fill": True},
+        {"ancho": 100, "texto": row.get('nombre_trabajo',''), "negrita": False, "fill": False},
+        {"ancho": 25, "texto": " Op Anterior: ", "negrita": True, "fill": True},
+        {"ancho": 45, "texto": row.get('op_anterior',''), "negrita": False, "fill": False},
+    ])
+    fila_grid(pdf, [
+        {"ancho": 40, "texto": " Cantidad De Bolsas: ", "negrita": True, "fill": True},
+        {"ancho": 80, "texto": row.get('bolsa_cantidad',''), "negrita": False, "fill": False},
+        {"ancho": 25, "texto": " Ticket: ", "negrita": True, "fill": True},
+        {"ancho": 45, "texto": row.get('num_ticket',''), "negrita": False, "fill": False},
+    ])
+
+# ESPECIFICACIONES DE LA BOLSA
+    pdf.set_fill_color(250, 224, 196)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "ESPECIFICACIONES DE LA BOLSA", 0, 1, "C", fill=True)
+
+# Guarda dónde empieza la tabla, para ubicar el diagrama de la bolsa a la derecha, a la misma altura.
+    y_inicio_specs = pdf.get_y()
+
+    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (C) Largo Total De La Bolsa: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_c_largo_total','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (c) Largo Util De La Bolsa: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_c_largo_util','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (W) Ancho De La Bolsa: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_w_ancho','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (H) Fuelle De La Bolsa: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_w_ancho','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " (h) Pestaña De Fondo: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_h_pestana','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Tipo De Manija: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(30, 7, f"{row.get('bolsa_tipo_manija','')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Base De Bolsa: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(30, 7, f"{row.get('bolsa_base','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " Material Para Bolsa: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_material','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(60, 7, " Gramaje Del Material: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(60, 7, f"{row.get('bolsa_gramaje','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(40, 7, " Certificacion FSC: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(20, 7, f"{row.get('bolsa_certificacion_fsc','')}", 1, 0)
+    pdf.set_font("Arial", "B", 10); pdf.cell(40, 7, "Cantidad De Tintas: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(20, 7, f"{row.get('bolsa_tintas_num','')}", 1, 1)
+    pdf.set_font("Arial", "B", 10); pdf.cell(30, 7, " Colores: ", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 10);  pdf.cell(90, 7, f"{row.get('bolsa_tintas_color','')}", 1, 1)
+
+    y_fin_specs = pdf.get_y()
+
+# Dibuja el diagrama de la bolsa (W, C, c, H, h) en el espacio libre a la derecha de la tabla.
+    alto_disponible_diagrama = y_fin_specs - y_inicio_specs - 2
+    try:
+        pdf.image("bolsa_diagrama.png", x=133, y=y_inicio_specs + 1, h=alto_disponible_diagrama)
+    except Exception:
+        pass  # si la imagen no esta disponible en el servidor, el PDF se genera igual sin el diagrama
+
+    pdf.set_y(y_fin_specs)
+
+
+# OBSERVACIONES
+    pdf.ln(3)
+    pdf.set_fill_color(250, 224, 196)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "OBSERVACIONES", 0, 1, "C", fill=True)
+    pdf.set_font("Arial", "", 9)
+    pdf.multi_cell(190, 7, row.get('observaciones_bolsa', '') or "Sin observaciones", 1)
+
+# ESPECIFICACIONES PRODUCCION
+    pdf.ln(3)
+    pdf.set_fill_color(250, 224, 196)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "ESPECIFICACIONES PRODUCCIÓN", 0, 1, "C", fill=True)
+
+    w_prod = 190 / 3
+    pdf.set_font("Arial", "B", 8)
+    pdf.cell(w_prod, 7, " Ancho de la bobina", 1, 0, fill=True)
+    pdf.cell(w_prod, 7, " Rodillo de Impresión", 1, 0, fill=True)
+    pdf.cell(w_prod, 7, " Metros Rebobinado", 1, 1, fill=True)
+    pdf.set_font("Arial", "", 9)
+    pdf.cell(w_prod, 8, f"{row.get('bolsa_ancho_bobina') or ''}", 1, 0, "C")
+    pdf.cell(w_prod, 8, f"{row.get('bolsa_rodillo_impresion') or ''}", 1, 0, "C")
+    pdf.cell(w_prod, 8, f"{row.get('bolsa_metros_rebobinado') or ''}", 1, 1, "C")
+
+    pdf.ln(2)
+    pdf.set_font("Arial", "B", 9)
+    pdf.cell(60, 8, " Bolsas Producidas:", 1, 0, fill=True)
+    pdf.set_font("Arial", "", 9)
+    pdf.cell(50, 8, f"{row.get('bolsa_producidas') or ''}", 1, 1, "C")
+
+# CONFIGURACION DE EMPAQUE
+    pdf.ln(3)
+    pdf.set_fill_color(250, 224, 196)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, "CONFIGURACIÓN DE EMPAQUE", 0, 1, "C", fill=True)
+
+    w_emp = 190 / 3
+    pdf.set_font("Arial", "B", 8)
+    pdf.cell(w_emp, 7, "BOLSAS POR CAJA", 1, 0, "C", fill=True)
+    pdf.cell(w_emp, 7, "CAJAS EN TOTAL", 1, 0, "C", fill=True)
+    pdf.cell(w_emp, 7, "CAJAS POR ESTIBA", 1, 1, "C", fill=True)
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(w_emp, 10, f"{row.get('bolsa_por_caja') or ''}", 1, 0, "C")
+    pdf.cell(w_emp, 10, f"{row.get('bolsa_cajas_total') or ''}", 1, 0, "C")
+    pdf.cell(w_emp, 10, f"{row.get('bolsa_cajas_por_estiba') or ''}", 1, 1, "C")
+
+# FIRMAS
+    pdf.ln(6)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.set_font("Arial", "B", 6)
+    w_firma = 190 / 3
+    pdf.cell(w_firma, 6, "FIRMA COORDINADORA COMERCIAL", 1, 0, "C", fill=True)
+    pdf.cell(w_firma, 6, "FIRMA ASESOR", 1, 0, "C", fill=True)
+    pdf.cell(w_firma, 6, "FIRMA JEFE DE DISEÑO", 1, 1, "C", fill=True)
+    pdf.cell(w_firma, 18, "", 1, 0)
+    pdf.cell(w_firma, 18, "", 1, 0)
+    pdf.cell(w_firma, 18, "", 1, 1)
+
+    pdf.set_font("Arial", "B", 6)
+    pdf.cell(w_firma, 6, "FIRMA COTIZADORA", 1, 0, "C", fill=True)
+    pdf.cell(w_firma, 6, "FIRMA JEFE DE ÁREA DE PRODUCCIÓN", 1, 0, "C", fill=True)
+    pdf.cell(w_firma, 6, "FIRMA DE OPERARIO DE MÁQUINA", 1, 1, "C", fill=True)
+    pdf.cell(w_firma, 18, "", 1, 0)
+    pdf.cell(w_firma, 18, "", 1, 0)
+    pdf.cell(w_firma, 18, "", 1, 1)
+
+# PIE
+    pdf.set_font("Arial", "I", 6)
+    pdf.cell(0, 8, f"SISTEMA C&B PAPELES - {hora_colombia().strftime('%d/%m/%Y %H:%M')}", 0, 1, "C")
+
+    return bytes(pdf.output())
+
+def generar_pdf_orden_por_tipo(row):
+    """Elige el formato de PDF segun el tipo de orden (bolsas, formas, rollos o rebobinado)."""
+    tipo = row.get('tipo_orden', '') or ''
+    if "BOLSA" in tipo:
+        return generar_op_bolsas(row)
+    elif "FORMAS" in tipo:
+        return generar_op_formas(row)
+    elif "ROLLOS" in tipo:
+        return generar_op_rollos(row)
+    return generar_op_rebobinado(row)
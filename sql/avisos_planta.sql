@@ -0,0 +1,31 @@
+-- AVISOS EN VIVO PARA EL MONITOR Y LOS PANELES (LISTEN/NOTIFY)
+-- Ejecutar una vez en el editor SQL de Supabase. Cada cambio en trabajos_activos o estado_maquinas
+-- envia un aviso por el canal 'cambios_planta' con la tabla y la maquina afectada. La app lo escucha
+-- con una conexion directa a Postgres (secret SUPABASE_DB_URL, puerto 5432, no el pooler en modo
+-- transaccion); sin ese secret sigue con el auto-refresco por tiempo, como antes.
+-- Para probar en local: en psql, NOTIFY cambios_planta, '{"tabla":"trabajos_activos","maquina":"COR-03"}';
+
+create or replace function avisar_cambio_planta() returns trigger
+language plpgsql
+as $$
+declare
+    v_fila jsonb := to_jsonb(coalesce(new, old));
+begin
+    perform pg_notify('cambios_planta', json_build_object(
+        'tabla', tg_table_name,
+        'maquina', v_fila->>'maquina',
+        'area', v_fila->>'area'
+    )::text);
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_aviso_trabajos_activos on trabajos_activos;
+create trigger trg_aviso_trabajos_activos
+    after insert or update or delete on trabajos_activos
+    for each row execute function avisar_cambio_planta();
+
+drop trigger if exists trg_aviso_estado_maquinas on estado_maquinas;
+create trigger trg_aviso_estado_maquinas
+    after insert or update or delete on estado_maquinas
+    for each row execute function avisar_cambio_planta();
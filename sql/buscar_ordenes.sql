@@ -0,0 +1,68 @@
+-- BUSQUEDA DE ORDENES (Seguimiento, Trazabilidad y Planificación)
+-- Ejecutar una vez en el editor SQL de Supabase. La app llama a la funcion buscar_ordenes por RPC;
+-- mientras no exista, la app sigue buscando con ilike (mas lento, pero funciona igual).
+
+create extension if not exists pg_trgm;
+
+-- Texto de busqueda calculado por la base de datos cada vez que se inserta o edita una OP.
+-- (Postgres no deja que una columna generada use otra, por eso la expresion se repite abajo.)
+alter table ordenes_planeadas
+    add column if not exists busqueda_texto text generated always as (
+        lower(
+            coalesce(op::text, '') || ' ' || coalesce(cliente::text, '') || ' ' ||
+            coalesce(nombre_trabajo::text, '') || ' ' || coalesce(vendedor::text, '') || ' ' ||
+            coalesce(tipo_origen::text, '') || ' ' || coalesce(proxima_area::text, '')
+        )
+    ) stored;
+
+alter table ordenes_planeadas
+    add column if not exists busqueda_tsv tsvector generated always as (
+        to_tsvector('spanish'::regconfig,
+            coalesce(op::text, '') || ' ' || coalesce(cliente::text, '') || ' ' ||
+            coalesce(nombre_trabajo::text, '') || ' ' || coalesce(vendedor::text, '') || ' ' ||
+            coalesce(tipo_origen::text, '') || ' ' || coalesce(proxima_area::text, '')
+        )
+    ) stored;
+
+-- Trigramas: sirven para 'contiene' (ilike '%texto%') y para parecidos con errores de digitacion.
+create index if not exists idx_ordenes_busqueda_trgm on ordenes_planeadas using gin (busqueda_texto gin_trgm_ops);
+-- Texto completo: palabras completas en cualquier orden ('bolsa kraft exito').
+create index if not exists idx_ordenes_busqueda_tsv on ordenes_planeadas using gin (busqueda_tsv);
+
+-- Escapa \, % y _ para que el texto del usuario se compare literal dentro de un patron like/ilike.
+create or replace function escapar_like(p_texto text) returns text
+language sql immutable
+as $$
+    select replace(replace(replace(p_texto, '\', '\\'), '%', '\%'), '_', '\_');
+$$;
+
+-- Devuelve las OPs que coinciden, de la mas parecida a la menos, ya paginadas.
+-- 'orden' trae la fila completa SIN historial_procesos (pesado), 'total' cuantas coinciden en total.
+create or replace function buscar_ordenes(
+    p_termino        text,
+    p_finalizadas    boolean default null,   -- null = todas, true = solo FINALIZADO, false = las demas
+    p_tipo           text    default null,   -- patron ilike sobre tipo_orden, ej '%BOLSA%'
+    p_prefijo        text    default null,   -- prefijo de OP, ej 'FRI'
+    p_limite         integer default 50,
+    p_desplazamiento integer default 0
+)
+returns table (orden jsonb, rango real, total bigint)
+language sql
+stable
+as $$
+    with q as (
+        select websearch_to_tsquery('spanish'::regconfig, p_termino) as tsq,
+               lower(trim(p_termino)) as t,
+               escapar_like(lower(trim(p_termino))) as t_like
+    )
+    select to_jsonb(o) - 'historial_procesos' - 'busqueda_texto' - 'busqueda_tsv',
+           greatest(ts_rank(o.busqueda_tsv, q.tsq), similarity(o.busqueda_texto, q.t)) as rango,
+           count(*) over () as total
+    from ordenes_planeadas o, q
+    where (o.busqueda_tsv @@ q.tsq or o.busqueda_texto like '%' || q.t_like || '%' escape '\')
+      and (p_finalizadas is null or (o.proxima_area = 'FINALIZADO') = p_finalizadas)
+      and (p_tipo is null or o.tipo_orden ilike p_tipo)
+      and (p_prefijo is null or o.op::text ilike escapar_like(p_prefijo) || '%' escape '\')
+    order by (lower(o.op::text) = q.t) desc, rango desc, o.created_at desc, o.id desc
+    limit p_limite offset p_desplazamiento;
+$$;
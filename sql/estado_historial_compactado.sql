@@ -0,0 +1,90 @@
+-- HISTORIAL DE ENCENDIDO/APAGADO COMPACTADO (planta, areas y maquinas)
+-- Ejecutar una vez en el editor SQL de Supabase. Los eventos de estado_historial con mas de 30 dias se
+-- doblan en tramos (estado_intervalos) y en el estado de cada clave a la fecha de corte (estado_snapshot),
+-- asi los calculos de tiempo detenido leen siempre una cantidad acotada de filas.
+-- Mientras estas tablas no existan, la app sigue leyendo solo estado_historial (como antes).
+
+create table if not exists estado_intervalos (
+    id     bigint generated always as identity primary key,
+    clave  text        not null,
+    estado boolean,
+    desde  timestamptz not null,
+    hasta  timestamptz not null
+);
+
+create index if not exists idx_estado_intervalos_clave_hasta on estado_intervalos (clave, hasta);
+
+create table if not exists estado_snapshot (
+    clave  text        primary key,
+    estado boolean,
+    fecha  timestamptz not null                      -- fecha de corte de la ultima compactacion de la clave
+);
+
+create index if not exists idx_estado_historial_clave_fecha on estado_historial (clave, fecha);
+
+-- Ultimo evento de cada clave en o antes de p_fecha, en una sola consulta (un salto de indice por clave).
+create or replace function ultimo_estado_antes(p_claves text[], p_fecha timestamptz)
+returns table (clave text, estado boolean, fecha timestamptz)
+language sql stable
+as $$
+    select e.clave, e.estado, e.fecha
+      from unnest(p_claves) as c(clave)
+      cross join lateral (
+          select h.clave, h.estado, h.fecha
+            from estado_historial h
+           where h.clave = c.clave and h.fecha <= p_fecha
+           order by h.fecha desc
+           limit 1
+      ) e;
+$$;
+
+-- COMPACTACION ATOMICA: borra los eventos viejos, inserta sus tramos y actualiza los snapshots en la
+-- misma transaccion, asi un fallo a mitad de camino no deja tramos duplicados. Devuelve cuantos eventos doblo.
+create or replace function compactar_estado_historial(p_dias integer default 30)
+returns integer
+language plpgsql
+as $$
+declare
+    v_corte timestamptz := now() - make_interval(days => p_dias);
+    v_filas integer;
+begin
+    -- Dos servidores que compacten a la vez no deben doblar los mismos eventos.
+    perform pg_advisory_xact_lock(hashtext('compactar_estado_historial'));
+
+    with borrados as (
+        delete from estado_historial
+         where fecha <= v_corte
+     returning clave, estado, fecha
+    ),
+    eventos as (
+        -- El snapshot anterior abre la secuencia de cada clave; los eventos que ya quedaron dentro de el no se
+        -- vuelven a doblar.
+        select s.clave, s.estado, s.fecha
+          from estado_snapshot s
+         where s.clave in (select b.clave from borrados b)
+        union all
+        select b.clave, coalesce(b.estado, true), b.fecha
+          from borrados b
+          left join estado_snapshot s on s.clave = b.clave
+         where s.clave is null or b.fecha > s.fecha
+    ),
+    tramos as (
+        select clave, estado, fecha as desde,
+               coalesce(lead(fecha) over (partition by clave order by fecha), v_corte) as hasta,
+               row_number() over (partition by clave order by fecha desc) as de_atras
+          from eventos
+    ),
+    nuevos_intervalos as (
+        insert into estado_intervalos (clave, estado, desde, hasta)
+        select clave, estado, desde, hasta from tramos where desde < hasta
+    ),
+    nuevos_snapshots as (
+        insert into estado_snapshot (clave, estado, fecha)
+        select clave, estado, v_corte from tramos where de_atras = 1
+        on conflict (clave) do update set estado = excluded.estado, fecha = excluded.fecha
+    )
+    select count(*) into v_filas from borrados;
+
+    return v_filas;
+end;
+$$;
@@ -0,0 +1,152 @@
+-- PASOS DE PRODUCCION NORMALIZADOS (una fila por paso, junto al JSON historial_procesos)
+-- Ejecutar una vez en el editor SQL de Supabase. Al final se llena la tabla con el historial
+-- que ya existe en ordenes_planeadas; desde ahi cada cierre la alimenta con registrar_paso().
+-- Mientras esta tabla no exista, la app sigue leyendo y escribiendo solo el JSON (como antes).
+
+create table if not exists historial_pasos (
+    id                bigint generated always as identity primary key,
+    orden_id          bigint      not null,          -- ordenes_planeadas.id (el numero de OP se puede repetir si una se anulo);
+                                                     -- si esa llave es de otro tipo, el bloque de abajo lo iguala
+    op                text        not null,
+    orden_paso        integer     not null,          -- posicion del paso dentro de historial_procesos (1, 2, 3...)
+    area              text,
+    maquina           text,
+    operario          text,
+    auxiliar          text,
+    fecha             timestamptz,
+    duracion_segundos integer,
+    tipo              text,
+    datos_cierre      jsonb,
+    paso              jsonb       not null,          -- el paso tal cual quedo en el JSON
+    creado            timestamptz not null default now(),
+    unique (orden_id, orden_paso)
+);
+
+-- orden_id debe tener el mismo tipo que ordenes_planeadas.id (bigint, integer o uuid segun la instalacion), para que
+-- el cruce de historial_pasos_detalle use el indice de la llave primaria sin convertir. Solo se cambia si difiere.
+do $$
+declare
+    v_tipo_id    text;
+    v_tipo_orden text;
+begin
+    select format_type(atttypid, atttypmod) into v_tipo_id
+      from pg_attribute where attrelid = 'ordenes_planeadas'::regclass and attname = 'id';
+    select format_type(atttypid, atttypmod) into v_tipo_orden
+      from pg_attribute where attrelid = 'historial_pasos'::regclass and attname = 'orden_id';
+    if v_tipo_orden is distinct from v_tipo_id then
+        drop view if exists historial_pasos_detalle;
+        execute format('alter table historial_pasos alter column orden_id type %1$s using orden_id::text::%1$s', v_tipo_id);
+    end if;
+end;
+$$;
+drop function if exists _fila_historial_paso(text, text, integer, jsonb);
+drop function if exists _fila_historial_paso(bigint, text, integer, jsonb);
+
+create index if not exists idx_historial_pasos_maquina_fecha  on historial_pasos (maquina, fecha);
+create index if not exists idx_historial_pasos_operario_fecha on historial_pasos (operario, fecha);
+
+-- 'dd/mm/aaaa hh:mm' (hora Colombia) -> timestamptz; null si el texto no tiene ese formato.
+create or replace function paso_fecha(p_texto text) returns timestamptz
+language plpgsql immutable
+as $$
+begin
+    return to_timestamp(p_texto, 'DD/MM/YYYY HH24:MI')::timestamp at time zone 'America/Bogota';
+exception when others then
+    return null;
+end;
+$$;
+
+-- 'H:MM:SS' o '1 day, H:MM:SS' (texto de timedelta de Python) -> segundos; null si no se puede leer.
+create or replace function paso_segundos(p_texto text) returns integer
+language plpgsql immutable
+as $$
+begin
+    return extract(epoch from replace(p_texto, ',', '')::interval)::integer;
+exception when others then
+    return null;
+end;
+$$;
+
+create or replace function _fila_historial_paso(p_orden_id historial_pasos.orden_id%type, p_op text, p_orden integer, p_paso jsonb)
+returns historial_pasos
+language sql stable
+as $$
+    select null::bigint, p_orden_id, p_op, p_orden,
+           p_paso->>'area', p_paso->>'maquina', nullif(trim(p_paso->>'operario'), ''), p_paso->>'auxiliar',
+           paso_fecha(p_paso->>'fecha'), paso_segundos(p_paso->>'duracion'), p_paso->>'tipo',
+           p_paso->'datos_cierre', p_paso, now();
+$$;
+
+-- CIERRE ATOMICO: agrega el paso al JSON, aplica los demas cambios de la OP (proxima_area, etc.)
+-- e inserta la fila normalizada, todo en la misma transaccion.
+create or replace function registrar_paso(p_op text, p_paso jsonb, p_cambios jsonb default '{}'::jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+    v_set   text;
+    v_fila  record;
+    v_filas integer := 0;
+begin
+    select string_agg(format('%1$I = r.%1$I', k), ', ')
+      into v_set
+      from jsonb_object_keys(coalesce(p_cambios, '{}'::jsonb)) k
+     where k <> 'historial_procesos';
+
+    for v_fila in execute format(
+        'update ordenes_planeadas o
+            set historial_procesos = coalesce(o.historial_procesos, ''[]''::jsonb) || jsonb_build_array($3) %s
+           from jsonb_populate_record(null::ordenes_planeadas, $2) r
+          where o.op = $1
+      returning o.id as orden_id, jsonb_array_length(o.historial_procesos) as orden_paso',
+        coalesce(', ' || v_set, '')
+    ) using p_op, coalesce(p_cambios, '{}'::jsonb), p_paso
+    loop
+        insert into historial_pasos (orden_id, op, orden_paso, area, maquina, operario, auxiliar, fecha,
+                                     duracion_segundos, tipo, datos_cierre, paso, creado)
+        select f.orden_id, f.op, f.orden_paso, f.area, f.maquina, f.operario, f.auxiliar, f.fecha,
+               f.duracion_segundos, f.tipo, f.datos_cierre, f.paso, f.creado
+          from _fila_historial_paso(v_fila.orden_id, p_op, v_fila.orden_paso, p_paso) f
+        on conflict (orden_id, orden_paso) do nothing;
+        v_filas := v_filas + 1;
+    end loop;
+
+    if v_filas = 0 then
+        raise exception 'No existe la OP %', p_op;
+    end if;
+    return v_filas;
+end;
+$$;
+
+-- RESPALDO: llena historial_pasos con los pasos del JSON que todavia no esten. Se puede repetir sin duplicar.
+-- Solo recorre las OPs con mas pasos en el JSON que filas en la tabla (conteo sobre el indice unico), asi la app
+-- lo puede llamar seguido antes de leer Rendimiento.
+create or replace function respaldar_historial_pasos() returns integer
+language plpgsql
+as $$
+declare
+    v_filas integer;
+begin
+    insert into historial_pasos (orden_id, op, orden_paso, area, maquina, operario, auxiliar, fecha,
+                                 duracion_segundos, tipo, datos_cierre, paso, creado)
+    select f.orden_id, f.op, f.orden_paso, f.area, f.maquina, f.operario, f.auxiliar, f.fecha,
+           f.duracion_segundos, f.tipo, f.datos_cierre, f.paso, f.creado
+      from (select id, op, historial_procesos
+              from ordenes_planeadas
+             where jsonb_array_length(coalesce(historial_procesos, '[]'::jsonb))
+                   > (select count(*) from historial_pasos p where p.orden_id = ordenes_planeadas.id)) o
+      cross join lateral jsonb_array_elements(o.historial_procesos) with ordinality as e(paso, n)
+      cross join lateral _fila_historial_paso(o.id, o.op, n::integer, e.paso) f
+    on conflict (orden_id, orden_paso) do nothing;
+    get diagnostics v_filas = row_count;
+    return v_filas;
+end;
+$$;
+
+-- Pasos con los datos de su OP (tipo, trabajo, cliente) para Rendimiento Maquinistas.
+create or replace view historial_pasos_detalle as
+select p.*, o.tipo_orden, o.nombre_trabajo, o.cliente
+  from historial_pasos p
+  left join ordenes_planeadas o on o.id = p.orden_id;
+
+select respaldar_historial_pasos();
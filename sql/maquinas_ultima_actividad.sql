@@ -0,0 +1,31 @@
+-- ULTIMA ACTIVIDAD POR MAQUINA (una fila por maquina con la fecha de su ultimo cierre)
+-- La app la actualiza en cada cierre final, entrega parcial y cierre de Bolsas; al presionar
+-- "INICIAR" el tiempo libre de la maquina se calcula leyendo solo su fila.
+-- Ejecutar una vez en el editor SQL de Supabase, despues de sql/historial_pasos.sql.
+
+create table if not exists maquinas_ultima_actividad (
+    maquina text primary key,
+    fecha   timestamptz not null,
+    op      text
+);
+
+-- La app escribe con esta funcion: un cierre con fecha anterior a la guardada (p. ej. un paso atrasado) no hace
+-- retroceder la ultima actividad de la maquina.
+create or replace function marcar_actividad_maquina(p_maquina text, p_fecha timestamptz, p_op text default null)
+returns void
+language sql
+as $$
+    insert into maquinas_ultima_actividad (maquina, fecha, op)
+    values (p_maquina, p_fecha, p_op)
+    on conflict (maquina) do update set fecha = excluded.fecha, op = excluded.op
+     where maquinas_ultima_actividad.fecha < excluded.fecha;
+$$;
+
+-- Carga inicial con el ultimo paso registrado de cada maquina (toda la historia, no solo las OPs recientes).
+insert into maquinas_ultima_actividad (maquina, fecha, op)
+select distinct on (maquina) maquina, fecha, op
+  from historial_pasos
+ where maquina is not null and maquina not in ('', '—') and fecha is not null
+ order by maquina, fecha desc
+on conflict (maquina) do update set fecha = excluded.fecha, op = excluded.op
+ where maquinas_ultima_actividad.fecha < excluded.fecha;
@@ -0,0 +1,10 @@
+-- ULTIMO PASO DE CADA OP COMO CAMPO CALCULADO (alertas de OPs quietas y de OPs sin entrar a maquina)
+-- Ejecutar una vez en el editor SQL de Supabase. La app pide select=...,ultimo_paso y recibe solo el ultimo
+-- elemento de historial_procesos (null si la OP no ha tenido pasos), en vez de todo el historial de cada OP.
+-- Mientras la funcion no exista, la app sigue bajando historial_procesos completo (como antes).
+
+create or replace function ultimo_paso(o ordenes_planeadas) returns jsonb
+language sql stable
+as $$
+    select o.historial_procesos -> -1;
+$$;
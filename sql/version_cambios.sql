@@ -0,0 +1,41 @@
+-- CONTADOR GLOBAL DE CAMBIOS (auto-refresco del Monitor sin releer todo)
+-- Ejecutar una vez en el editor SQL de Supabase. Cada escritura en trabajos_activos, estado_maquinas,
+-- configuracion_sistema u ordenes_planeadas sube el numero; la app lo lee primero y, si no cambio,
+-- no vuelve a hacer las consultas pesadas. Mientras la tabla no exista, la app relee como antes.
+
+create table if not exists version_cambios (
+    id          integer     primary key default 1 check (id = 1),
+    version     bigint      not null default 0,
+    actualizado timestamptz not null default now()
+);
+
+insert into version_cambios (id) values (1) on conflict (id) do nothing;
+
+create or replace function subir_version_cambios() returns trigger
+language plpgsql
+as $$
+begin
+    update version_cambios set version = version + 1, actualizado = now() where id = 1;
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_version_trabajos_activos on trabajos_activos;
+create trigger trg_version_trabajos_activos
+    after insert or update or delete on trabajos_activos
+    for each statement execute function subir_version_cambios();
+
+drop trigger if exists trg_version_estado_maquinas on estado_maquinas;
+create trigger trg_version_estado_maquinas
+    after insert or update or delete on estado_maquinas
+    for each statement execute function subir_version_cambios();
+
+drop trigger if exists trg_version_configuracion on configuracion_sistema;
+create trigger trg_version_configuracion
+    after insert or update or delete on configuracion_sistema
+    for each statement execute function subir_version_cambios();
+
+drop trigger if exists trg_version_ordenes on ordenes_planeadas;
+create trigger trg_version_ordenes
+    after insert or update or delete on ordenes_planeadas
+    for each statement execute function subir_version_cambios();
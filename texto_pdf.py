@@ -0,0 +1,110 @@
+"""
+MEDIDA Y ACOMODO DE TEXTO PARA LOS PDF DE ORDENES (cell_fit, fila_grid), compartido por los generar_op_*.
+
+pdf.get_string_width pasa todo el texto por la normalizacion y el analisis bidireccional de fpdf2 en cada llamada, y
+antes se llamaba una vez por caracter recortado (cell_fit) y una vez por palabra agregada (_lineas_ajustadas), asi
+que una observacion larga volvia cuadratico el PDF. Aqui el ancho de cada letra se mide UNA vez por proceso y por
+fuente (familia, estilo, tamano) y de ahi en adelante un texto se mide sumando su tabla: el recorte es una busqueda
+binaria sobre los anchos acumulados y el partido en lineas es una sola pasada.
+"""
+import bisect
+from itertools import accumulate
+
+# (familia, estilo, tamano, espaciado, estiramiento) -> {letra: ancho en mm}
+_TABLAS_ANCHO = {}
+
+def _tabla_ancho(pdf):
+    clave = (pdf.font_family, pdf.font_style, pdf.font_size_pt, pdf.char_spacing, pdf.font_stretching)
+    tabla = _TABLAS_ANCHO.get(clave)
+    if tabla is None:
+        tabla = _TABLAS_ANCHO.setdefault(clave, {})
+    return tabla
+
+def _anchos_letras(pdf, texto):
+    """Ancho de cada letra de texto con la fuente actual de pdf (las letras nuevas se miden y quedan guardadas)."""
+    tabla = _tabla_ancho(pdf)
+    anchos = []
+    for letra in texto:
+        ancho = tabla.get(letra)
+        if ancho is None:
+            ancho = tabla[letra] = pdf.get_string_width(letra)
+        anchos.append(ancho)
+    return anchos
+
+def ancho_texto(pdf, texto):
+    """Igual que pdf.get_string_width(texto), pero con las tablas de anchos."""
+    return sum(_anchos_letras(pdf, texto))
+
+# Escribe texto dentro de una celda del PDF reduciendo el tamano de letra si el texto no cabe, para que nunca se corte
+def cell_fit(pdf, w, h, text, border=1):
+
+    text = str(text)
+
+# Se deja el trozo inicial mas largo que cabe en la celda (los anchos acumulados van en aumento: busqueda binaria)
+    acumulados = list(accumulate(_anchos_letras(pdf, text)))
+    if acumulados and acumulados[-1] > (w - 2):
+        text = text[:bisect.bisect_right(acumulados, w - 2)]
+
+    pdf.cell(w, h, text, border)
+
+def lineas_ajustadas(pdf, texto, ancho_mm):
+    """Parte un texto en lineas que caben dentro de ancho_mm con la fuente actual de pdf."""
+    texto = str(texto) if texto is not None else ""
+    if texto == "":
+        return [""]
+    limite = ancho_mm - 2
+    ancho_espacio = ancho_texto(pdf, " ")
+    lineas = []
+    actual = ""
+    ancho_actual = 0.0
+    for palabra in texto.split(" "):
+        ancho_palabra = ancho_texto(pdf, palabra)
+        if not actual:
+            actual, ancho_actual = palabra, ancho_palabra
+            continue
+        prueba = (actual + " " + palabra).strip()
+# El ancho de la linea se lleva sumado; solo si strip() cambio algo (espacios dobles, saltos) se vuelve a medir
+        if len(prueba) == len(actual) + 1 + len(palabra):
+            ancho_prueba = ancho_actual + ancho_espacio + ancho_palabra
+        else:
+            ancho_prueba = ancho_texto(pdf, prueba)
+        if ancho_prueba <= limite:
+            actual, ancho_actual = prueba, ancho_prueba
+        else:
+            lineas.append(actual)
+            actual, ancho_actual = palabra, ancho_palabra
+    if actual:
+        lineas.append(actual)
+    return lineas if lineas else [""]
+
+def fila_grid(pdf, celdas, h_linea=7):
+    """
+    Dibuja una fila de celdas lado a lado tipo grilla (como pdf.cell en serie),
+    pero si el texto de una celda no cabe en una linea, en vez de salirse del
+    recuadro pasa a la siguiente linea DENTRO de la misma celda. Toda la fila
+    crece de alto segun la celda que mas lineas necesite.
+    celdas: lista de dicts con: ancho, texto, negrita (bool), fill (bool), tam (pt, opcional)
+    """
+    x0, y0 = pdf.get_x(), pdf.get_y()
+
+    listas_lineas = []
+    for c in celdas:
+        pdf.set_font("Arial", "B" if c.get("negrita") else "", c.get("tam", 10))
+        listas_lineas.append(lineas_ajustadas(pdf, c.get("texto", ""), c["ancho"]))
+
+    n_lineas = max(len(l) for l in listas_lineas)
+    alto_fila = n_lineas * h_linea
+
+    x = x0
+    for c, lineas in zip(celdas, listas_lineas):
+        if c.get("fill"):
+            pdf.set_fill_color(230, 230, 230)
+            pdf.rect(x, y0, c["ancho"], alto_fila, "F")
+        pdf.rect(x, y0, c["ancho"], alto_fila)
+        pdf.set_font("Arial", "B" if c.get("negrita") else "", c.get("tam", 10))
+        for i, linea in enumerate(lineas):
+            pdf.set_xy(x + 1, y0 + (i * h_linea))
+            pdf.cell(c["ancho"] - 2, h_linea, linea, border=0)
+        x += c["ancho"]
+
+    pdf.set_xy(x0, y0 + alto_fila)